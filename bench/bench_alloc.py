@@ -0,0 +1,112 @@
+# Mesure : octets alloues par cycle en regime etabli
+#
+#   python bench/bench_alloc.py         (CPython + simulateur)
+#   import bench_alloc                  (sur la carte, avec le vrai bus)
+#
+# MicroPython : gc.mem_alloc() avant / apres N cycles, GC desactive.
+# CPython     : pic de memoire transitoire (tracemalloc, octets) pendant N
+#               cycles, mesure a vide deduite (iterateurs et entiers CPython
+#               et bus simule compris).
+#
+# La verification (nul sur la carte) est faite par tests/test_alloc.py.
+
+try :
+    import host
+except ImportError :
+    pass
+
+import gc
+from machine import I2C, Pin
+from maqueen import MaqueenPlusV1
+from mpu6050 import MPU
+from tools   import Vecteur, I2C_manage
+from array   import array
+
+CYCLES = 200
+
+
+def make_robot(burst, managed=False):
+    i2c = I2C(1, scl=Pin(21), sda=Pin(22), freq=400000)
+    if managed :
+        i2c = I2C_manage(i2c)
+    robot = MaqueenPlusV1(i2c, burst=burst, scheduler=False)
+    robot.moteurs = (10, 20)
+    robot.phares  = (1, 1)
+    for _ in range(3) :
+        robot.update()      # Regime etabli
+    return robot
+
+
+def make_mpu():
+    mpu = MPU(I2C(1, scl=Pin(21), sda=Pin(22), freq=400000), calibration=None)
+    mpu.read_data()
+    return mpu
+
+
+def alloc_micropython(function, cycles=CYCLES):
+    gc.collect()
+    gc.disable()
+    try :
+        before = gc.mem_alloc()
+        for _ in range(cycles) :
+            function()
+        return (gc.mem_alloc() - before) / cycles
+    finally :
+        gc.enable()
+
+
+def alloc_cpython(function, cycles=CYCLES):
+    import tracemalloc
+    def peak(f):
+        f()
+        loop = [None] * cycles
+        tracemalloc.start()
+        try :
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            for _ in loop :
+                f()
+            return tracemalloc.get_traced_memory()[1] - before
+        finally :
+            tracemalloc.stop()
+    return peak(function) - peak(lambda : None)
+
+
+def alloc_per_cycle(function, cycles=CYCLES):
+    if hasattr(gc, "mem_alloc") :
+        return alloc_micropython(function, cycles)
+    return alloc_cpython(function, cycles)
+
+
+# Calcul vectoriel sur place (hors flottants intermediaires sur les ports
+# ou les flottants sont alloues, comme l'ESP32)
+def make_vector_math():
+    sample = array('f', [0.1, 0.2, 0.9, 1.0, 2.0, 3.0])
+    accel  = Vecteur.view(sample, 0)
+    gyro   = Vecteur.view(sample, 3)
+    acc    = Vecteur()
+    tmp    = Vecteur()
+    def step():
+        acc.add(gyro, 0.01)
+        tmp.cross(accel, gyro).scale(0.5)
+        acc.lerp(tmp, 0.1)
+        acc.dot(accel)
+    return step
+
+
+def run():
+    results = {}
+    for burst in (False, True) :
+        robot = make_robot(burst)
+        results["update (burst=%s)" % burst] = alloc_per_cycle(robot.update)
+    results["update (I2C_manage)"] = alloc_per_cycle(make_robot(False, True).update)
+    results["MPU read_data"]       = alloc_per_cycle(make_mpu().read_data)
+    results["Vecteur (sur place)"] = alloc_per_cycle(make_vector_math())
+    unit = "octets / cycle" if hasattr(gc, "mem_alloc") else "octets (pic transitoire)"
+    for name, value in results.items() :
+        print("%-22s : %.1f %s" % (name, value, unit))
+    return results
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,39 @@
+# Benchmark : lecture en rafale (1 transaction) / lecture en deux fois
+#
+#   python bench/bench_burst.py [duree_s]
+#
+# Mesure le nombre de cycles update() par seconde sur le bus simule
+# a 100 kHz et 400 kHz.
+
+import sys
+import host
+from time     import monotonic
+from machine  import I2C, Pin
+from maqueen  import MaqueenPlusV1
+import i2csim
+
+
+def cycles_per_second(freq, burst, duration=1.0):
+    i2csim.reset(1)
+    bus   = i2csim.bus(1, freq)
+    robot = MaqueenPlusV1(I2C(1, scl=Pin(21), sda=Pin(22), freq=freq), burst=burst, scheduler=False)
+    robot.update()
+    bus.reset_counters()
+
+    count, t0 = 0, monotonic()
+    while monotonic() - t0 < duration :
+        robot.update()
+        count += 1
+    elapsed = monotonic() - t0
+    return count / elapsed, bus.transactions / count, bus.bytes / count
+
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    for freq in (100000, 400000) :
+        split = cycles_per_second(freq, False, duration)
+        burst = cycles_per_second(freq, True,  duration)
+        print("%3d kHz  deux lectures : %6.1f cycles/s (%.0f trans., %.0f octets)"
+              % (freq // 1000, split[0], split[1], split[2]))
+        print("%3d kHz  rafale        : %6.1f cycles/s (%.0f trans., %.0f octets)  x%.2f"
+              % (freq // 1000, burst[0], burst[1], burst[2], burst[0] / split[0]))
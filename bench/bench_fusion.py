@@ -0,0 +1,77 @@
+# Benchmark : filtres d'orientation (fusion.py)
+#
+#   python bench/bench_fusion.py [duree_s]
+#
+#  -  debit     : mises a jour par seconde de chaque filtre (calcul seul)
+#  -  precision : erreur RMS roulis / tangage / cap sur la trajectoire
+#                 synthetique du MPU simule, filtre cadence a 200 Hz par le
+#                 Scheduler avec le dt reel des echantillons
+
+import sys
+import host
+from math    import sqrt
+from time    import monotonic, sleep
+from array   import array
+from machine import I2C
+from mpu6050 import MPU
+from fusion  import Fusion, Complementary, Mahony, Madgwick
+from tools   import Scheduler
+import i2csim
+
+FILTERS = (("complementary", Complementary), ("mahony", Mahony), ("madgwick", Madgwick))
+
+
+def throughput(cls, duration=0.5):
+    filtre = cls()
+    sample = array('f', [0.1, 0.2, 0.97, 1.0, -2.0, 3.0])
+    filtre.reset(sample)
+    count, t0 = 0, monotonic()
+    while monotonic() - t0 < duration :
+        for _ in range(100) :
+            filtre.update(sample, 0.005)
+        count += 100
+    return count / (monotonic() - t0)
+
+
+def wrap(angle):
+    return (angle + 180) % 360 - 180
+
+
+def accuracy(cls, duration=5.0, rate_hz=200):
+    i2csim.reset(1)
+    device = i2csim.bus(1, 400000).devices[0x69]
+    mpu    = MPU(I2C(1, freq=400000), calibration=None)
+    device.trajectory = traj = i2csim.Trajectory()
+    
+    scheduler = Scheduler()
+    fusion    = Fusion(mpu, cls(), scheduler, rate_hz=rate_hz)
+    errors    = [[], [], []]
+    
+    def check():
+        o = fusion.orientation
+        if o.seq == 0 :
+            return
+        truth = traj.angles(traj.elapsed())
+        errors[0].append(o.roll  - truth[0])
+        errors[1].append(o.pitch - truth[1])
+        errors[2].append(wrap(o.yaw - (truth[2] - yaw0[0])))
+    
+    # Cap initial : le filtre demarre a 0, la trajectoire non
+    yaw0 = [traj.angles(traj.elapsed())[2]]
+    scheduler.add(check, 20, "check")
+    scheduler.start()
+    sleep(duration)
+    scheduler.stop()
+    sleep(0.05)
+    rms = [sqrt(sum(e * e for e in err) / max(1, len(err))) for err in errors]
+    return rms, fusion.job.stats()
+
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    for name, cls in FILTERS :
+        print("%-13s : %8.0f mises a jour / s" % (name, throughput(cls)))
+    for name, cls in FILTERS :
+        rms, stats = accuracy(cls, duration)
+        print("%-13s : RMS roulis %5.2f  tangage %5.2f  cap %5.2f deg  (%d pas, %d depassements)"
+              % (name, rms[0], rms[1], rms[2], stats["runs"], stats["overruns"]))
@@ -0,0 +1,70 @@
+# Benchmark : rampes moteur (profiles.py) / commandes en echelon
+#
+#   python bench/bench_profile.py [periode_ms]
+#
+# Sequence de consignes 0 -> 255 -> -255 -> 0 :
+#  -  hors ligne : profil calcule avec un dt fixe (deterministe), duree,
+#                  variation maximale par cycle (PWM) et de cette variation
+#  -  simulateur : cycles update() du Maqueen sur le bus simule, nombre de
+#                  commandes moteur, transactions et octets par rapport aux echelons
+
+import sys
+import host
+from time     import sleep
+from machine  import I2C
+from maqueen  import MaqueenPlusV1
+from profiles import Profile
+import i2csim
+
+TARGETS  = (255, -255, 0)
+PROFILES = (("echelon", None, None), ("trapeze", 1000, None), ("s-curve", 1000, 8000))
+
+
+def offline(accel, jerk, dt):
+    values = [0]
+    for target in TARGETS :
+        if accel is None :
+            values.append(target)
+            continue
+        p = Profile(accel, jerk, values[-1])
+        p.target = target
+        while not p.idle :
+            values.append(int(p.step(dt)))
+    steps  = [b - a for a, b in zip(values, values[1:])]
+    change = [abs(b - a) for a, b in zip(steps, steps[1:])]
+    return (len(values) - 1) * dt, max(abs(s) for s in steps), max(change) if change else 0
+
+
+def simulated(accel, jerk, period_ms):
+    i2csim.reset(1)
+    bus   = i2csim.bus(1, 400000)
+    sim   = bus.devices[0x10]
+    robot = MaqueenPlusV1(I2C(1, freq=400000), scheduler=False, accel=accel, jerk=jerk)
+    robot.update()
+    bus.reset_counters()
+    del sim.writes[:]
+
+    cycles = 0
+    for target in TARGETS :
+        robot.moteurs = (target, target)
+        while True :
+            robot.update()
+            cycles += 1
+            sleep(period_ms / 1000)
+            if not robot.profile_active and tuple(sim.motors) == (target, target) :
+                break
+    motors = sum(1 for w in sim.writes if w[0] == 0x00)
+    return cycles, motors, bus.transactions, bus.bytes
+
+
+if __name__ == "__main__":
+    period = float(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print("Hors ligne (dt = %d ms)" % period)
+    for name, accel, jerk in PROFILES :
+        duration, step, change = offline(accel, jerk, period / 1000)
+        print("  %-8s : %5.2f s  pas max %3d PWM  variation du pas max %3d PWM" % (name, duration, step, change))
+    print("Simulateur (periode %d ms, 400 kHz)" % period)
+    for name, accel, jerk in PROFILES :
+        cycles, motors, trans, nbytes = simulated(accel, jerk, period)
+        print("  %-8s : %3d cycles  %3d commandes moteur  %4d transactions  %5d octets"
+              % (name, cycles, motors, trans, nbytes))
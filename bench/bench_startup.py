@@ -0,0 +1,75 @@
+# Benchmark : temps de demarrage
+#
+#   python bench/bench_startup.py
+#
+# MPU, jusqu'au premier echantillon utilisable :
+#  -  sync   : calibration synchrone (256 lectures, ancien comportement)
+#  -  auto   : offsets relus dans le fichier de calibration
+#  -  absent : pas de fichier, calibration en arriere-plan
+#
+# MBits + Maqueen, jusqu'a la premiere commande moteur envoyee sur le bus :
+#  -  eager  : tous les peripheriques crees au demarrage (ancien MBits)
+#  -  lazy   : seul le bus I2C est cree (MBits paresseux)
+
+import os
+import tempfile
+import host
+from time    import monotonic
+from machine import I2C, Pin
+from mpu6050 import MPU
+from tmp75   import Tmp1075
+from mbits   import MBits
+from maqueen import MaqueenPlusV1
+import i2csim
+
+
+def startup_ms(calibration, calib_file, freq=100000):
+    i2csim.reset(1)
+    i2csim.bus(1, freq)
+    t0  = monotonic()
+    mpu = MPU(I2C(1, scl=Pin(21), sda=Pin(22), freq=freq), calibration=calibration, calib_file=calib_file)
+    mpu.read_data()
+    return (monotonic() - t0) * 1000, mpu
+
+
+def first_motor_ms(eager, calib_file):
+    i2csim.reset(1)
+    device = i2csim.bus(1).devices[0x10]
+    t0     = monotonic()
+    board  = MBits()
+    if eager :
+        # Ancien constructeur : tout est cree, calibration synchrone
+        for name in ("speaker", "display", "micro", "a") :
+            getattr(board, name)
+        MPU(board.i2c, calibration="sync", calib_file=calib_file)
+        Tmp1075(board.i2c)
+    robot = MaqueenPlusV1(board.i2c, scheduler=False, gap_us=0)
+    robot.moteurs = (100, 100)
+    robot.update()
+    assert device.motors == (100, 100)
+    return (monotonic() - t0) * 1000
+
+
+def run():
+    folder = tempfile.mkdtemp()
+    calib  = os.path.join(folder, "mpu_calib.json")
+    results = {}
+    results["sync"], _   = startup_ms("sync", calib)
+    results["auto"], _   = startup_ms("auto", calib)
+    os.remove(calib)
+    results["absent"], mpu = startup_ms("auto", calib)
+    for _ in range(300) :
+        mpu.read_data()
+    results["absent_calibrated"] = mpu.calibrated
+    results["motor_eager"] = first_motor_ms(True,  calib)
+    results["motor_lazy"]  = first_motor_ms(False, calib)
+    return results
+
+
+if __name__ == "__main__":
+    results = run()
+    for name in ("sync", "auto", "absent") :
+        print("%-7s : %7.1f ms" % (name, results[name]))
+    print("calibration en arriere-plan terminee :", results["absent_calibrated"])
+    print("premiere commande moteur : eager %.1f ms, lazy %.1f ms"
+          % (results["motor_eager"], results["motor_lazy"]))
@@ -0,0 +1,389 @@
+# Suite de benchmarks des chemins critiques
+#
+#   python bench/run.py [--quick] [--json resultats.json] [--compare reference.json] [nom ...]
+#
+# CPython : bus simule (sim/), tous les benchmarks
+# Carte   : import run ; run.main(["update", "imu", "tmp", "alloc", "recorder"]) avec le vrai bus
+#
+# Benchmarks :
+#  -  update   : cycles update() / s, transactions et octets par cycle (100 / 400 kHz, rafale)
+#  -  latency  : delai commande moteur -> bus (Maqueen sur Scheduler a 50 Hz)
+#  -  imu      : echantillons MPU.read_data() / s et octets par echantillon
+#  -  tmp      : lectures Tmp1075.temp / s
+#  -  alloc    : octets alloues par cycle sur la carte, pic transitoire sur
+#                CPython (bench_alloc ; verification : tests/test_alloc.py)
+#  -  recorder : cout d'un enregistrement (recorder.Recorder, toutes les voies)
+#                et duree moyenne du cycle update() avec / sans enregistrement
+#  -  replay   : trace I2C (i2ctrace) de 200 cycles update() capturee sur le simulateur,
+#                puis rejouee (sim/replay.py) : cycles / s hors bus (decodage, listeners)
+#  -  server   : serveur de telemetrie (lib/server.py) sur localhost, robot a 200 Hz :
+#                etats / s et octets / s recus (TCP, UDP), delai commande moteur ->
+#                etat recu, puis client TCP qui ne lit pas (trames abandonnees,
+#                cycles update() non ralentis)
+#  -  scenario : ecrivain moteurs a 50 Hz + lecture capteurs sol a 100 Hz (Scheduler),
+#                puis avec un thread IMU a 200 Hz sur le meme bus (I2C_manage)
+#
+# Resultats : {benchmark: {mesure: valeur}} (JSON avec --json), --compare affiche
+# l'ecart relatif de chaque mesure par rapport a un fichier de reference.
+
+import sys
+import json
+from time import sleep
+
+try :
+    import host
+    import i2csim
+    SIM = True
+except ImportError :
+    SIM = False
+
+from machine import I2C, Pin
+from maqueen import MaqueenPlusV1
+from mpu6050 import MPU
+from tmp75   import Tmp1075
+from tools   import Scheduler, I2C_manage, ticks_us, ticks_diff
+
+DURATION = 1.0
+
+
+def make_i2c(freq=400000):
+    if SIM :
+        i2csim.reset(1)
+        i2csim.bus(1, freq)
+    return I2C(1, scl=Pin(21), sda=Pin(22), freq=freq)
+
+
+def rate(function, duration):
+    count, t0 = 0, ticks_us()
+    while ticks_diff(ticks_us(), t0) < duration * 1e6 :
+        function()
+        count += 1
+    return count / (ticks_diff(ticks_us(), t0) * 1e-6)
+
+
+def percentile(values, p):
+    if not values :
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+# Cycles update() par seconde et trafic par cycle
+def bench_update(duration):
+    result = {}
+    for freq in (100000, 400000) :
+        for burst in (False, True) :
+            robot = MaqueenPlusV1(make_i2c(freq), burst=burst, scheduler=False)
+            robot.update()
+            robot.stats.reset()
+            cps   = rate(robot.update, duration)
+            stats = robot.stats.as_dict()
+            name  = "%dk_%s" % (freq // 1000, "burst" if burst else "split")
+            result[name + "_cycles_s"] = round(cps, 1)
+            result[name + "_bytes_cycle"] = round((stats["read_bytes"] + stats["write_bytes"]) / stats["cycles"], 1)
+            result[name + "_transactions_cycle"] = round((stats["reads"] + stats["writes"]) / stats["cycles"], 1)
+            result[name + "_cycle_avg_us"] = stats["cycle_avg_us"]
+    return result
+
+
+# Délai entre l'affectation de moteurs et la réception de la commande par le Maqueen simulé
+def bench_latency(duration, period_ms=20):
+    scheduler = Scheduler()
+    robot     = MaqueenPlusV1(make_i2c(), scheduler=scheduler, period_ms=period_ms, gap_us=0)
+    device    = i2csim.bus(1).devices[0x10]
+    scheduler.start()
+    sleep(0.05)
+    from time import monotonic
+    from random import random
+    delays = []
+    count  = max(10, int(duration * 1000 / period_ms / 2))
+    for i in range(count) :
+        sleep(random() * period_ms / 1000)
+        speed = 1 + i % 200
+        n     = len(device.writes)
+        t0    = monotonic()
+        robot.moteurs = (speed, speed)
+        while device.motors != (speed, speed) :
+            sleep(0.0002)
+        for data, t in zip(device.writes[n:], device.write_times[n:]) :
+            if data[0] == 0x00 and data[2] == speed :
+                delays.append((t - t0) * 1000)
+                break
+    scheduler.stop()
+    sleep(0.05)
+    return {"period_ms": period_ms, "mean_ms": round(sum(delays) / len(delays), 2),
+            "p95_ms": round(percentile(delays, 0.95), 2), "max_ms": round(max(delays), 2)}
+
+
+def bench_imu(duration):
+    result = {}
+    for freq in (100000, 400000) :
+        i2c = make_i2c(freq)
+        mpu = MPU(i2c, calibration=None)
+        result["%dk_samples_s" % (freq // 1000)] = round(rate(mpu.read_data, duration), 1)
+    result["bytes_sample"] = 15      # registre + 14 octets (accel, temp, gyro)
+    return result
+
+
+def bench_tmp(duration):
+    result = {}
+    for freq in (100000, 400000) :
+        tmp = Tmp1075(make_i2c(freq))
+        result["%dk_reads_s" % (freq // 1000)] = round(rate(lambda : tmp.temp, duration), 1)
+    return result
+
+
+def bench_recorder(duration):
+    from recorder import Recorder, CHANNELS
+    i2c   = make_i2c()
+    mpu   = MPU(i2c, calibration=None)
+    tmp   = Tmp1075(i2c)
+    robot = MaqueenPlusV1(i2c, scheduler=False)
+    path  = "record.bin" if not SIM else "/tmp/bench_record.bin"
+    rec   = Recorder(robot, path, tuple(CHANNELS), mpu=mpu, tmp=tmp)
+    result = {"record_bytes": rec.size}
+    for name, recording in (("without", False), ("with", True)) :
+        if recording :
+            rec.start()
+        robot.stats.reset()
+        end = ticks_us()
+        while ticks_diff(ticks_us(), end) < duration * 1e6 :
+            robot.update()
+            rec.flush()
+        result["cycle_avg_us_" + name] = robot.stats.as_dict()["cycle_avg_us"]
+    rec.stop()
+    stats = rec.stats.as_dict()
+    for key in ("record_avg_us", "record_max_us", "flush_avg_us", "flush_max_us", "dropped") :
+        result[key] = stats[key]
+    return result
+
+
+def bench_replay(duration, cycles=200):
+    import io
+    import maqueen
+    from i2ctrace import I2C_trace
+    from replay   import ReplayI2C, load
+    from odometry import Odometry
+
+    stream = io.BytesIO()
+    trace  = I2C_trace(make_i2c(), stream)
+    robot  = MaqueenPlusV1(trace, scheduler=False)
+    for i in range(cycles) :
+        robot.moteurs = (50 + i % 100, 80)
+        robot.update()
+    trace.flush()
+    records = load(stream.getvalue())
+
+    count, elapsed = 0, 0
+    while elapsed < duration * 1e6 :
+        bus     = ReplayI2C(records)
+        restore = bus.install_clock(maqueen)
+        robot   = MaqueenPlusV1(bus, scheduler=False)
+        Odometry(robot)
+        t0 = ticks_us()
+        for i in range(cycles) :
+            robot.moteurs = (50 + i % 100, 80)
+            robot.update()
+        elapsed += ticks_diff(ticks_us(), t0)
+        count   += cycles
+        restore()
+    return {"trace_bytes_cycle": round(trace.bytes / cycles, 1),
+            "transactions_cycle": round(trace.transactions / cycles, 1),
+            "replay_cycles_s": round(count / (elapsed * 1e-6), 1)}
+
+
+def bench_server(duration):
+    import os
+    import socket
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "host"))
+    import client
+    from server import TelemetryServer
+    from time import monotonic
+
+    result = {}
+    for udp in (False, True) :
+        scheduler = Scheduler(idle_ms=1)
+        robot     = MaqueenPlusV1(make_i2c(), scheduler=scheduler, period_ms=5, gap_us=0)
+        server    = TelemetryServer(robot, port=0, udp=udp, rate_hz=200, max_rate_hz=200)
+        server.start(scheduler, period_ms=1)
+        scheduler.start()
+        c = client.Client("127.0.0.1", server.address[1], udp=udp)
+        c.read()
+        name  = "udp" if udp else "tcp"
+        t0    = monotonic()
+        c.frames = c.bytes = 0
+        while monotonic() - t0 < duration :
+            c.read()
+        elapsed = monotonic() - t0
+        result[name + "_states_s"] = round(c.frames / elapsed, 1)
+        result[name + "_bytes_s"]  = int(c.bytes / elapsed)
+
+        # Commande moteur -> premier etat la montrant
+        delays = []
+        for speed in range(1, 11) :
+            t = monotonic()
+            c.motors(speed, speed)
+            while True :
+                state = c.read()
+                if state is not None and state.motor_l == speed :
+                    break
+            delays.append((monotonic() - t) * 1000)
+        result[name + "_command_ms"] = round(sum(delays) / len(delays), 2)
+        c.close()
+        scheduler.stop()
+        server.stop()
+        sleep(0.05)
+
+    # Client lent : connecte, ne lit jamais
+    scheduler = Scheduler(idle_ms=1)
+    robot     = MaqueenPlusV1(make_i2c(), scheduler=scheduler, period_ms=5, gap_us=0)
+    server    = TelemetryServer(robot, port=0, rate_hz=200, max_rate_hz=200, sndbuf=2048)
+    server.start(scheduler, period_ms=1)
+    slow = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    slow.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+    slow.connect(("127.0.0.1", server.address[1]))
+    scheduler.start()
+    sleep(duration)
+    scheduler.stop()
+    stats = server.stats.as_dict()
+    result["slow_client_frames"]      = stats["frames"]
+    result["slow_client_dropped"]     = stats["dropped"]
+    result["slow_client_poll_max_us"] = stats["poll_max_us"]
+    result["slow_client_update_hz"]   = round(robot.job.runs / duration, 1)
+    result["slow_client_update_overruns"] = robot.job.overruns
+    slow.close()
+    server.stop()
+    return result
+
+
+def bench_alloc(duration):
+    import bench_alloc
+    return {name: round(value, 2) for name, value in bench_alloc.run().items()}
+
+
+# Ecrivain moteurs 50 Hz + Maqueen 100 Hz (+ IMU 200 Hz sur un second thread)
+def scenario(duration, imu=False):
+    from time import monotonic
+    i2c       = I2C_manage(make_i2c())
+    bus       = i2c.i2c.bus
+    device    = bus.devices[0x10]
+    scheduler = Scheduler()
+    robot     = MaqueenPlusV1(i2c, scheduler=scheduler, period_ms=10)
+    sent      = {}
+    counter   = [0]
+
+    def writer():
+        counter[0] += 1
+        speed = 1 + counter[0] % 200
+        sent[speed] = monotonic()
+        robot.moteurs = (speed, -speed)
+    writer_job = scheduler.add(writer, 20, "writer")
+
+    imu_scheduler = None
+    if imu :
+        mpu = MPU(i2c, calibration=None)
+        imu_scheduler = Scheduler()
+        imu_job = imu_scheduler.add(mpu.read_data, 5, "imu")
+
+    sleep(0.1)
+    bus.reset_counters()
+    robot.stats.reset()
+    start = len(device.writes)
+    for job in scheduler.jobs :
+        job.reset_stats()
+        job.deadline = ticks_us()
+    t0 = monotonic()
+    scheduler.start()
+    if imu_scheduler :
+        imu_scheduler.start()
+    sleep(duration)
+    scheduler.stop()
+    if imu_scheduler :
+        imu_scheduler.stop()
+    elapsed = monotonic() - t0
+    sleep(0.05)
+
+    delays = []
+    for data, t in zip(device.writes[start:], device.write_times[start:]) :
+        if data[0] == 0x00 and data[2] in sent :
+            delays.append((t - sent[data[2]]) * 1000)
+    stats  = robot.stats.as_dict()
+    job    = robot.job
+    result = {"update_hz": round(job.runs / elapsed, 1), "writer_hz": round(writer_job.runs / elapsed, 1),
+              "update_overruns": job.overruns, "update_jitter_avg_us": int(job.jitter_avg),
+              "update_jitter_max_us": job.jitter_max, "cycle_avg_us": stats["cycle_avg_us"],
+              "cycle_max_us": stats["cycle_max_us"], "dropped": stats["dropped"],
+              "command_latency_mean_ms": round(sum(delays) / len(delays), 2) if delays else None,
+              "command_latency_max_ms": round(max(delays), 2) if delays else None,
+              "bus_utilisation": round(bus.busy_us / (elapsed * 1e6), 3),
+              "bus_bytes_s": int(bus.bytes / elapsed), "collisions": bus.collisions}
+    if imu :
+        result["imu_hz"] = round(imu_job.runs / elapsed, 1)
+        result["imu_wait_max_us"] = i2c.device_stats(0x69).as_dict()["wait_max_us"]
+    return result
+
+
+def bench_scenario(duration):
+    result = {}
+    for name, value in scenario(duration).items() :
+        result["motor50_line100_" + name] = value
+    for name, value in scenario(duration, imu=True).items() :
+        result["motor50_line100_imu200_" + name] = value
+    return result
+
+
+BENCHMARKS = (("update", bench_update, False), ("latency", bench_latency, True),
+              ("imu", bench_imu, False), ("tmp", bench_tmp, False),
+              ("alloc", bench_alloc, False), ("recorder", bench_recorder, False),
+              ("replay", bench_replay, True), ("server", bench_server, True),
+              ("scenario", bench_scenario, True))
+
+
+def compare(results, reference):
+    for bench, values in results.items() :
+        if bench == "meta" :
+            continue
+        for name, value in values.items() :
+            old = reference.get(bench, {}).get(name)
+            if isinstance(value, (int, float)) and isinstance(old, (int, float)) and old :
+                print("%-10s %-40s %12s -> %12s  %+6.1f %%" % (bench, name, old, value, (value - old) * 100 / old))
+
+
+def main(argv=()):
+    argv     = list(argv)
+    duration = DURATION
+    output   = reference = None
+    if "--quick" in argv :
+        argv.remove("--quick")
+        duration = 0.3
+    if "--json" in argv :
+        i = argv.index("--json")
+        output = argv[i + 1]
+        del argv[i:i + 2]
+    if "--compare" in argv :
+        i = argv.index("--compare")
+        reference = argv[i + 1]
+        del argv[i:i + 2]
+
+    results = {"meta": {"platform": sys.platform, "implementation": sys.implementation.name,
+                        "simulated": SIM, "duration_s": duration}}
+    for name, function, sim_only in BENCHMARKS :
+        if argv and name not in argv :
+            continue
+        if sim_only and not SIM :
+            continue
+        results[name] = function(duration)
+        for key, value in results[name].items() :
+            print("%-10s %-40s %s" % (name, key, value))
+
+    if output :
+        with open(output, "w") as f :
+            json.dump(results, f, indent=1)
+    if reference :
+        with open(reference) as f :
+            compare(results, json.load(f))
+    return results
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,164 @@
+# Client CPython du serveur de télémétrie (lib/server.py)
+#
+#   python host/client.py 192.168.4.1 [port] [--udp]     (affiche les états reçus)
+#
+#   import client
+#   robot = client.Client("192.168.4.1")
+#   robot.rate(50)
+#   robot.motors(80, 80, 1000)          # 1 s puis arrêt (fait par le robot)
+#   for state in robot.states() :       # State : seq, ticks, motor_l, ..., x, y, theta
+#       print(state.seq, state.encoder_l, state.theta)
+#   robot.close()
+
+import os
+import sys
+import socket
+import struct
+from time import monotonic
+from collections import namedtuple
+
+try :
+    import server
+except ImportError :
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib"))
+    import server
+
+State = namedtuple("State", server.SNAPSHOT_FIELDS)
+
+_HEADER_SIZE = struct.calcsize(server.HEADER)
+
+
+# Classe Client
+#  -  host, port, udp : adresse du serveur, transport (TCP par défaut)
+#  -  keepalive : UDP : HELLO renvoyé toutes les keepalive s (abonnement maintenu)
+#  -  motors / lights / pixel / fill / show / stop / rate : commandes
+#  -  read    : prochain état (None si délai dépassé)
+#  -  states  : générateur d'états
+#  -  frames, bytes, errors : compteurs de réception
+class Client():
+    def __init__(self, host="127.0.0.1", port=8765, udp=False, timeout=2.0, keepalive=0.5):
+        self.udp       = udp
+        self.timeout   = timeout
+        self.keepalive = keepalive
+        self.frames    = 0
+        self.bytes     = 0
+        self.errors    = 0
+        self.__addr    = (host, port)
+        self.__rx      = b""
+        self.__sent    = 0.0
+        if udp :
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.settimeout(min(timeout, keepalive))
+            self.__send(server.HELLO)
+        else :
+            self.sock = socket.create_connection(self.__addr, timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def close(self):
+        if self.udp :
+            try :
+                self.__send(server.BYE)
+            except OSError :
+                pass
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __send(self, kind, payload=b""):
+        frame = struct.pack(server.HEADER, server.MAGIC, kind, len(payload)) + payload
+        if self.udp :
+            self.sock.sendto(frame, self.__addr)
+        else :
+            self.sock.sendall(frame)
+        self.__sent = monotonic()
+
+    def motors(self, left, right, duration_ms=0):
+        self.__send(server.MOTORS, struct.pack("<hhH", left, right, duration_ms))
+
+    def lights(self, left, right):
+        self.__send(server.LIGHTS, struct.pack("<BB", left, right))
+
+    def pixel(self, index, color):
+        self.__send(server.PIXEL, struct.pack("<BBBB", index, *color))
+
+    def fill(self, color):
+        self.pixel(0xFF, color)
+
+    def show(self):
+        self.__send(server.PIXEL_WRITE)
+
+    def stop(self):
+        self.__send(server.STOP)
+
+    def rate(self, rate_hz):
+        self.__send(server.RATE, struct.pack("<H", rate_hz))
+
+    # Trame suivante (type, données) ; None si délai dépassé
+    def __frame(self):
+        try :
+            if self.udp :
+                return self.__datagram()
+            while True :
+                if len(self.__rx) >= _HEADER_SIZE :
+                    magic, kind, size = struct.unpack_from(server.HEADER, self.__rx)
+                    if magic != server.MAGIC :
+                        raise ValueError("stream out of sync")
+                    if len(self.__rx) >= _HEADER_SIZE + size :
+                        payload   = self.__rx[_HEADER_SIZE:_HEADER_SIZE + size]
+                        self.__rx = self.__rx[_HEADER_SIZE + size:]
+                        return (kind, size), payload
+                data = self.sock.recv(4096)
+                if not data :
+                    raise ConnectionError("connection closed by the robot")
+                self.bytes += len(data)
+                self.__rx  += data
+        except socket.timeout :
+            return None
+
+    # Datagramme suivant (UDP), abonnement entretenu pendant l'attente
+    def __datagram(self):
+        deadline = monotonic() + self.timeout
+        while True :
+            if monotonic() - self.__sent >= self.keepalive :
+                self.__send(server.HELLO)
+            try :
+                data = self.sock.recv(1024)
+            except socket.timeout :
+                if monotonic() >= deadline :
+                    raise
+                continue
+            self.bytes += len(data)
+            return struct.unpack_from(server.HEADER, data)[1:], data[_HEADER_SIZE:]
+
+    def read(self):
+        while True :
+            frame = self.__frame()
+            if frame is None :
+                return None
+            (kind, size), payload = frame
+            if kind == server.SNAPSHOT and size == struct.calcsize(server.SNAPSHOT_FORMAT) :
+                self.frames += 1
+                return State(*struct.unpack(server.SNAPSHOT_FORMAT, payload))
+            self.errors += 1
+
+    def states(self):
+        while True :
+            state = self.read()
+            if state is None :
+                return
+            yield state
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if not args :
+        print("usage : python host/client.py host [port] [--udp]")
+        sys.exit(1)
+    port = int(args[1]) if len(args) > 1 else 8765
+    with Client(args[0], port, udp="--udp" in sys.argv) as robot :
+        for state in robot.states() :
+            print(state)
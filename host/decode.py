@@ -0,0 +1,118 @@
+# Décodage sur l'hôte (CPython) des fichiers de recorder.Recorder
+#
+#   python host/decode.py record.bin                  (résumé)
+#   python host/decode.py record.bin --csv record.csv
+#
+#   import decode
+#   columns, rows = decode.read("record.bin")        # liste de tuples
+#   data = decode.to_numpy("record.bin")             # {colonne: tableau}, NumPy requis
+#
+# Le format des enregistrements est lu dans l'en-tête du fichier : aucune
+# dépendance aux librairies de la carte. temp (-32768 = non lu) est converti
+# en degC (NaN / vide si non lu).
+
+import sys
+import csv
+import struct
+
+MAGIC   = b"MQRC"
+VERSION = 1
+
+_DTYPES = {"b": "i1", "B": "u1", "h": "i2", "H": "u2", "i": "i4", "I": "u4", "f": "f4"}
+
+
+def read_header(f):
+    if f.read(4) != MAGIC :
+        raise ValueError("not a recorder file")
+    version, size, length = struct.unpack("<BHH", f.read(5))
+    if version != VERSION :
+        raise ValueError("unsupported recorder version %d" % version)
+    fmt, columns = f.read(length).decode().split(";")
+    columns = columns.split(",")
+    if struct.calcsize(fmt) != size :
+        raise ValueError("record size mismatch")
+    return fmt, columns
+
+
+def read(path):
+    with open(path, "rb") as f :
+        fmt, columns = read_header(f)
+        data = f.read()
+    size  = struct.calcsize(fmt)
+    count = len(data) // size                  # Dernier enregistrement incomplet ignoré
+    index = columns.index("temp") if "temp" in columns else None
+    rows  = []
+    for row in struct.iter_unpack(fmt, data[:count * size]) :
+        if index is not None :
+            row = list(row)
+            row[index] = None if row[index] == -32768 else row[index] / 100
+            row = tuple(row)
+        rows.append(row)
+    return columns, rows
+
+
+# Type structuré NumPy équivalent au format struct (une colonne par valeur)
+def _dtype(fmt, columns):
+    fields = []
+    count  = ""
+    names  = iter(columns)
+    for c in fmt.lstrip("<") :
+        if c.isdigit() :
+            count += c
+            continue
+        for _ in range(int(count or 1)) :
+            fields.append((next(names), "<" + _DTYPES[c]))
+        count = ""
+    return fields
+
+
+def to_numpy(path):
+    import numpy as np
+    with open(path, "rb") as f :
+        fmt, columns = read_header(f)
+        data = f.read()
+    dtype = np.dtype(_dtype(fmt, columns))
+    count = len(data) // dtype.itemsize
+    array = np.frombuffer(data, dtype, count)
+    result = {}
+    for name in columns :
+        result[name] = array[name].copy()
+    if "temp" in result :
+        temp = result["temp"].astype("f4")
+        temp[result["temp"] == -32768] = np.nan
+        result["temp"] = temp / 100
+    return result
+
+
+def to_csv(path, output):
+    columns, rows = read(path)
+    with open(output, "w", newline="") as f :
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows :
+            writer.writerow(["" if value is None else value for value in row])
+    return len(rows)
+
+
+def summary(path):
+    columns, rows = read(path)
+    print("%s : %d enregistrements, colonnes %s" % (path, len(rows), ", ".join(columns)))
+    if len(rows) >= 2 :
+        seq   = [row[0] for row in rows]
+        ticks = [row[1] for row in rows]
+        lost  = sum(b - a - 1 for a, b in zip(seq, seq[1:]) if b > a + 1)
+        span  = ticks[-1] - ticks[0]
+        print("cycles %d -> %d (%d non enregistrés), %d ms, %.1f Hz"
+              % (seq[0], seq[-1], lost, span, (len(rows) - 1) * 1000 / span if span else 0))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args :
+        print("usage : python host/decode.py record.bin [--csv output.csv]")
+        sys.exit(1)
+    if "--csv" in args :
+        i = args.index("--csv")
+        print(to_csv(args[0], args[i + 1]), "lignes écrites dans", args[i + 1])
+    else :
+        summary(args[0])
@@ -0,0 +1,319 @@
+# Interface asynchrone (uasyncio / asyncio) des pilotes : une seule boucle, sans thread
+#
+# Les pilotes restent synchrones (API inchangée) ; ce module les cadence sur
+# la boucle d'événements à la place de tools.Scheduler / tools.Thread :
+#
+#  -  Periodic      : tâche périodique sans dérive (statistiques tools.Job)
+#  -  AsyncMaqueen  : await update(), start_updates(period_ms), flux de Snapshot,
+#                     mouvements temporisés, wait_snapshot
+#  -  AsyncMPU      : await read(), flux d'échantillons à fréquence fixe
+#  -  AsyncTmp1075  : await read() (conversion one-shot sans bloquer la boucle)
+#  -  AsyncMotion   : primitives de motion.MotionQueue attendues jusqu'à la fin
+#  -  wait          : attente de la fin d'un motion.Move
+#
+# Les accès I2C eux-mêmes restent bloquants (quelques centaines de us) ;
+# les attentes (périodes, délais de conversion, mouvements) rendent la main
+# à la boucle. Le robot doit être créé sans tâche propre (scheduler=False).
+#
+# Exemple :
+#   maqueen = AsyncMaqueen(MaqueenPlusV1(mbits.i2c, scheduler=False))
+#   mpu     = AsyncMPU(mbits.mpu)
+#
+#   async def telemetry():
+#       async for snap in maqueen.snapshots() :
+#           ...                                     # snap : copie, valable jusqu'au suivant
+#
+#   async def main():
+#       maqueen.start_updates(20)
+#       asyncio.create_task(telemetry())
+#       await maqueen.moteurs(80, 80, 1000)         # 1 s puis arrêt
+#       async for mpu in mpu.stream(100) :
+#           print(mpu.gyro)
+#
+#   aio.run(main())
+
+try :
+    import uasyncio as asyncio
+except ImportError :
+    import asyncio
+
+from tools import Job, ticks_us, ticks_diff, ticks_add
+
+if hasattr(asyncio, "sleep_ms") :
+    sleep_ms = asyncio.sleep_ms
+else :
+    def sleep_ms(ms):
+        return asyncio.sleep(ms / 1000)
+
+
+def run(main):
+    return asyncio.run(main)
+
+
+# Attente d'une échéance (ticks_us) : sommeil à la ms, puis au moins un passage de boucle
+async def _until(deadline):
+    left = ticks_diff(deadline, ticks_us())
+    if left >= 1000 :
+        await sleep_ms(left // 1000)
+    else :
+        await sleep_ms(0)
+
+
+# Attente de la fin d'un motion.Move (True si terminé, False si annulé ou délai dépassé)
+async def wait(move, timeout_ms=None, poll_ms=5):
+    start = ticks_us()
+    while not move.done :
+        if timeout_ms is not None and ticks_diff(ticks_us(), start) >= timeout_ms * 1000 :
+            return False
+        await sleep_ms(poll_ms)
+    return not move.cancelled
+
+
+# Classe Periodic
+#  -  Exécute function toutes les period_ms sur la boucle (échéances absolues, sans dérive)
+#  -  job : tools.Job (runs, overruns, jitter, erreurs et backoff comme le Scheduler)
+#  -  start / stop
+class Periodic():
+    def __init__(self, function, period_ms, name=None, **kwargs):
+        self.job     = Job(function, period_ms, name, **kwargs)
+        self.__task  = None
+        self.__state = False
+
+    @property
+    def running(self):
+        return self.__state
+
+    def start(self):
+        if self.__state :
+            return self.__task
+        self.__state = True
+        self.job.deadline = ticks_us()
+        self.__task = asyncio.create_task(self.__loop())
+        return self.__task
+
+    def stop(self):
+        self.__state = False
+        if self.__task is not None :
+            self.__task.cancel()
+            self.__task = None
+
+    async def __loop(self):
+        job = self.job
+        while self.__state :
+            await _until(job.deadline)
+            now = ticks_us()
+            if self.__state and ticks_diff(now, job.deadline) >= 0 :
+                job.run(now)
+
+
+# Flux de Snapshot (async for) : attend chaque nouvel état publié par update()
+#  -  missed : cycles publiés sans avoir été lus (consommateur trop lent)
+class _Snapshots():
+    def __init__(self, owner, robot, dest):
+        self.missed  = 0
+        self.__owner = owner
+        self.__robot = robot
+        self.__dest  = dest
+        self.__event = asyncio.Event()
+        self.__seq   = robot.seq
+        owner._register(self.__event)
+
+    def close(self):
+        self.__owner._unregister(self.__event)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while self.__robot.seq == self.__seq :
+            self.__event.clear()
+            await self.__event.wait()
+        snap = self.__robot.read_snapshot(self.__dest)
+        if self.__seq and snap.seq > self.__seq + 1 :
+            self.missed += snap.seq - self.__seq - 1
+        self.__seq = snap.seq
+        return snap
+
+
+# Classe AsyncMaqueen
+#  -  robot       : MaqueenPlusV1 / V2 créé avec scheduler=False
+#  -  update      : await update() (un cycle, puis passage de boucle)
+#  -  start_updates / stop_updates : cycle update() périodique sur la boucle
+#                   (job : statistiques)
+#  -  snapshots   : flux async for de copies du dernier état (dest : Snapshot réutilisé)
+#  -  wait_snapshot : attente d'un état plus récent que seq (par défaut : le courant)
+#  -  moteurs     : await moteurs(L, R, duration_ms) : arrêt par update() puis retour
+#                   (start_updates requis ; RuntimeError si aucun cycle n'est publié)
+#  -  Les autres attributs (stop, phares, ground_line, stats, ...) sont ceux du robot,
+#     en lecture comme en écriture (AttributeError si le robot ne les a pas)
+class AsyncMaqueen():
+    __OWN = ("robot", "periodic", "_AsyncMaqueen__events")
+
+    def __init__(self, robot):
+        self.robot    = robot
+        self.periodic = None
+        self.__events = []
+        robot.add_listener(self.__published)
+
+    def __getattr__(self, name):
+        return getattr(self.robot, name)
+
+    # amaqueen.phares = (1, 1) : écrit sur le robot, jamais sur l'enveloppe
+    def __setattr__(self, name, value):
+        if name in AsyncMaqueen.__OWN :
+            object.__setattr__(self, name, value)
+        elif hasattr(self.robot, name) :
+            setattr(self.robot, name, value)
+        else :
+            raise AttributeError("'%s' is not a robot attribute" % name)
+
+    def _register(self, event):
+        self.__events.append(event)
+
+    def _unregister(self, event):
+        if event in self.__events :
+            self.__events.remove(event)
+
+    # Appelée par update() avec chaque nouvel état
+    def __published(self, snap):
+        for event in self.__events :
+            event.set()
+
+    @property
+    def job(self):
+        return self.periodic.job if self.periodic is not None else None
+
+    async def update(self):
+        result = self.robot.update()
+        await sleep_ms(0)
+        return result
+
+    def start_updates(self, period_ms=100):
+        if self.periodic is None :
+            self.periodic = Periodic(self.robot.update, period_ms, "maqueen")
+        return self.periodic.start()
+
+    def stop_updates(self):
+        if self.periodic is not None :
+            self.periodic.stop()
+
+    def snapshots(self, dest=None):
+        return _Snapshots(self, self.robot, dest)
+
+    async def wait_snapshot(self, seq=None, timeout_ms=None):
+        robot = self.robot
+        if seq is None :
+            seq = robot.seq
+        event = asyncio.Event()
+        self._register(event)
+        try :
+            while robot.seq <= seq :
+                event.clear()
+                if timeout_ms is None :
+                    await event.wait()
+                else :
+                    await asyncio.wait_for(event.wait(), timeout_ms / 1000)
+        except asyncio.TimeoutError :
+            return None
+        finally :
+            self._unregister(event)
+        return robot.snapshot
+
+    async def moteurs(self, left, right, duration_ms=None):
+        if duration_ms is None :
+            self.robot.moteurs = (left, right)
+            return
+        periodic = self.periodic
+        if periodic is None or not periodic.running :
+            raise RuntimeError("moteurs needs start_updates")
+        self.robot.moteurs = (left, right, duration_ms / 1000)
+        await sleep_ms(duration_ms)
+        # Arrêt écrit par le cycle update() suivant l'échéance, visible au cycle d'après
+        timeout_ms = 4 * periodic.job.period // 1000
+        for _ in range(2) :
+            if await self.wait_snapshot(timeout_ms=timeout_ms) is None :
+                raise RuntimeError("no update cycle")
+
+
+# Flux d'échantillons MPU à fréquence fixe (async for), renvoie le MPU (accel, gyro, sample)
+class _Samples():
+    def __init__(self, mpu, rate_hz):
+        self.__mpu      = mpu
+        self.__period   = int(1000000 / rate_hz)
+        self.__deadline = ticks_us()
+        self.late       = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await _until(self.__deadline)
+        now = ticks_us()
+        self.__deadline = ticks_add(self.__deadline, self.__period)
+        if ticks_diff(now, self.__deadline) >= 0 :
+            self.late      += 1
+            self.__deadline = ticks_add(now, self.__period)
+        self.__mpu.read_data()
+        return self.__mpu
+
+
+# Classe AsyncMPU
+#  -  read   : await read() -> échantillon (mpu.sample : ax, ay, az, gx, gy, gz)
+#  -  stream : async for mpu in stream(rate_hz) (late : échéances manquées)
+class AsyncMPU():
+    def __init__(self, mpu):
+        self.mpu = mpu
+
+    def __getattr__(self, name):
+        return getattr(self.mpu, name)
+
+    async def read(self):
+        self.mpu.read_data()
+        await sleep_ms(0)
+        return self.mpu.sample
+
+    def stream(self, rate_hz=100):
+        return _Samples(self.mpu, rate_hz)
+
+
+# Classe AsyncTmp1075
+#  -  read : await read() ; en one-shot, la conversion (~28 ms) est attendue sur la boucle
+class AsyncTmp1075():
+    def __init__(self, tmp):
+        self.tmp = tmp
+
+    def __getattr__(self, name):
+        return getattr(self.tmp, name)
+
+    async def read(self):
+        tmp = self.tmp
+        if tmp.mode == "oneshot" :
+            try :
+                tmp.trigger()
+            except OSError :
+                return None
+            await sleep_ms(tmp.CONVERSION_MS)
+            return tmp.read(convert=False)
+        value = tmp.read()
+        await sleep_ms(0)
+        return value
+
+
+# Classe AsyncMotion
+#  -  queue : motion.MotionQueue ; chaque primitive est ajoutée à la file
+#             puis attendue (True si terminée, False si annulée)
+class AsyncMotion():
+    def __init__(self, queue):
+        self.queue = queue
+
+    async def drive(self, left, right, duration_ms=None, preempt=False):
+        return await wait(self.queue.drive(left, right, duration_ms, preempt))
+
+    async def ramp(self, start, end, time_ms, preempt=False):
+        return await wait(self.queue.ramp(start, end, time_ms, preempt))
+
+    async def rotate_by(self, angle, speed=60, tolerance=2, timeout_ms=5000, preempt=False):
+        return await wait(self.queue.rotate_by(angle, speed, tolerance, timeout_ms, preempt))
+
+    def stop(self):
+        self.queue.stop()
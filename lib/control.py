@@ -0,0 +1,305 @@
+# Asservissements du Maqueen Plus exécutés dans le cycle update() (add_listener)
+#
+#  -  PID             : régulateur PID générique (anticipation, anti-windup, rampe)
+#  -  SpeedController : vitesse de chaque roue (V1, encodeurs via odometry.Odometry)
+#  -  LineTracker     : suivi de ligne sur les capteurs sol analogiques (V1 et V2)
+#
+# Les commandes moteur émises par ces listeners partent dans le même cycle
+# update() que la lecture des capteurs.
+#
+# Exemple :
+#   maqueen    = MaqueenPlusV1(mbits.i2c, period_ms=20)
+#   odometry   = Odometry(maqueen)
+#   controller = SpeedController(maqueen, odometry)
+#   controller.speeds = (150, 150)          # mm/s
+#   controller.set_speeds(250, 250, ticks=True)
+#
+#   tracker = LineTracker(maqueen)
+#   tracker.calibrate()                     # balayer la ligne sous les capteurs
+#   tracker.calibrate(False)
+#   tracker.start(80)                       # PWM de base
+
+from array import array
+from tools import ticks_diff
+
+
+# Classe PID
+#  -  kp, ki, kd     : gains (sortie par unité d'erreur, par unité.s, par unité/s)
+#  -  kf, offset     : anticipation : kf * consigne + offset * signe(consigne)
+#  -  out_min / max  : saturation de la sortie
+#  -  slew           : variation maximale de la sortie par seconde (None = illimitée)
+#  -  Anti-windup    : l'intégrale n'est pas augmentée si la sortie est saturée
+#                      dans le sens de l'erreur
+class PID():
+    def __init__(self, kp=1.0, ki=0.0, kd=0.0, kf=0.0, offset=0.0,
+                 out_min=-255, out_max=255, slew=None):
+        self.kp      = kp
+        self.ki      = ki
+        self.kd      = kd
+        self.kf      = kf
+        self.offset  = offset
+        self.out_min = out_min
+        self.out_max = out_max
+        self.slew    = slew
+        self.reset()
+
+    def reset(self, output=0.0):
+        self.integral = 0.0
+        self.output   = output
+        self.__error  = None
+
+    def update(self, target, measure, dt):
+        error = target - measure
+        derivative = 0.0
+        if self.__error is not None and dt > 0 :
+            derivative = (error - self.__error) / dt
+        self.__error = error
+
+        feed = self.kf * target
+        if target > 0 :
+            feed += self.offset
+        elif target < 0 :
+            feed -= self.offset
+
+        integral = self.integral + error * dt
+        output   = feed + self.kp * error + self.ki * integral + self.kd * derivative
+
+        # Saturation et anti-windup (intégration conditionnelle)
+        if output > self.out_max :
+            output = self.out_max
+            if error < 0 :
+                self.integral = integral
+        elif output < self.out_min :
+            output = self.out_min
+            if error > 0 :
+                self.integral = integral
+        else :
+            self.integral = integral
+
+        # Limitation de la variation de sortie
+        if self.slew is not None and dt > 0 :
+            step = self.slew * dt
+            if output > self.output + step :
+                output = self.output + step
+            elif output < self.output - step :
+                output = self.output - step
+        self.output = output
+        return output
+
+
+# Classe SpeedController
+#  -  Asservit la vitesse de chaque roue (mm/s) à partir des vitesses de l'odométrie
+#  -  Le calcul est fait à chaque cycle update() du Maqueen (même période), après
+#     l'odométrie (Odometry.add_listener), quel que soit l'ordre de création
+#  -  kf : PWM par mm/s (anticipation), offset : PWM de démarrage (frottements)
+#  -  deadband : écart de PWM minimal pour envoyer une nouvelle commande moteur
+#  -  speeds : consignes [L, R] (mm/s) ; set_speeds(..., ticks=True) en impulsions/s
+#  -  writes : nombre de commandes moteur envoyées
+#  -  stop   : consigne nulle (arrêt immédiat) ; enabled = False : suspend l'asservissement
+#
+# Désactiver le PID embarqué (maqueen.pid = 0) : les deux régulations se contrarieraient.
+class SpeedController():
+    def __init__(self, robot, odometry, kp=0.3, ki=1.5, kd=0.0, kf=0.25, offset=10,
+                 slew=1000, deadband=2):
+        self.enabled  = True
+        self.deadband = deadband
+        self.writes   = 0
+        self.pids     = (PID(kp, ki, kd, kf, offset, slew=slew),
+                         PID(kp, ki, kd, kf, offset, slew=slew))
+        self.__robot    = robot
+        self.__odometry = odometry
+        self.__target   = [0.0, 0.0]
+        self.__sent     = [0, 0]
+        self.__out      = [0, 0]          # Sorties du cycle (préallouées)
+        self.__ticks    = None
+        odometry.add_listener(self.update)
+
+    def __get_speeds(self):
+        return list(self.__target)
+
+    def __set_speeds(self, speeds):
+        self.set_speeds(speeds[0], speeds[1])
+
+    def set_speeds(self, left, right, ticks=False):
+        if ticks :
+            left  *= self.__odometry.mm_per_tick
+            right *= self.__odometry.mm_per_tick
+        self.__target[0] = left
+        self.__target[1] = right
+
+    def stop(self):
+        self.__target[0] = self.__target[1] = 0.0
+
+    def close(self):
+        self.__odometry.remove_listener(self.update)
+
+    # Appelée par l'odométrie, juste après la publication de la pose du cycle
+    def update(self, snap):
+        if not self.enabled :
+            self.__ticks = None
+            return
+        if self.__ticks is None :
+            self.__ticks = snap.ticks
+            return
+        dt = ticks_diff(snap.ticks, self.__ticks) / 1000
+        self.__ticks = snap.ticks
+        if dt <= 0 :
+            return
+
+        speeds = self.__odometry.pose.speeds
+        sent   = self.__sent
+        out    = self.__out
+        for i in range(2) :
+            pid = self.pids[i]
+            if self.__target[i] == 0 :
+                pid.reset()                 # Arrêt : pas de rampe ni d'intégrale résiduelle
+                out[i] = 0
+            else :
+                out[i] = int(pid.update(self.__target[i], speeds[i], dt))
+
+        # Commande envoyée uniquement si la sortie a significativement changé
+        changed = False
+        for i in range(2) :
+            if abs(out[i] - sent[i]) >= self.deadband or (out[i] == 0 and sent[i] != 0) :
+                changed = True
+        if changed :
+            sent[0], sent[1] = out[0], out[1]
+            self.__robot.set_motors(out[0], out[1])
+            self.writes += 1
+
+    speeds = property(__get_speeds, __set_speeds)
+
+
+# Classe LineTracker
+#  -  Position de la ligne : barycentre des capteurs normalisés (-1 gauche, +1 droite)
+#  -  positions   : position de chaque capteur, de gauche à droite (par défaut régulière)
+#  -  calibrate   : calibrate(True) mémorise le min / max de chaque capteur pendant un
+#                   balayage, calibrate(False) termine (sans calibration : 0 - 4095)
+#  -  invert      : ligne plus sombre que le fond (valeur analogique plus faible)
+#  -  threshold   : niveau normalisé à partir duquel un capteur voit la ligne
+#  -  cross       : nombre de capteurs sur la ligne signalant une intersection
+#  -  lost_mode   : "search" (tourne du côté où la ligne a été vue) ou "stop"
+#  -  position / lost / intersection / intersections : état du dernier cycle
+#  -  start(speed) / stop
+class LineTracker():
+    def __init__(self, robot, kp=60, ki=0.0, kd=4, speed=80, positions=None,
+                 threshold=0.3, cross=4, invert=False, lost_mode="search",
+                 search_speed=60, deadband=2):
+        n = len(robot.ground_analog)
+        if positions is None :
+            positions = [2 * i / (n - 1) - 1 for i in range(n)]
+        self.positions     = array('f', positions)
+        self.threshold     = threshold
+        self.cross         = cross
+        self.invert        = invert
+        self.lost_mode     = lost_mode
+        self.search_speed  = search_speed
+        self.deadband      = deadband
+        self.speed         = speed
+        self.pid           = PID(kp, ki, kd, out_min=-2 * 255, out_max=2 * 255)
+        self.enabled       = False
+        self.calibrating   = False
+        self.position      = 0.0
+        self.lost          = True
+        self.intersection  = False
+        self.intersections = 0
+        self.writes        = 0
+        self.mins          = array('f', [0] * n)
+        self.maxs          = array('f', [4095] * n)
+        self.__level       = array('f', [0] * n)
+        self.__robot       = robot
+        self.__sent        = [0, 0]
+        self.__ticks       = None
+        robot.add_listener(self.update)
+
+    def close(self):
+        self.__robot.remove_listener(self.update)
+
+    def calibrate(self, enable=True):
+        if enable :
+            for i in range(len(self.mins)) :
+                self.mins[i] = 65535
+                self.maxs[i] = 0
+        else :
+            for i in range(len(self.mins)) :
+                if self.maxs[i] <= self.mins[i] :
+                    self.mins[i], self.maxs[i] = 0, 4095     # Capteur non balayé
+        self.calibrating = enable
+
+    def start(self, speed=None):
+        if speed is not None :
+            self.speed = speed
+        self.pid.reset()
+        self.__ticks = None
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+        self.__command(0, 0, True)
+
+    def __command(self, left, right, force=False):
+        sent = self.__sent
+        if force or abs(left - sent[0]) >= self.deadband or abs(right - sent[1]) >= self.deadband :
+            sent[0], sent[1] = left, right
+            self.__robot.moteurs = (left, right)
+            self.writes += 1
+
+    # Position de la ligne à partir des valeurs analogiques du cycle
+    def __locate(self, analog):
+        level = self.__level
+        total = weighted = 0.0
+        seen  = 0
+        for i in range(len(level)) :
+            lo, hi = self.mins[i], self.maxs[i]
+            if self.calibrating :
+                if analog[i] < lo :
+                    self.mins[i] = lo = analog[i]
+                if analog[i] > hi :
+                    self.maxs[i] = hi = analog[i]
+            v = (analog[i] - lo) / (hi - lo) if hi > lo else 0.0
+            v = 0.0 if v < 0 else (1.0 if v > 1 else v)
+            if self.invert :
+                v = 1.0 - v
+            level[i]  = v
+            total    += v
+            weighted += v * self.positions[i]
+            if v >= self.threshold :
+                seen += 1
+        
+        intersection = seen >= self.cross
+        if intersection and not self.intersection :
+            self.intersections += 1
+        self.intersection = intersection
+        self.lost = seen == 0
+        if not self.lost and not intersection :
+            self.position = weighted / total
+
+    # Appelée par le Maqueen avec chaque nouvel état (Snapshot)
+    def update(self, snap):
+        self.__locate(snap.analog)
+        if not self.enabled or self.calibrating :
+            return
+        
+        dt = 0.0
+        if self.__ticks is not None :
+            dt = ticks_diff(snap.ticks, self.__ticks) / 1000
+        self.__ticks = snap.ticks
+        
+        if self.lost :
+            self.pid.reset()
+            if self.lost_mode == "search" :
+                # Rotation sur place du côté où la ligne a été vue en dernier
+                s = self.search_speed
+                if self.position >= 0 :
+                    self.__command(s, -s)
+                else :
+                    self.__command(-s, s)
+            else :
+                self.__command(0, 0)
+            return
+        
+        # Intersection : tout droit (position inchangée, pas de correction)
+        turn = 0.0 if self.intersection else self.pid.update(0.0, -self.position, dt)
+        left  = int(self.speed + turn)
+        right = int(self.speed - turn)
+        self.__command(max(-255, min(255, left)), max(-255, min(255, right)))
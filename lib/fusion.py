@@ -0,0 +1,323 @@
+# Estimation de l'orientation (roulis, tangage, cap) à partir du MPU
+#
+# Filtres (tous mis à jour par update(sample, dt), sample = array('f') de
+# 6 valeurs ax, ay, az (g), gx, gy, gz (deg/s), dt en secondes) :
+#  -  Complementary : intégration du gyroscope corrigée par l'accéléromètre
+#  -  Mahony        : quaternion, correction PI de la direction de la gravité
+#  -  Madgwick      : quaternion, descente de gradient (gain beta)
+#
+# Sans magnétomètre, le cap (yaw) est l'intégrale du gyroscope : il dérive
+# lentement, une bonne calibration du gyroscope est donc importante.
+#
+# Exemple :
+#   scheduler = Scheduler()
+#   fusion    = Fusion(mbits.mpu, Mahony(), scheduler, rate_hz=200)
+#   scheduler.start()
+#   o = fusion.orientation        # o.roll, o.pitch, o.yaw (degrés)
+
+from math        import atan2, asin, sqrt, cos, sin
+from array       import array
+from tools       import ticks_us, ticks_diff
+import micropython
+
+_DEG = 57.29577951308232
+_RAD = 0.017453292519943295
+
+
+# Angles d'Euler (degrés) depuis l'accéléromètre
+def _accel_angles(s):
+    roll  = atan2(s[1], s[2]) * _DEG
+    pitch = atan2(-s[0], sqrt(s[1]*s[1] + s[2]*s[2])) * _DEG
+    return roll, pitch
+
+
+# Classe Orientation
+#  -  Orientation publiée par Fusion (double tampon, comme maqueen.Snapshot)
+#  -  seq : numéro de mise à jour (0 = pas de donnée / en cours d'écriture)
+#  -  ticks : instant de l'échantillon (ticks_us)
+#  -  roll, pitch, yaw : degrés
+class Orientation():
+    def __init__(self):
+        self.seq   = 0
+        self.ticks = 0
+        self.roll  = 0.0
+        self.pitch = 0.0
+        self.yaw   = 0.0
+    
+    def copy_to(self, other):
+        other.seq   = self.seq
+        other.ticks = self.ticks
+        other.roll  = self.roll
+        other.pitch = self.pitch
+        other.yaw   = self.yaw
+        return other
+
+
+# Classe Complementary
+#  -  alpha : part du gyroscope (0.98 : l'accéléromètre corrige en ~1 s à 50 Hz)
+class Complementary():
+    def __init__(self, alpha=0.98):
+        self.alpha = alpha
+        self.angles = array('f', [0, 0, 0])     # roll, pitch, yaw (degrés)
+    
+    def reset(self, sample):
+        roll, pitch = _accel_angles(sample)
+        a = self.angles
+        a[0], a[1], a[2] = roll, pitch, 0
+    
+    @micropython.native
+    def update(self, sample, dt):
+        a     = self.angles
+        k     = self.alpha
+        
+        # Vitesses angulaires du repère capteur -> dérivées des angles d'Euler
+        sr = sin(a[0] * _RAD)
+        cr = cos(a[0] * _RAD)
+        cp = cos(a[1] * _RAD)
+        if -0.01 < cp < 0.01 :
+            cp = 0.01 if cp >= 0 else -0.01      # Tangage à +/-90 : cap indéterminé
+        v     = sample[4] * sr + sample[5] * cr
+        roll  = a[0] + (sample[3] + v * sin(a[1] * _RAD) / cp) * dt
+        pitch = a[1] + (sample[4] * cr - sample[5] * sr) * dt
+        yaw   = a[2] + v / cp * dt
+        if yaw > 180 :
+            yaw -= 360
+        elif yaw < -180 :
+            yaw += 360
+        a[2] = yaw
+        
+        # Correction par l'accéléromètre (si proche de 1 g)
+        n2 = sample[0]*sample[0] + sample[1]*sample[1] + sample[2]*sample[2]
+        if 0.5 < n2 < 1.5 :
+            acc_roll  = atan2(sample[1], sample[2]) * _DEG
+            acc_pitch = atan2(-sample[0], sqrt(sample[1]*sample[1] + sample[2]*sample[2])) * _DEG
+            # Passage de +/-180 : correction dans le sens le plus court
+            if acc_roll - roll > 180 :
+                acc_roll -= 360
+            elif acc_roll - roll < -180 :
+                acc_roll += 360
+            roll  = k * roll  + (1 - k) * acc_roll
+            pitch = k * pitch + (1 - k) * acc_pitch
+        if roll > 180 :
+            roll -= 360
+        elif roll < -180 :
+            roll += 360
+        a[0] = roll
+        a[1] = pitch
+    
+    def euler(self, dest):
+        a = self.angles
+        dest.roll, dest.pitch, dest.yaw = a[0], a[1], a[2]
+
+
+# Classe Quaternion (base des filtres Mahony et Madgwick)
+class _Quaternion():
+    def __init__(self):
+        self.q = array('f', [1, 0, 0, 0])
+    
+    def reset(self, sample):
+        roll, pitch = _accel_angles(sample)
+        cr, sr = cos(roll * _RAD / 2), sin(roll * _RAD / 2)
+        cp, sp = cos(pitch * _RAD / 2), sin(pitch * _RAD / 2)
+        q = self.q
+        q[0] = cr*cp
+        q[1] = sr*cp
+        q[2] = cr*sp
+        q[3] = -sr*sp
+    
+    def euler(self, dest):
+        q  = self.q
+        q0 = q[0]
+        q1 = q[1]
+        q2 = q[2]
+        q3 = q[3]
+        dest.roll  = atan2(q0*q1 + q2*q3, 0.5 - q1*q1 - q2*q2) * _DEG
+        dest.pitch = asin(max(-1.0, min(1.0, -2.0 * (q1*q3 - q0*q2)))) * _DEG
+        dest.yaw   = atan2(q1*q2 + q0*q3, 0.5 - q2*q2 - q3*q3) * _DEG
+
+
+# Classe Mahony
+#  -  kp : gain proportionnel, ki : gain intégral (compense un biais résiduel du gyro)
+class Mahony(_Quaternion):
+    def __init__(self, kp=1.0, ki=0.0):
+        _Quaternion.__init__(self)
+        self.kp = kp
+        self.ki = ki
+        self.integral = array('f', [0, 0, 0])
+    
+    @micropython.native
+    def update(self, sample, dt):
+        q  = self.q
+        q0 = q[0]
+        q1 = q[1]
+        q2 = q[2]
+        q3 = q[3]
+        gx = sample[3] * _RAD
+        gy = sample[4] * _RAD
+        gz = sample[5] * _RAD
+        ax, ay, az = sample[0], sample[1], sample[2]
+        
+        n = sqrt(ax*ax + ay*ay + az*az)
+        if n > 0 :
+            ax, ay, az = ax / n, ay / n, az / n
+            # Direction estimée de la gravité (moitié)
+            vx = q1*q3 - q0*q2
+            vy = q0*q1 + q2*q3
+            vz = q0*q0 - 0.5 + q3*q3
+            # Erreur : produit vectoriel mesure x estimation
+            ex = ay*vz - az*vy
+            ey = az*vx - ax*vz
+            ez = ax*vy - ay*vx
+            if self.ki > 0 :
+                i = self.integral
+                i[0] += 2 * self.ki * ex * dt
+                i[1] += 2 * self.ki * ey * dt
+                i[2] += 2 * self.ki * ez * dt
+                gx += i[0]
+                gy += i[1]
+                gz += i[2]
+            gx += 2 * self.kp * ex
+            gy += 2 * self.kp * ey
+            gz += 2 * self.kp * ez
+        
+        gx *= 0.5 * dt
+        gy *= 0.5 * dt
+        gz *= 0.5 * dt
+        r0 = q0 - q1*gx - q2*gy - q3*gz
+        r1 = q1 + q0*gx + q2*gz - q3*gy
+        r2 = q2 + q0*gy - q1*gz + q3*gx
+        r3 = q3 + q0*gz + q1*gy - q2*gx
+        n  = sqrt(r0*r0 + r1*r1 + r2*r2 + r3*r3)
+        q[0] = r0 / n
+        q[1] = r1 / n
+        q[2] = r2 / n
+        q[3] = r3 / n
+
+
+# Classe Madgwick
+#  -  beta : gain de correction (0.1 : lent et lisse, 0.5 : rapide et bruité)
+class Madgwick(_Quaternion):
+    def __init__(self, beta=0.1):
+        _Quaternion.__init__(self)
+        self.beta = beta
+    
+    @micropython.native
+    def update(self, sample, dt):
+        q  = self.q
+        q0 = q[0]
+        q1 = q[1]
+        q2 = q[2]
+        q3 = q[3]
+        gx = sample[3] * _RAD
+        gy = sample[4] * _RAD
+        gz = sample[5] * _RAD
+        ax, ay, az = sample[0], sample[1], sample[2]
+        
+        # Dérivée du quaternion (gyroscope)
+        d0 = 0.5 * (-q1*gx - q2*gy - q3*gz)
+        d1 = 0.5 * ( q0*gx + q2*gz - q3*gy)
+        d2 = 0.5 * ( q0*gy - q1*gz + q3*gx)
+        d3 = 0.5 * ( q0*gz + q1*gy - q2*gx)
+        
+        n = sqrt(ax*ax + ay*ay + az*az)
+        if n > 0 :
+            ax, ay, az = ax / n, ay / n, az / n
+            q0q0 = q0*q0
+            q1q1 = q1*q1
+            q2q2 = q2*q2
+            q3q3 = q3*q3
+            # Gradient de la fonction objectif (gravité)
+            s0 = 4*q0*q2q2 + 2*q2*ax + 4*q0*q1q1 - 2*q1*ay
+            s1 = 4*q1*q3q3 - 2*q3*ax + 4*q0q0*q1 - 2*q0*ay - 4*q1 + 8*q1*q1q1 + 8*q1*q2q2 + 4*q1*az
+            s2 = 4*q0q0*q2 + 2*q0*ax + 4*q2*q3q3 - 2*q3*ay - 4*q2 + 8*q2*q1q1 + 8*q2*q2q2 + 4*q2*az
+            s3 = 4*q1q1*q3 - 2*q1*ax + 4*q2q2*q3 - 2*q2*ay
+            n  = sqrt(s0*s0 + s1*s1 + s2*s2 + s3*s3)
+            if n > 0 :
+                k   = self.beta / n
+                d0 -= k * s0
+                d1 -= k * s1
+                d2 -= k * s2
+                d3 -= k * s3
+        
+        r0 = q0 + d0 * dt
+        r1 = q1 + d1 * dt
+        r2 = q2 + d2 * dt
+        r3 = q3 + d3 * dt
+        n  = sqrt(r0*r0 + r1*r1 + r2*r2 + r3*r3)
+        q[0] = r0 / n
+        q[1] = r1 / n
+        q[2] = r2 / n
+        q[3] = r3 / n
+
+
+# Classe Fusion
+#  -  Lit le MPU à fréquence fixe (tâche du Scheduler) et met à jour le filtre
+#     avec le dt réel entre deux échantillons (horodatage MPU.timestamp)
+#  -  irq=True : n'avance que sur un nouvel échantillon (MPU.irq_start(..., schedule=False))
+#  -  feed      : mise à jour depuis un échantillon externe (ex. FIFO, dt fixe)
+#  -  orientation / read_orientation : dernière orientation publiée
+class Fusion():
+    def __init__(self, mpu, filtre=None, scheduler=None, rate_hz=200, irq=False):
+        self.filtre  = filtre if filtre is not None else Mahony()
+        self.job     = None
+        self.updates = 0
+        self.__mpu   = mpu
+        self.__irq   = irq
+        self.__last  = None
+        self.__seq   = 0
+        self.__front = Orientation()
+        self.__back  = Orientation()
+        if scheduler :
+            self.job = scheduler.add(self.step, 1000 / rate_hz, "fusion")
+    
+    @property
+    def orientation(self):
+        return self.__front
+    
+    def read_orientation(self, dest=None):
+        if dest is None :
+            dest = Orientation()
+        while True :
+            o   = self.__front
+            seq = o.seq
+            o.copy_to(dest)
+            # seq nul : rien de publié (accepté), ou tampon en cours d'écriture (relu)
+            if o.seq == seq and (seq or not self.__seq) :
+                return dest
+    
+    def reset(self):
+        self.__last = None
+    
+    def step(self):
+        mpu = self.__mpu
+        if self.__irq :
+            if not mpu.poll() :
+                return False
+        else :
+            mpu.read_data()
+        
+        t = mpu.timestamp
+        if self.__last is None :
+            self.filtre.reset(mpu.sample)
+            self.__last = t
+            return False
+        dt = ticks_diff(t, self.__last) * 1e-6
+        self.__last = t
+        if dt <= 0 or dt > 0.5 :
+            return False        # Echantillon répété ou trou trop long : on ignore
+        return self.feed(mpu.sample, dt, t)
+    
+    def feed(self, sample, dt, ticks=None):
+        self.filtre.update(sample, dt)
+        self.updates += 1
+        
+        # Publication (double tampon)
+        o = self.__back
+        o.seq   = 0
+        o.ticks = ticks_us() if ticks is None else ticks
+        self.filtre.euler(o)
+        self.__seq  += 1
+        o.seq        = self.__seq
+        self.__back  = self.__front
+        self.__front = o
+        return True
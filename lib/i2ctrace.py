@@ -0,0 +1,182 @@
+# Trace binaire des transactions I2C (capture pour rejeu sur l'hôte, voir sim/replay.py)
+#
+# I2C_trace enveloppe un objet I2C (machine.I2C ou tools.I2C_manage) et
+# enregistre chaque writeto / writeto_mem / readfrom(_into) / readfrom_mem(_into) :
+# instant, adresse, registre, données écrites ou reçues, durée, erreur.
+# Les autres attributs (scan, batch, acquire, ...) sont transmis tels quels.
+#
+# Format :
+#  -  en-tête : MAGIC, version (B), début de la trace (I, ticks_us)
+#  -  une entrée par transaction : struct RECORD puis les données
+#     (absentes si la transaction a échoué)
+#        dt_us    (I) : délai depuis le début de la transaction précédente
+#                       (ou de la trace) ; 0 si elle a commencé avant
+#                       (transactions concurrentes de plusieurs threads)
+#        op       (B) : WRITE, WRITE_MEM, READ, READ_MEM
+#        addr     (B) : adresse du périphérique
+#        memaddr  (H) : registre (opérations _MEM, sinon 0)
+#        nbytes   (H) : octets écrits ou lus
+#        duration (H) : durée de la transaction (us, saturée à 65535)
+#        status   (B) : 0, ou code d'erreur (OSError) : l'erreur est relancée
+#
+# Les entrées sont préparées dans un tampon en RAM et écrites par blocs dans
+# le flux (fichier ouvert en "wb", io.BytesIO, ...).
+#
+# Exemple :
+#   f     = open("/session.i2c", "wb")
+#   trace = I2C_trace(mbits.i2c, f)
+#   maqueen = MaqueenPlusV1(trace)
+#   ...
+#   trace.close()                      # vide le tampon et ferme le flux
+
+import struct
+import _thread
+from tools import ticks_us, ticks_diff
+
+MAGIC   = b"I2CT"
+VERSION = 1
+RECORD  = "<IBBHHHB"
+
+WRITE     = 0
+WRITE_MEM = 1
+READ      = 2
+READ_MEM  = 3
+
+
+# Classe I2C_trace
+#  -  i2c     : objet I2C enveloppé
+#  -  stream  : flux binaire de sortie (write, et flush / close s'ils existent)
+#  -  buffer  : taille du tampon en RAM (octets)
+#  -  transactions, errors, bytes : compteurs (bytes : taille de la trace)
+#  -  flush / close
+class I2C_trace():
+    def __init__(self, i2c, stream, buffer=4096):
+        self.transactions = 0
+        self.errors       = 0
+        self.bytes        = 0
+        self.__i2c    = i2c
+        self.__stream = stream
+        self.__lock   = _thread.allocate_lock()
+        self.__buffer = bytearray(buffer)
+        self.__view   = memoryview(self.__buffer)
+        self.__used   = 0
+        self.__size   = struct.calcsize(RECORD)
+        self.__last   = ticks_us()
+        header = MAGIC + struct.pack("<BI", VERSION, self.__last & 0xFFFFFFFF)
+        stream.write(header)
+        self.bytes += len(header)
+
+    # Attributs non tracés (scan, batch, acquire, i2c, stats, ...)
+    def __getattr__(self, name):
+        return getattr(self.__i2c, name)
+
+    def flush(self):
+        with self.__lock :
+            self.__flush()
+        if hasattr(self.__stream, "flush") :
+            self.__stream.flush()
+
+    def close(self):
+        self.flush()
+        if hasattr(self.__stream, "close") :
+            self.__stream.close()
+
+    def __flush(self):
+        if self.__used :
+            self.__stream.write(self.__view[:self.__used])
+            self.__used = 0
+
+    def __log(self, op, addr, memaddr, nbytes, data, start, status):
+        end = ticks_us()
+        n   = 0 if data is None else len(data)
+        with self.__lock :
+            # Transactions concurrentes : une entrée commencée avant la précédente
+            # est datée comme elle (dt >= 0, horloge de la trace croissante)
+            dt = ticks_diff(start, self.__last)
+            if dt > 0 :
+                self.__last = start
+            else :
+                dt = 0
+            if self.__used + self.__size + n > len(self.__buffer) :
+                self.__flush()
+            buffer, used = self.__buffer, self.__used
+            duration = ticks_diff(end, start)
+            struct.pack_into(RECORD, buffer, used, dt, op, addr, memaddr, nbytes,
+                             duration if duration < 65535 else 65535, status)
+            used += self.__size
+            if used + n > len(buffer) :
+                # Entrée plus grande que le tampon : écrite directement
+                self.__stream.write(self.__view[:used])
+                self.__stream.write(data)
+                used = 0
+            else :
+                for i in range(n) :
+                    buffer[used + i] = data[i]
+                used += n
+            self.__used   = used
+            self.transactions += 1
+            self.bytes        += self.__size + n
+            if status :
+                self.errors += 1
+
+    @staticmethod
+    def __status(error):
+        code = error.args[0] if error.args and isinstance(error.args[0], int) else 0xFF
+        return (code & 0xFF) or 0xFF
+
+    def writeto(self, addr, buf, stop=True):
+        start = ticks_us()
+        try :
+            result = self.__i2c.writeto(addr, buf, stop)
+        except OSError as error :
+            self.__log(WRITE, addr, 0, len(buf), None, start, I2C_trace.__status(error))
+            raise
+        self.__log(WRITE, addr, 0, len(buf), buf, start, 0)
+        return result
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        start = ticks_us()
+        try :
+            self.__i2c.writeto_mem(addr, memaddr, buf, addrsize=addrsize)
+        except OSError as error :
+            self.__log(WRITE_MEM, addr, memaddr, len(buf), None, start, I2C_trace.__status(error))
+            raise
+        self.__log(WRITE_MEM, addr, memaddr, len(buf), buf, start, 0)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        start = ticks_us()
+        try :
+            data = self.__i2c.readfrom(addr, nbytes, stop)
+        except OSError as error :
+            self.__log(READ, addr, 0, nbytes, None, start, I2C_trace.__status(error))
+            raise
+        self.__log(READ, addr, 0, len(data), data, start, 0)
+        return data
+
+    def readfrom_into(self, addr, buf, stop=True):
+        start = ticks_us()
+        try :
+            self.__i2c.readfrom_into(addr, buf, stop)
+        except OSError as error :
+            self.__log(READ, addr, 0, len(buf), None, start, I2C_trace.__status(error))
+            raise
+        self.__log(READ, addr, 0, len(buf), buf, start, 0)
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        start = ticks_us()
+        try :
+            data = self.__i2c.readfrom_mem(addr, memaddr, nbytes, addrsize=addrsize)
+        except OSError as error :
+            self.__log(READ_MEM, addr, memaddr, nbytes, None, start, I2C_trace.__status(error))
+            raise
+        self.__log(READ_MEM, addr, memaddr, len(data), data, start, 0)
+        return data
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        start = ticks_us()
+        try :
+            self.__i2c.readfrom_mem_into(addr, memaddr, buf, addrsize=addrsize)
+        except OSError as error :
+            self.__log(READ_MEM, addr, memaddr, len(buf), None, start, I2C_trace.__status(error))
+            raise
+        self.__log(READ_MEM, addr, memaddr, len(buf), buf, start, 0)
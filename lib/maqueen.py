@@ -2,106 +2,373 @@
 from machine  import Pin, I2C, PWM, ADC
 from time     import sleep
 from neopixel import NeoPixel
-import struct
-from tools    import Thread
+import _thread
+from tools    import Thread, Stats, ticks_ms, ticks_us, ticks_diff, ticks_add, sleep_ms, sleep_us
+from micropython import const
+from profiles import Profile
 
 
-def __select_value(new, old):
+# Index des compteurs de MaqueenPlusBridge.stats (voir MaqueenPlusBridge.STATS)
+_CYCLES          = const(0)
+_READS           = const(1)
+_READ_BYTES      = const(2)
+_WRITES          = const(3)
+_WRITE_BYTES     = const(4)
+_READ_ERRORS     = const(5)
+_WRITE_ERRORS    = const(6)
+_ERRORS          = const(7)     # 4 compteurs : Stats.ERRORS
+_LISTENER_ERRORS = const(11)
+_BURST_FALLBACKS = const(12)
+_DROPPED         = const(13)
+_QUEUE_MAX       = const(14)
+_CYCLE_US        = const(15)    # min, moyenne, max
+
+
+def _select_value(new, old):
     if new is None :
         return old
     return new
 
 
+# Classe CommandQueue
+#  -  File de commandes "derniere valeur gagnante" : un emplacement par registre
+#  -  put : enregistre une commande [registre, donnees...] (remplace la precedente)
+#  -  pop : renvoie la plus ancienne commande en attente (ordre d'emission) ou None
+#           (tampon réutilisé, valable jusqu'au prochain pop)
+#  -  dropped : nombre de commandes remplacees avant d'avoir ete envoyees
+class CommandQueue():
+    def __init__(self, registers):
+        self.__lock    = _thread.allocate_lock()
+        self.__index   = {}
+        self.__buffers = []
+        self.__tx      = []
+        self.__seq     = []
+        self.__count   = 0
+        self.__pending = 0
+        self.dropped   = 0
+        for i, (register, size) in enumerate(registers) :
+            self.__index[register] = i
+            self.__buffers.append(bytearray(size))
+            self.__tx.append(bytearray(size))
+            self.__seq.append(0)
+
+    # Nombre de commandes en attente (compteur tenu par put / pop / clear)
+    def __len__(self):
+        return self.__pending
+
+    # Renvoie True si une commande en attente a été remplacée
+    def put(self, data):
+        i = self.__index[data[0]]
+        with self.__lock :
+            replaced = self.__seq[i] != 0
+            if replaced :
+                self.dropped += 1
+            else :
+                self.__pending += 1
+            buffer = self.__buffers[i]
+            for j in range(len(buffer)) :
+                buffer[j] = data[j]
+            self.__count  += 1
+            self.__seq[i]  = self.__count
+        return replaced
+
+    def pop(self):
+        with self.__lock :
+            best = -1
+            for i in range(len(self.__seq)) :
+                if self.__seq[i] and (best < 0 or self.__seq[i] < self.__seq[best]) :
+                    best = i
+            if best < 0 :
+                return None
+            self.__seq[best] = 0
+            self.__pending  -= 1
+            # Copie : la commande peut être remplacée pendant son envoi
+            tx  = self.__tx[best]
+            src = self.__buffers[best]
+            for j in range(len(tx)) :
+                tx[j] = src[j]
+            return tx
+
+    def clear(self):
+        with self.__lock :
+            for i in range(len(self.__seq)) :
+                self.__seq[i] = 0
+            self.__pending = 0
+
+
+# Classe Snapshot
+#  -  Etat cohérent du Maqueen lu lors d'un même cycle update()
+#  -  seq           : numéro du cycle (0 = pas de donnée / en cours d'écriture)
+#  -  ticks         : instant de la lecture (ticks_ms)
+#  -  motors        : [L, R] puissance moteurs (-255, +255)
+#  -  encoders      : [L, R] (V1 uniquement)
+#  -  resets        : nombre d'écritures des compteurs (encodeurs_reset) envoyées
+#                     avant la lecture : un changement signale une remise à zéro
+#  -  compensations : [L, R] (V1 uniquement)
+#  -  pid           : état du PID embarqué (V1 uniquement)
+#  -  line          : 6 valeurs logiques des capteurs sol
+#  -  analog        : 6 valeurs analogiques des capteurs sol
+class Snapshot():
+    def __init__(self):
+        self.seq           = 0
+        self.ticks         = 0
+        self.motors        = [0, 0]
+        self.encoders      = [0, 0]
+        self.resets        = 0
+        self.compensations = [0, 0]
+        self.pid           = 0
+        self.line          = [0]*6
+        self.analog        = [0]*6
+    
+    # Copie sur place (sans allocation) vers un autre Snapshot
+    def copy_to(self, other):
+        other.seq   = self.seq
+        other.ticks  = self.ticks
+        other.resets = self.resets
+        other.pid    = self.pid
+        for i in range(2) :
+            other.motors[i]        = self.motors[i]
+            other.encoders[i]      = self.encoders[i]
+            other.compensations[i] = self.compensations[i]
+        for i in range(6) :
+            other.line[i]   = self.line[i]
+            other.analog[i] = self.analog[i]
+        return other
+
+
 # Classe Maqueen Plus de base
 #  -  motor         : Lecture / ecriture de la puissance moteurs
+#                    [L, R, T] : arrêt automatique après T secondes (sans bloquer)
 #  -  phares        : Lecture / ecriture des phares
 #  -  ground_line   : Lecture du sol 
 #  -  ground_analog : Lecture du sol 
-#  -  stop          : Arrêt des moteurs
+#  -  set_motors    : set_motors(L, R) : commande moteur sans allocation (asservissements)
+#  -  stop          : Arrêt des moteurs (immédiat, même avec un profil)
+#  -  set_profile   : Rampes moteur limitées en accélération (et jerk), générées par update()
+#  -  stats         : Compteurs (tools.Stats) : cycles, transactions, octets, erreurs par
+#                     type, commandes remplacées, profondeur de file, durée des cycles
+#                     (stats.as_dict(), stats.pack(), stats.reset())
+#  -  last_error_msg: Dernière erreur (texte, effacé à la lecture)
 #  -  update        : Force la mise a jour de l'ensemble des paramètres
+#  -  snapshot      : Dernier état publié (Snapshot), sans copie
+#  -  read_snapshot : Copie cohérente du dernier état publié
+#  -  wait_snapshot : Attente d'un état plus récent qu'un numéro de cycle donné
+#  -  add_listener  : Fonction appelée par update() avec chaque nouvel état publié
+#  -  remove_listener
+#
+# Double tampon : update() écrit dans le tampon arrière puis le publie en
+# une seule affectation. Un lecteur qui garde une référence plus d'un cycle
+# doit utiliser read_snapshot() (copie vérifiée par le numéro de cycle).
+#
+# Les commandes sont placées dans une file (une par registre, la dernière
+# valeur l'emporte) puis envoyées par update() dans l'ordre d'émission,
+# en respectant un délai minimum (gap_us) entre deux transactions.
 #
 
 
 class MaqueenPlusBridge():
-    def __init__(self, i2c, addr=0x10, debug=False):
+    # Registres de commande et taille des trames [registre, donnees...]
+    __CMD_REGISTERS = ((0x00, 5), (0x04, 5), (0x08, 3), (0x0A, 2), (0x0B, 3))
+
+    # Fenêtre de lecture en rafale : 0x00 (moteurs) -> 0x2A (fin capteurs sol)
+    __BURST_SIZE  = 0x2B
+    __LINE_OFFSET = 0x1D
+    __MOTORS_SIZE = 22
+    
+    # Noms des compteurs (ordre des index _CYCLES, ...) et histogramme des cycles (us)
+    STATS = ("cycles", "reads", "read_bytes", "writes", "write_bytes",
+             "read_errors", "write_errors") + Stats.ERRORS + \
+            ("listener_errors", "burst_fallbacks", "dropped", "queue_max",
+             "cycle_min_us", "cycle_avg_us", "cycle_max_us")
+    CYCLE_BUCKETS = (1000, 2000, 5000, 10000, 20000, 50000, 100000)
+
+    # scheduler : None  -> thread dédié (comportement historique)
+    #             objet -> tâche ajoutée au Scheduler fourni (tools.Scheduler)
+    #             False -> pas de mise à jour automatique (appeler update())
+    # accel / jerk : limites des rampes moteur (PWM/s, PWM/s²), voir set_profile
+    def __init__(self, i2c, addr=0x10, debug=False, gap_us=5000, burst=False,
+                 scheduler=None, period_ms=100, accel=None, jerk=None):
         self.__masque     = bytearray([0x01, 0x02, 0x04, 0x08, 0x10, 0x20])
-        self.__cmd        = []
+        self.__cmd        = CommandQueue(MaqueenPlusBridge.__CMD_REGISTERS)
         self.__i2c        = i2c
         self.__addr       = addr
         self.__debug      = debug
         self.__debug_msg  = ""
+        self.__gap_us     = gap_us
+        self.__last_write = None
+        self.__burst      = burst
+        self.stats        = Stats(MaqueenPlusBridge.STATS, MaqueenPlusBridge.CYCLE_BUCKETS)
+        
+        # Bus partagé (tools.I2C_manage) : lecture d'un cycle sans réarbitrage
+        self.__batch = i2c.batch() if hasattr(i2c, "batch") else None
+        
+        # Tampons préalloués (aucune allocation par cycle)
+        self.__ptr_motors = bytearray([0x00])
+        self.__ptr_line   = bytearray([MaqueenPlusBridge.__LINE_OFFSET])
+        self.__rx         = bytearray(MaqueenPlusBridge.__BURST_SIZE)
+        rx                = memoryview(self.__rx)
+        self.__rx_motors  = rx[0:MaqueenPlusBridge.__MOTORS_SIZE]
+        self.__rx_line    = rx[MaqueenPlusBridge.__LINE_OFFSET:MaqueenPlusBridge.__BURST_SIZE]
         
-        # Valeurs ecrites / lues sur le maqueen plus
-        self.__motors        = [False, 0, 0]
-        self.__encoders      = [False, 0, 0]   # V1 uniquement
-        self.__compensations = [False, 0, 0]   # V1 uniquement
-        self.__pid           = [False, 0]      # V1 uniquement
-        self.__line_logique  = [False] + [0]*6
-        self.__line_analog   = [False] + [0]*6
+        # Valeurs lues sur le maqueen plus (double tampon)
+        self.__front = Snapshot()
+        self.__back  = Snapshot()
+        self.__seq   = 0
+        self.__encoder_resets = 0   # Ecritures du registre des encodeurs (0x04) envoyées
+        self.__listeners = []
         
         # Valeurs imposées
-        self.__phares = [0, 0]
+        self.__phares  = [0, 0]
+        self.__stop_at = None       # Arrêt programmé des moteurs (ticks_ms), moteurs = [L, R, T]
+        self.__motor_cmd  = bytearray([0x00, 0x01, 0x00, 0x01, 0x00])
+        self.__motor_sent = [0, 0]
+        self.__profiles   = None
+        self.__profile_ticks = None
+        self.set_profile(accel, jerk)
         
         # Valeurs max
-        self.__max_phares = 7
-        self.__max_motors = 255
+        self._max_phares = 7
+        self._max_motors = 255
         
-        # Lancement du thread
-        self.__Thread = Thread(self.update)
-        self.__Thread.start()
+        # Lancement de la mise à jour périodique
+        self.job = None
+        if scheduler is None :
+            self.__Thread = Thread(self.update, period_ms / 1000)
+            self.__Thread.start()
+            self.job = self.__Thread.job
+        elif scheduler :
+            self.job = scheduler.add(self.update, period_ms, "maqueen")
         
         # Initialisation de départ
         self.stop()
         self.stop()
         
-    def __read_data(self, value):
-        value[0] = False
-        return value[1:]
+    def _command(self, data):
+        if self.__cmd.put(data) :
+            self.stats.values[_DROPPED] += 1
+    
+    # Les fonctions sont appelées dans le cycle update() (thread / Scheduler) :
+    # elles doivent être courtes et ne pas faire de print
+    def add_listener(self, function):
+        if function not in self.__listeners :
+            self.__listeners.append(function)
+    
+    def remove_listener(self, function):
+        if function in self.__listeners :
+            self.__listeners.remove(function)
+    
+    @property
+    def snapshot(self):
+        return self.__front
+    
+    @property
+    def seq(self):
+        return self.__front.seq
+    
+    def read_snapshot(self, dest=None):
+        if dest is None :
+            dest = Snapshot()
+        while True :
+            snap = self.__front
+            seq  = snap.seq
+            snap.copy_to(dest)
+            # seq nul : rien de publié (accepté), ou tampon en cours d'écriture (relu)
+            if snap.seq == seq and (seq or not self.__seq) :
+                return dest
+    
+    # Attend un état de numéro de cycle supérieur à seq (None si délai dépassé)
+    def wait_snapshot(self, seq=0, timeout_ms=None, dest=None):
+        start = ticks_ms()
+        while self.__front.seq <= seq :
+            if timeout_ms is not None and ticks_diff(ticks_ms(), start) >= timeout_ms :
+                return None
+            sleep_ms(1)
+        return self.read_snapshot(dest)
         
+    # Rampes moteur : accel (PWM/s) et jerk (PWM/s², None = trapèze)
+    # Avec un profil, moteurs = [L, R] fixe la consigne finale et update()
+    # envoie à chaque cycle la consigne intermédiaire (file : dernière valeur)
+    # accel = None : commandes moteur directes (échelons)
+    def set_profile(self, accel=None, jerk=None):
+        if accel is None :
+            self.__profiles = None
+            return
+        motors = self.__motor_sent
+        self.__profiles = (Profile(accel, jerk, motors[0]), Profile(accel, jerk, motors[1]))
+    
+    @property
+    def profile_active(self):
+        profiles = self.__profiles
+        return profiles is not None and not (profiles[0].idle and profiles[1].idle)
+    
+    # Commande moteur signée (tampon préalloué, copié par la file)
+    def __motor_command(self, left, right):
+        cmd    = self.__motor_cmd
+        cmd[1] = 1 + (left < 0)
+        cmd[2] = min(abs(left), self._max_motors)
+        cmd[3] = 1 + (right < 0)
+        cmd[4] = min(abs(right), self._max_motors)
+        self.__motor_sent[0] = left
+        self.__motor_sent[1] = right
+        self._command(cmd)
+    
     def __get_motors(self):
-        return self.__read_data(self.__motors)
+        return list(self.__front.motors)
     
     def __set_motors(self, motorLR): # [L: -255, R: +255, T: 0]
         try :
-            motorLR = list(motorLR)
+            motorLR  = list(motorLR)
+            profiles = self.__profiles
             
             # Si L, R non renseignée, ne pas les changer
-            motorLR[0] = __select_value(motorLR[0], self.__motors[1])
-            motorLR[1] = __select_value(motorLR[1], self.__motors[2])
+            if profiles is None :
+                motorLR[0] = _select_value(motorLR[0], self.__front.motors[0])
+                motorLR[1] = _select_value(motorLR[1], self.__front.motors[1])
+            else :
+                motorLR[0] = _select_value(motorLR[0], profiles[0].target)
+                motorLR[1] = _select_value(motorLR[1], profiles[1].target)
             
-            # Adaptation des données moteur
-            dirL   = 1 + (motorLR[0] < 0)
-            dirR   = 1 + (motorLR[1] < 0)
-            motorL = min(abs(motorLR[0]), self.__max_motors)
-            motorR = min(abs(motorLR[1]), self.__max_motors)
-            self.__cmd.append(bytearray([0x00, dirL, motorL, dirR, motorR]))
+            self.set_motors(int(motorLR[0]), int(motorLR[1]))
             
-            # Mise à jour auto (si activé)
-            if(motorLR[2] > 0):
-                sleep(motorLR[2])
-                self.stop()
+            # Arrêt automatique après T secondes, fait par update() (non bloquant)
+            if len(motorLR) > 2 and motorLR[2] > 0 :
+                self.__stop_at = ticks_add(ticks_ms(), int(motorLR[2] * 1000))
         except :
             return False
         return True
     
+    # Commande moteur sans allocation (asservissements appelés à chaque cycle) :
+    # L, R entiers, écrits dans la commande préallouée (ou la cible du profil)
+    # Toute nouvelle commande moteur annule l'arrêt programmé
+    def set_motors(self, left, right):
+        left  = max(-self._max_motors, min(left, self._max_motors))
+        right = max(-self._max_motors, min(right, self._max_motors))
+        profiles = self.__profiles
+        if profiles is None :
+            self.__motor_command(left, right)
+        else :
+            profiles[0].target = left
+            profiles[1].target = right
+        self.__stop_at = None
+    
     def __get_phares(self):
         return list(self.__phares)
     
     def __set_phares(self, pharesLR):
         try :
-            pharesL = min(abs(pharesLR[0]), self.__max_phares)
-            pharesR = min(abs(pharesLR[1]), self.__max_phares)
-            self.__cmd.append(bytearray([0x0B, pharesL, pharesR]))
+            pharesL = min(abs(pharesLR[0]), self._max_phares)
+            pharesR = min(abs(pharesLR[1]), self._max_phares)
+            self._command(bytearray([0x0B, pharesL, pharesR]))
             self.__phares = [pharesL, pharesR]
         except :
             return False
         return True
     
     def __get_ground_line(self):
-        return self.__read_data(self.__line_logique)
+        return list(self.__front.line)
     
     def __get_ground_analog(self):
-        return self.__read_data(self.__line_analog)
+        return list(self.__front.analog)
     
     @property
     def last_error_msg(self):
@@ -110,56 +377,189 @@ class MaqueenPlusBridge():
         return msg
     
     def stop(self):
-        self.moteurs = [0, 0]
+        self.__stop_at = None
+        if self.__profiles is not None :
+            self.__profiles[0].reset(0)
+            self.__profiles[1].reset(0)
+        self.__motor_command(0, 0)
         self.phares = [0, 0]
+    
+    # Lecture en deux transactions : moteurs / encodeurs puis capteurs sol
+    def __read_split(self):
+        self.__i2c.writeto(self.__addr, self.__ptr_motors) # 0 1 2 3 4 6 8 9 A
+        self.__i2c.readfrom_into(self.__addr, self.__rx_motors)
+        self.__i2c.writeto(self.__addr, self.__ptr_line)
+        self.__i2c.readfrom_into(self.__addr, self.__rx_line)
+        v = self.stats.values
+        v[_WRITES]      += 2
+        v[_WRITE_BYTES] += 2
+        v[_READS]       += 2
+        v[_READ_BYTES]  += MaqueenPlusBridge.__MOTORS_SIZE + MaqueenPlusBridge.__BURST_SIZE - MaqueenPlusBridge.__LINE_OFFSET
+    
+    # Lecture en rafale de 0x00 à 0x2A : moteurs et capteurs sol du même instant
+    # Si le firmware refuse la lecture longue, retour à la lecture en deux fois
+    def __read_burst(self):
+        try :
+            self.__i2c.writeto(self.__addr, self.__ptr_motors)
+            self.__i2c.readfrom_into(self.__addr, self.__rx)
+        except OSError :
+            self.stats.values[_BURST_FALLBACKS] += 1
+            self.__read_split()
+            self.__burst = False
+            return
+        v = self.stats.values
+        v[_WRITES]      += 1
+        v[_WRITE_BYTES] += 1
+        v[_READS]       += 1
+        v[_READ_BYTES]  += MaqueenPlusBridge.__BURST_SIZE
+    
+    def __read(self):
+        if self.__burst :
+            self.__read_burst()
+        else :
+            self.__read_split()
+    
+    # Décodage du tampon de lecture dans le tampon arrière, puis publication
+    #  0 dirL  1 L  2 dirR  3 R  4-5 encL  6-7 encR  8 compL  9 compR  10 pid
+    #  0x1D capteurs (logique)  0x1E-0x29 capteurs (analogique)
+    def __decode(self, ticks):
+        b    = self.__rx
+        snap = self.__back
+        snap.seq = 0                        # Tampon invalide pendant l'écriture
+        snap.ticks            = ticks
+        snap.motors[0]        = -b[1] if b[0] == 2 else b[1]
+        snap.motors[1]        = -b[3] if b[2] == 2 else b[3]
+        snap.encoders[0]      = (b[4] << 8) | b[5]
+        snap.encoders[1]      = (b[6] << 8) | b[7]
+        snap.resets           = self.__encoder_resets
+        snap.compensations[0] = b[8]
+        snap.compensations[1] = b[9]
+        snap.pid              = b[10]
         
-    def update(self) :
+        o     = MaqueenPlusBridge.__LINE_OFFSET
+        state = b[o]
+        for i in range(6):
+            snap.line[i]   = 1 if (state & self.__masque[i]) else 0
+            snap.analog[i] = (b[o + 1 + 2*i] << 8) | b[o + 2 + 2*i]
         
-        # print("test")
-        # Ecriture des données
+        # Publication
+        self.__seq  += 1
+        snap.seq     = self.__seq
+        self.__back  = self.__front
+        self.__front = snap
+    
+    def __profile_step(self, ticks):
+        last, self.__profile_ticks = self.__profile_ticks, ticks
+        profiles = self.__profiles
+        if last is None or (profiles[0].idle and profiles[1].idle) :
+            return
+        dt    = ticks_diff(ticks, last) / 1000
+        left  = int(profiles[0].step(dt))
+        right = int(profiles[1].step(dt))
+        sent  = self.__motor_sent
+        if left != sent[0] or right != sent[1] :
+            self.__motor_command(left, right)
+    
+    # Arrêt programmé (moteurs = [L, R, T]) : True si l'échéance est atteinte
+    def __stop_due(self, ticks):
+        stop_at = self.__stop_at
+        if stop_at is None or ticks_diff(ticks, stop_at) < 0 :
+            return False
+        self.__stop_at = None
+        if self.__profiles is None :
+            self.__motor_command(0, 0)
+        else :
+            self.__profiles[0].target = 0
+            self.__profiles[1].target = 0
+        return True
+    
+    # Attente du délai minimum depuis la dernière écriture (si nécessaire)
+    def __wait_gap(self):
+        if self.__last_write is not None :
+            remaining = self.__gap_us - ticks_diff(ticks_us(), self.__last_write)
+            if remaining > 0 :
+                sleep_us(remaining)
+            self.__last_write = None
+        
+    # Ecriture des commandes en attente (plus récente valeur par registre, ordre d'émission)
+    # Au plus une transaction par registre et par appel
+    def __write_commands(self):
+        v = self.stats.values
+        n = 0
         try :
-            nb_commandes = len(self.__cmd)
-            for i in range(nb_commandes-1, -1, -1) :
-                self.__i2c.writeto(self.__addr, self.__cmd[i])
-                sleep(0.005)
-                self.__cmd.pop(i)
+            for _ in range(len(MaqueenPlusBridge.__CMD_REGISTERS)) :
+                command = self.__cmd.pop()
+                if command is None :
+                    break
+                n += 1
+                self.__wait_gap()
+                self.__i2c.writeto(self.__addr, command)
+                self.__last_write = ticks_us()
+                if command[0] == 0x04 :
+                    self.__encoder_resets += 1
+                v[_WRITES]      += 1
+                v[_WRITE_BYTES] += len(command)
         except Exception as error_name: 
+            v[_WRITE_ERRORS] += 1
+            self.stats.error(_ERRORS, error_name)
             self.__debug_msg = str(error_name)
             if self.__debug :
                 print("i2c write error")
+        if n > v[_QUEUE_MAX] :
+            v[_QUEUE_MAX] = n
+        
+    def update(self) :
+        start = ticks_us()
+        
+        # Ecriture des données
+        self.__write_commands()
         
         # Lecture des données
         try :
-            # Lecture Moteurs / Encodeurs
-            self.__i2c.writeto(self.__addr, bytearray([0x00])) # 0 1 2 3 4 6 8 9 A
-            full = struct.unpack('>BBBBHHBBB', self.__i2c.readfrom(self.__addr, 22))
-            
-            # Lecture capteurs sol / ligne
-            self.__i2c.writeto(self.__addr, bytearray([0x1D]))
-            line_d = struct.unpack('>BHHHHHH', self.__i2c.readfrom(self.__addr, 14))
-            new_data = True
+            self.__wait_gap()
+            ticks = ticks_ms()
+            if self.__batch is not None :
+                with self.__batch :
+                    self.__read()
+            else :
+                self.__read()
         except Exception as error_name: 
+            self.stats.values[_READ_ERRORS] += 1
+            self.stats.error(_ERRORS, error_name)
             self.__debug_msg = str(error_name)
             if self.__debug :
                 print("i2c read error")
+            # L'arrêt programmé ne dépend pas de la lecture : échéance vérifiée
+            # et commande d'arrêt envoyée malgré l'erreur
+            if self.__stop_due(ticks_ms()) :
+                self.__write_commands()
             return False
         
         # Traitement des données lues et MAJ des paramètres
-        motorL = -full[1] if full[0] == 2 else full[1]
-        motorR = -full[3] if full[2] == 2 else full[3]
+        self.__decode(ticks)
+        
+        # Arrêt programmé (moteurs = [L, R, T])
+        self.__stop_due(ticks)
+        
+        # Traitements dépendant de l'état publié (odométrie, asservissements, ...)
+        for function in self.__listeners :
+            try :
+                function(self.__front)
+            except Exception as error_name :
+                self.stats.values[_LISTENER_ERRORS] += 1
+                self.__debug_msg = str(error_name)
+                if self.__debug :
+                    print("listener error")
+        
+        # Consigne intermédiaire des rampes moteur (après les listeners)
+        if self.__profiles is not None :
+            self.__profile_step(ticks)
         
-        self.__motors        = [True, motorL,  motorR]
-        self.__encoders      = [True, full[4], full[5]]
-        self.__compensations = [True, full[6], full[7]]
-        self.__pid           = [True, full[8]]
-    
-        line = []
-        for i in range(0, 6):
-            make = 1 if (line_d[0] & self.__masque[i]) else 0
-            line.append(make)
+        # Commandes émises pendant le cycle : envoyées sans attendre le suivant
+        self.__write_commands()
         
-        self.__line_logique = [True] + line
-        self.__line_analog  = [True] + list(line_d[1:7])
+        self.stats.values[_CYCLES] += 1
+        self.stats.timing(_CYCLE_US, ticks_diff(ticks_us(), start))
         return True
 
     moteurs       = property(__get_motors, __set_motors)
@@ -169,59 +569,59 @@ class MaqueenPlusBridge():
 
 
 class MaqueenPlusV2(MaqueenPlusBridge):
-    def __init__(self, i2c, addr=0x10, debug=False):
-        MaqueenPlusBridge.__init__(self, i2c, addr, debug)
-        self.__max_phares = 1
+    def __init__(self, i2c, addr=0x10, debug=False, **kwargs):
+        MaqueenPlusBridge.__init__(self, i2c, addr, debug, **kwargs)
+        self._max_phares = 1
         
         # Création de la partie neopixels
         self.np = NeoPixel(Pin(23), 4) # create NeoPixel driver on GPIO0 for 4 pixels
         
     def __get_ground_line(self):
-        return super().__get_ground_line()[0:5]
+        return self.snapshot.line[0:5]
     
     def __get_ground_analog(self):
-        return super().__get_ground_analog()[0:5]
+        return self.snapshot.analog[0:5]
     
     ground_line   = property(__get_ground_line)
     ground_analog = property(__get_ground_analog)
 
 
 class MaqueenPlusV1(MaqueenPlusBridge):
-    def __init__(self, i2c, addr=0x10, debug=False):
-        MaqueenPlusBridge.__init__(self, i2c, addr, debug)
+    def __init__(self, i2c, addr=0x10, debug=False, **kwargs):
+        MaqueenPlusBridge.__init__(self, i2c, addr, debug, **kwargs)
     
     def __get_encodeurs(self):
-        return self.__read_data(self.__encoders)
+        return list(self.snapshot.encoders)
     
     def encodeurs_reset(self):
-        self.__cmd.append(bytearray([0x04, 0x00, 0x00, 0x00, 0x00]))
+        self._command(bytearray([0x04, 0x00, 0x00, 0x00, 0x00]))
     
     def __get_compensations(self):  # [L: -255, R: +255]
-        return self.__read_data(self.__compensations)
+        return list(self.snapshot.compensations)
         
     def __set_compensations(self, comp): # [L: -255, R: +255]
         try :
             comp = list(comp)
             
             # Si L, R non renseignée, ne pas les changer
-            comp[0] = __select_value(comp[0], self.__compensations[1])
-            comp[1] = __select_value(comp[1], self.__compensations[2])
+            comp[0] = _select_value(comp[0], self.snapshot.compensations[0])
+            comp[1] = _select_value(comp[1], self.snapshot.compensations[1])
             
             # Adaptation des données moteur
-            compL = min(abs(comp[0]), self.__max_motors)
-            compR = min(abs(comp[1]), self.__max_motors)
-            self.__cmd.append(bytearray([0x08, compL, compR]))
+            compL = min(abs(comp[0]), self._max_motors)
+            compR = min(abs(comp[1]), self._max_motors)
+            self._command(bytearray([0x08, compL, compR]))
             
         except :
             return False
         return True
     
     def __get_pid(self):
-        return self.__read_data(self._pid)
+        return [self.snapshot.pid]
     
     def __set_pid(self, enable):
         try :
-            self.__cmd.append(bytearray([0x0A, bool(enable)]))
+            self._command(bytearray([0x0A, bool(enable)]))
         except :
             return False
         return True
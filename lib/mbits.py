@@ -3,6 +3,7 @@ from machine  import Pin, I2C, PWM, ADC
 from time     import sleep
 from mpu6050  import MPU
 from tmp75    import Tmp1075
+from tools    import I2C_manage
 
 # Signal logique    : Bouton A, B
 # Signal analogique : Micro (12B CAN), HP (12B PWM - Max 16)
@@ -21,40 +22,136 @@ class Micro():
     value = property(__get_value)
 
 
+# Classe MBits
+#  -  Chaque périphérique est créé au premier accès (import rapide)
+#  -  devices   : périphériques autorisés (par défaut MBits.DEVICES)
+#  -  scheduler : transmis au MPU (calibration en arrière-plan), lecture
+#                  périodique du Tmp1075 (temp ne lit alors plus le bus)
+#  -  max_age_ms : durée de validité (ms) des lectures par périphérique,
+#                  par défaut MBits.MAX_AGE ; accel, gyro et imu partagent
+#                  la même lecture du MPU tant qu'elle est valide
+#  -  probe     : état de chaque périphérique, sans lever d'erreur
 class MBits():
-    def __init__(self):
-        self.__a     = Pin(36, Pin.IN)
-        self.__b     = Pin(39, Pin.IN)
-        self.__micro = Micro(35)
-        self.speaker = PWM(Pin(33))
-        self.speaker.deinit()
-        self.i2c     = I2C(1, scl=Pin(21), sda=Pin(22), freq=100000)
-        self.display = NeoPixel(Pin(13) , 25) # create NeoPixel driver on GPIO0 for 8 pixels
-        self.mpu     = MPU(self.i2c)
-        self.tmp     = Tmp1075(self.i2c)
-        
+    DEVICES = ("buttons", "micro", "speaker", "i2c", "display", "mpu", "tmp")
+    MAX_AGE = {"mpu" : 10, "tmp" : 250}
+    
+    def __init__(self, devices=None, scheduler=None, max_age_ms=None):
+        self.__devices   = MBits.DEVICES if devices is None else tuple(devices)
+        self.__scheduler = scheduler
+        self.__objects   = {}
+        self.max_age     = dict(MBits.MAX_AGE)
+        if max_age_ms is not None :
+            self.max_age.update(max_age_ms)
+    
+    def __get(self, name):
+        obj = self.__objects.get(name)
+        if obj is None :
+            if name not in self.__devices :
+                raise RuntimeError("device '%s' not selected" % name)
+            obj = MBits.__FACTORIES[name](self)
+            self.__objects[name] = obj
+        return obj
+    
+    def __make_buttons(self):
+        return (Pin(36, Pin.IN), Pin(39, Pin.IN))
+    
+    def __make_micro(self):
+        return Micro(35)
+    
+    def __make_speaker(self):
+        speaker = PWM(Pin(33))
+        speaker.deinit()
+        return speaker
+    
+    # Bus partagé par tous les pilotes (arbitrage entre threads, voir tools.I2C_manage)
+    def __make_i2c(self):
+        return I2C_manage(factory=MBits.__new_i2c, scl=21, sda=22)
+    
+    @staticmethod
+    def __new_i2c():
+        return I2C(1, scl=Pin(21), sda=Pin(22), freq=100000)
+    
+    def __make_display(self):
+        return NeoPixel(Pin(13) , 25) # create NeoPixel driver on GPIO0 for 8 pixels
+    
+    def __make_mpu(self):
+        return MPU(self.i2c, scheduler=self.__scheduler)
+    
+    def __make_tmp(self):
+        tmp = Tmp1075(self.i2c, max_age_ms=self.max_age["tmp"])
+        if self.__scheduler is not None :
+            tmp.start(self.__scheduler, self.max_age["tmp"])
+        return tmp
+    
+    __FACTORIES = {
+        "buttons" : __make_buttons,
+        "micro"   : __make_micro,
+        "speaker" : __make_speaker,
+        "i2c"     : __make_i2c,
+        "display" : __make_display,
+        "mpu"     : __make_mpu,
+        "tmp"     : __make_tmp,
+    }
+    
+    # Etat des périphériques : True (présent), False (non sélectionné), ou message d'erreur
+    def probe(self):
+        report = {}
+        found  = None
+        for name in MBits.DEVICES :
+            if name not in self.__devices :
+                report[name] = False
+                continue
+            try :
+                if name in ("mpu", "tmp") :
+                    if found is None :
+                        found = self.i2c.scan()
+                    if name == "mpu" and not (0x68 in found or 0x69 in found) :
+                        report[name] = "not found on I2C bus"
+                        continue
+                    if name == "tmp" and 0x48 not in found :
+                        report[name] = "not found on I2C bus"
+                        continue
+                self.__get(name)
+                report[name] = True
+            except Exception as error :
+                report[name] = str(error)
+        return report
+    
     def __accel(self):
-        self.mpu.read_data()
-        return mbits.mpu.accel
+        self.mpu.refresh(self.max_age["mpu"])
+        return self.mpu.accel
     
     def __gyro(self):
-        self.mpu.read_data()
-        return mbits.mpu.gyro
+        self.mpu.refresh(self.max_age["mpu"])
+        return self.mpu.gyro
+    
+    # Accélération, vitesse angulaire et température d'une seule lecture du MPU
+    def __imu(self):
+        mpu = self.mpu
+        mpu.refresh(self.max_age["mpu"])
+        return mpu.accel, mpu.gyro, mpu.temp
     
     def __temp(self):
         return self.tmp.temp
     
     def __a(self):
-        return 1 - self.__a.value()
+        return 1 - self.__get("buttons")[0].value()
     
     def __b(self):
-        return 1 - self.__b.value()
+        return 1 - self.__get("buttons")[1].value()
     
     def __micro(self):
-        return self.__micro.value
+        return self.__get("micro").value
+    
+    speaker = property(lambda self : self.__get("speaker"))
+    i2c     = property(lambda self : self.__get("i2c"))
+    display = property(lambda self : self.__get("display"))
+    mpu     = property(lambda self : self.__get("mpu"))
+    tmp     = property(lambda self : self.__get("tmp"))
     
     accel = property(__accel)
     gyro  = property(__gyro)
+    imu   = property(__imu)
     temp  = property(__temp)
     a     = property(__a)
     b     = property(__b)
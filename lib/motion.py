@@ -0,0 +1,245 @@
+# File de mouvements du Maqueen Plus, exécutée dans le cycle update() (add_listener)
+#
+# Chaque primitive renvoie immédiatement un Move (à interroger ou attendre) ;
+# les mouvements s'enchaînent dans l'ordre, à la précision de la période
+# du Maqueen, sans bloquer le programme principal.
+#
+#  -  drive(L, R, duration_ms) : puissances fixes (sans durée : immédiat, moteurs laissés en marche)
+#  -  ramp(start, end, time_ms) : variation linéaire de [L, R] start vers [L, R] end
+#  -  rotate_by(angle, speed)   : rotation sur place (degrés, positif = vers la gauche),
+#                                 cap mesuré par l'odométrie ou la fusion (heading)
+#  -  stop()                    : vide la file, annule le mouvement en cours, arrêt immédiat
+#  -  preempt=True              : le mouvement remplace la file au lieu de s'y ajouter
+#
+# Les moteurs sont arrêtés quand la file se vide après un mouvement temporisé.
+# Avec l'odométrie, la file est exécutée par Odometry.update (add_listener de
+# l'odométrie) : le cap lu est toujours celui du cycle en cours.
+#
+# Exemple :
+#   motion = MotionQueue(maqueen, odometry)
+#   motion.drive(80, 80, 1000)
+#   move = motion.rotate_by(90)
+#   while not move.done :          # le programme reste libre pendant le mouvement
+#       ...
+#   motion.drive(80, 80, 500).wait()
+
+import _thread
+from tools import ticks_ms, ticks_diff, sleep_ms
+
+PENDING   = 0
+RUNNING   = 1
+DONE      = 2
+CANCELLED = 3
+
+
+# Classe Move
+#  -  state   : PENDING, RUNNING, DONE ou CANCELLED
+#  -  done    : True une fois terminé ou annulé
+#  -  started / ended : instants de début et de fin (ticks_ms du cycle Maqueen)
+#  -  wait    : attente de la fin (False si délai dépassé)
+#  -  cancel  : annulation (le mouvement suivant démarre au prochain cycle)
+class Move():
+    def __init__(self):
+        self.state   = PENDING
+        self.started = None
+        self.ended   = None
+
+    @property
+    def done(self):
+        return self.state >= DONE
+
+    @property
+    def cancelled(self):
+        return self.state == CANCELLED
+
+    def cancel(self):
+        if self.state < DONE :
+            self.state = CANCELLED
+
+    def wait(self, timeout_ms=None):
+        start = ticks_ms()
+        while self.state < DONE :
+            if timeout_ms is not None and ticks_diff(ticks_ms(), start) >= timeout_ms :
+                return False
+            sleep_ms(1)
+        return self.state == DONE
+
+    # A surcharger : appelé au démarrage puis à chaque cycle, renvoie True si terminé
+    def start(self, queue, now):
+        return False
+
+    def step(self, queue, now):
+        return True
+
+    # Arrêt des moteurs si la file est vide à la fin du mouvement
+    stops = True
+
+
+class _Drive(Move):
+    def __init__(self, left, right, duration_ms):
+        Move.__init__(self)
+        self.left     = left
+        self.right    = right
+        self.duration = duration_ms
+        self.stops    = duration_ms is not None
+
+    def start(self, queue, now):
+        queue.motors(self.left, self.right)
+        return self.duration is None
+
+    def step(self, queue, now):
+        return ticks_diff(now, self.started) >= self.duration
+
+
+class _Ramp(Move):
+    stops = False
+
+    def __init__(self, start, end, time_ms):
+        Move.__init__(self)
+        self.begin = start
+        self.end   = end
+        self.time  = time_ms
+
+    def start(self, queue, now):
+        return self.step(queue, now)
+
+    def step(self, queue, now):
+        elapsed = ticks_diff(now, self.started)
+        if self.time <= 0 or elapsed >= self.time :
+            queue.motors(self.end[0], self.end[1])
+            return True
+        k = elapsed / self.time
+        queue.motors(int(self.begin[0] + (self.end[0] - self.begin[0]) * k),
+                     int(self.begin[1] + (self.end[1] - self.begin[1]) * k))
+        return False
+
+
+class _Rotate(Move):
+    def __init__(self, angle, speed, tolerance, timeout_ms):
+        Move.__init__(self)
+        self.angle     = angle
+        self.speed     = speed
+        self.tolerance = tolerance
+        self.timeout   = timeout_ms
+        self.turned    = 0.0
+        self.__last    = None
+
+    def start(self, queue, now):
+        self.__last = queue.heading()
+        s = self.speed if self.angle > 0 else -self.speed
+        queue.motors(-s, s)
+        return abs(self.angle) <= self.tolerance
+
+    def step(self, queue, now):
+        heading = queue.heading()
+        delta   = heading - self.__last
+        if delta > 180 :
+            delta -= 360
+        elif delta < -180 :
+            delta += 360
+        self.__last  = heading
+        self.turned += delta
+        if self.timeout is not None and ticks_diff(now, self.started) >= self.timeout :
+            return True
+        if self.angle > 0 :
+            return self.turned >= self.angle - self.tolerance
+        return self.turned <= self.angle + self.tolerance
+
+
+# Classe MotionQueue
+#  -  robot    : MaqueenPlusV1 / V2 (moteurs et cycle update())
+#  -  odometry : odometry.Odometry (cap pour rotate_by, file exécutée après
+#                chaque mise à jour de la pose), ou
+#  -  heading  : fusion.Fusion (cap du gyroscope), prioritaire s'il est fourni
+#  -  current  : mouvement en cours (None si aucun) ; len() : mouvements en attente
+class MotionQueue():
+    def __init__(self, robot, odometry=None, heading=None):
+        self.__robot    = robot
+        self.__odometry = odometry
+        self.__heading  = heading
+        self.__lock     = _thread.allocate_lock()
+        self.__moves    = []
+        self.current    = None
+        self.__source   = odometry if odometry is not None else robot
+        self.__source.add_listener(self.update)
+
+    def close(self):
+        self.__source.remove_listener(self.update)
+
+    def __len__(self):
+        return len(self.__moves)
+
+    # Cap courant (degrés)
+    def heading(self):
+        if self.__heading is not None :
+            return self.__heading.orientation.yaw
+        if self.__odometry is not None :
+            return self.__odometry.pose.theta
+        raise RuntimeError("no heading source")
+
+    def motors(self, left, right):
+        self.__robot.moteurs = (left, right)
+
+    def __add(self, move, preempt):
+        with self.__lock :
+            if preempt :
+                self.__cancel_all()
+            self.__moves.append(move)
+        return move
+
+    def __cancel_all(self):
+        for move in self.__moves :
+            move.cancel()
+        self.__moves = []
+        if self.current is not None :
+            self.current.cancel()
+
+    def drive(self, left, right, duration_ms=None, preempt=False):
+        return self.__add(_Drive(left, right, duration_ms), preempt)
+
+    def ramp(self, start, end, time_ms, preempt=False):
+        return self.__add(_Ramp(start, end, time_ms), preempt)
+
+    def rotate_by(self, angle, speed=60, tolerance=2, timeout_ms=5000, preempt=False):
+        if self.__heading is None and self.__odometry is None :
+            raise RuntimeError("rotate_by needs odometry or heading")
+        return self.__add(_Rotate(angle, speed, tolerance, timeout_ms), preempt)
+
+    def stop(self):
+        with self.__lock :
+            self.__cancel_all()
+        self.motors(0, 0)
+
+    # Appelée avec chaque nouvel état (Snapshot), par l'odométrie si elle est fournie
+    def update(self, snap):
+        now = snap.ticks
+        while True :
+            move = self.current
+            if move is not None and move.state == CANCELLED :
+                move.ended   = now
+                self.current = move = None
+                if not self.__moves :
+                    self.motors(0, 0)
+
+            if move is None :
+                with self.__lock :
+                    if not self.__moves :
+                        return
+                    move = self.__moves.pop(0)
+                self.current = move
+                if move.state == CANCELLED :
+                    continue
+                move.state   = RUNNING
+                move.started = now
+                finished     = move.start(self, now)
+            else :
+                finished = move.step(self, now)
+
+            if not finished :
+                return
+
+            move.ended   = now
+            move.state   = DONE
+            self.current = None
+            if move.stops and not self.__moves :
+                self.motors(0, 0)
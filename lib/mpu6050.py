@@ -1,10 +1,12 @@
 # https://github.com/tuupola/micropython-mpu9250
 # https://github.com/CoreElectronics/CE-PiicoDev-MPU6050-MicroPython-Module/blob/main/PiicoDev_MPU6050.py
 
-import struct
-from tools       import Vecteur
+from tools       import Vecteur, ticks_us, ticks_diff
 from time        import sleep
 from micropython import const
+from array       import array
+import micropython
+import json
 
 
 class MPU():
@@ -17,6 +19,24 @@ class MPU():
     __R_ACCEL_CONFIG_2B     =  0x1c
     __R_ACCEL_TEMP_GYRO_14B =  0x3b
     __R_WHO_AM_I            =  0x6b
+    __R_SMPLRT_DIV          =  0x19
+    __R_CONFIG              =  0x1a
+    __R_FIFO_EN             =  0x23
+    __R_INT_STATUS          =  0x3a
+    __R_USER_CTRL           =  0x6a
+    __R_FIFO_COUNT_2B       =  0x72
+    __R_FIFO_R_W            =  0x74
+    __R_INT_PIN_CFG         =  0x37
+    __R_INT_ENABLE          =  0x38
+    
+    # FIFO
+    __FIFO_SIZE       = 1024
+    __FIFO_FRAME      = 12          # accel (6) + gyro (6)
+    __FIFO_EN_AG      = 0x78        # XG, YG, ZG, ACCEL
+    __USER_FIFO_EN    = 0x40
+    __USER_FIFO_RESET = 0x04
+    __INT_FIFO_OFLOW  = 0x10
+    __INT_DATA_RDY    = 0x01
     __WHO_AM_I_ANSWERS      = [const(0x75), const(0x71), const(0x70), const(0x40), 0]  # MPU 6050, 6250, 6500
 
     # Configuration
@@ -47,24 +67,78 @@ class MPU():
     __SF_DEG_S = 1
     __SF_RAD_S = 0.017453292519943 # 1 deg/s is 0.017453292519943 rad/s
     
+    # Calibration du gyroscope
+    CALIB_FILE      = "mpu_calib.json"
+    __CALIB_COUNT   = 256       # Nombre d'échantillons immobiles nécessaires
+    __CALIB_GYRO    = 2.0       # Ecart max à la moyenne courante (deg/s)
+    __CALIB_ACCEL   = 0.1       # Ecart max de |accel|² à 1 g²
+    
     # Fonctions
-    def __init__(self, i2c, address=None):
+    # calibration : "auto" -> offsets relus dans calib_file, sinon calibration
+    #                         en arrière-plan (lectures suivantes, ou tâche du
+    #                         scheduler si fourni) lorsque la carte est immobile
+    #               "sync" -> calibration immédiate (256 lectures, ancien comportement)
+    #               None   -> pas de calibration
+    # debug       : messages de détection, de configuration et de calibration (print)
+    def __init__(self, i2c, address=None, calibration="auto", scheduler=None, calib_file=None,
+                 debug=False):
         self.__i2c      = i2c
+        self.__debug    = debug
         self.__address  = address
+        self.__file     = calib_file or MPU.CALIB_FILE
+        self.__calib    = None            # [n, somme x, somme y, somme z] en cours
+        self.__job      = None
+        self.calibrated = False
         self.__a_config = None
         self.__g_config = None
         self.__g_offset = [0, 0, 0]
+        self.__data     = bytearray(14)   # Tampon de lecture préalloué
+        self.__fifo     = None            # Vues de lecture du mode FIFO (fifo_start)
+        self.__fifo_buf = None
+        self.__fifo_cnt = bytearray(2)
+        self.__int_stat = bytearray(1)
+        
+        self.fifo_overflows = 0
+        self.fifo_frames    = 0
         
-        self.accel = Vecteur()
-        self.gyro  = Vecteur()
-        self.temp  = 0
+        # Mode interruption (irq_start)
+        self.__irq_pin      = None
+        self.__irq_pending  = False
+        self.__irq_ticks    = 0
+        self.__irq_schedule = False
+        self.__irq_callback = None
+        self.__irq_read_ref = self.__irq_read     # Référence préallouée (ISR)
+        self.timestamp      = 0                   # ticks_us de l'échantillon courant
+        self.irq_count      = 0
+        self.irq_missed     = 0
+        self.samples        = 0
+        
+        # Echantillon courant : ax, ay, az (g), gx, gy, gz (deg/s)
+        self.sample = array('f', [0] * 6)
+        self.accel  = Vecteur.view(self.sample, 0)
+        self.gyro   = Vecteur.view(self.sample, 3)
+        self.temp   = 0
+        
+        cache = self.__load_calibration()
+        if self.__address is None :
+            self.__address = cache.get("address")
         
         self.__whoiam   = self.__check_whoiam()
         self.on()
         self.gyro_config("250DPS")
         self.accel_config("2G")
-        self.gyro_calibrate(count=256, delay=0)
-        print(self.__whoiam)
+        
+        if calibration == "sync" :
+            self.gyro_calibrate(count=MPU.__CALIB_COUNT, delay=0)
+        elif calibration :
+            offset = cache.get(self.__calib_key())
+            if offset :
+                self.__g_offset = list(offset)
+                self.calibrated = True
+            else :
+                self.recalibrate(scheduler)
+        if self.__debug :
+            print(self.__whoiam)
         
     
     def __register(self, register, write=None, read=None):
@@ -90,18 +164,20 @@ class MPU():
     
     
     def __check_whoiam(self):
-        # Ajout de l'adresse personnalisée
+        # Ajout de l'adresse personnalisée (ou mémorisée), essayée en premier
+        addresses = MPU.__ADDRESSES
         if type(self.__address) is int :
-            MPU.__ADDRESSES = [self.__address] + MPU.__ADDRESSES
+            addresses = [self.__address] + addresses
         
         # Essai des adresses
-        for a in MPU.__ADDRESSES :
+        for a in addresses :
             try:
                 self.__address = a
                 r = self.__register(MPU.__R_WHO_AM_I, read=1)
                 r = r[0]
                 if r in MPU.__WHO_AM_I_ANSWERS :
-                    print("MPU who I am is", r)
+                    if self.__debug :
+                        print("MPU who I am is", r)
                     return r
             except:
                 pass
@@ -121,16 +197,18 @@ class MPU():
             if value in MPU.__GYRO :
                 config = MPU.__GYRO[value]
                 self.__register(MPU.__R_GYRO_CONFIG_1B, write=config[0])
-                sleep(0.005)
+                sleep(0.001)
                 retour = self.__register(MPU.__R_GYRO_CONFIG_1B, read=1)
                 if retour[0] == config[0] :
                     self.__g_config = config
                     self.__g_config.append(value)
-                    print("new gyro config :", value)
+                    if self.__debug :
+                        print("new gyro config :", value)
                 else :
                     self.__g_config = None
-                    print("something wrong happens", retour[0], "instead of", config[0])
-            else :
+                    if self.__debug :
+                        print("something wrong happens", retour[0], "instead of", config[0])
+            elif self.__debug :
                 print("wrong value used, only use", MPU.__GYRO.keys())
         
         if self.__g_config :
@@ -143,16 +221,18 @@ class MPU():
             if value in MPU.__ACCEL :
                 config = MPU.__ACCEL[value]
                 self.__register(MPU.__R_ACCEL_CONFIG_2B, write=config[0])
-                sleep(0.005)
+                sleep(0.001)
                 retour = self.__register(MPU.__R_ACCEL_CONFIG_2B, read=2)
                 if retour[0] == config[0] :
                     self.__a_config = config
                     self.__a_config.append(value)
-                    print("new accel config :", value)
+                    if self.__debug :
+                        print("new accel config :", value)
                 else :
                     self.__a_config = None
-                    print("something wrong happens, ", retour[0], "instead of", config[0])
-            else :
+                    if self.__debug :
+                        print("something wrong happens, ", retour[0], "instead of", config[0])
+            elif self.__debug :
                 print("wrong value used, only use", MPU.__ACCEL.keys())
                 
         if self.__a_config :
@@ -163,28 +243,276 @@ class MPU():
         if not self.__a_config or not self.__g_config :
             return None
         
-        data = self.__register(MPU.__R_ACCEL_TEMP_GYRO_14B, read=14)
-        data = struct.unpack(">hhhhhhh", data)
+        # Lecture sans allocation : tampon préalloué et décodage sur place
+        data = self.__data
+        self.timestamp = ticks_us()
+        self.__i2c.readfrom_mem_into(self.__address, MPU.__R_ACCEL_TEMP_GYRO_14B, data)
         
+        a_so   = self.__a_config[1]
+        g_so   = self.__g_config[1]
+        sample = self.sample
         for i in range(3) :
-            self.accel.coords[i] = data[i]   / self.__a_config[1]
-            self.gyro.coords[i]  = data[i+4] / self.__g_config[1] - self.__g_offset[i]
+            sample[i]   = MPU.__int16(data, 2*i) / a_so
+            sample[i+3] = MPU.__int16(data, 2*i + 8) / g_so - self.__g_offset[i]
         
-        self.temp = (data[3] - MPU.__TEMP_OFFSET) / MPU.__TEMP_SO + MPU.__TEMP_OFFSET
+        self.temp = (MPU.__int16(data, 6) - MPU.__TEMP_OFFSET) / MPU.__TEMP_SO + MPU.__TEMP_OFFSET
+        
+        # Calibration en arrière-plan
+        if self.__calib is not None :
+            self.__calibration_feed()
+    
+    # Lecture uniquement si l'échantillon courant a plus de max_age_ms (0 : toujours)
+    # Renvoie True si une lecture a été faite
+    def refresh(self, max_age_ms=0):
+        if self.timestamp and max_age_ms > 0 and ticks_diff(ticks_us(), self.timestamp) < max_age_ms * 1000 :
+            return False
+        self.read_data()
+        return True
+    
+    # Entier signé 16 bits (big endian) à la position i du tampon
+    @staticmethod
+    def __int16(data, i):
+        value = (data[i] << 8) | data[i+1]
+        return value - 0x10000 if value & 0x8000 else value
         
     def gyro_calibrate(self, count=256, delay=0):
         offset = [0, 0, 0]
+        self.__calib = None
         
         for i in range(count) :
             sleep(delay)
             self.read_data()
             for j in range(3) :
-                offset[j] += self.gyro.coords[j]
+                offset[j] += self.gyro.coords[j] + self.__g_offset[j]
                 
         for j in range(3) :
             offset[j] /= float(count)
-        print(offset)
+        if self.__debug :
+            print(offset)
         self.__g_offset = offset
+        self.calibrated = True
+        self.__save_calibration()
+    
+    
+    # Calibration en arrière-plan
+    #  -  Moyenne courante du gyroscope, remise à zéro dès qu'un mouvement est
+    #     détecté (|accel| éloigné de 1 g ou gyro éloigné de la moyenne)
+    #  -  Sans scheduler : alimentée par les appels suivants à read_data()
+    #  -  Avec scheduler : tâche dédiée (period_ms), retirée une fois terminé
+    def recalibrate(self, scheduler=None, period_ms=5):
+        self.__calib = [0, 0.0, 0.0, 0.0]
+        if scheduler and self.__job is None :
+            self.__job       = scheduler.add(self.read_data, period_ms, "mpu_calib")
+            self.__scheduler = scheduler
+    
+    @property
+    def calibrating(self):
+        return self.__calib is not None
+    
+    def __calibration_feed(self):
+        c      = self.__calib
+        accel  = self.accel.coords
+        gyro   = self.gyro.coords
+        offset = self.__g_offset
+        
+        still = abs(accel[0]*accel[0] + accel[1]*accel[1] + accel[2]*accel[2] - 1) < MPU.__CALIB_ACCEL
+        n     = c[0]
+        if still and n > 0 :
+            for i in range(3) :
+                if abs(gyro[i] + offset[i] - c[i+1] / n) > MPU.__CALIB_GYRO :
+                    still = False
+        if not still :
+            c[0], c[1], c[2], c[3] = 0, 0.0, 0.0, 0.0
+            return
+        
+        for i in range(3) :
+            c[i+1] += gyro[i] + offset[i]
+        c[0] = n + 1
+        if c[0] >= MPU.__CALIB_COUNT :
+            self.__g_offset = [c[1] / c[0], c[2] / c[0], c[3] / c[0]]
+            self.__calib    = None
+            self.calibrated = True
+            if self.__job is not None :
+                self.__scheduler.remove(self.__job)
+                self.__job = None
+            self.__save_calibration()
+    
+    # Fichier de calibration : {"address": 105, "69/250DPS": [x, y, z], ...}
+    def __calib_key(self):
+        return "%02x/%s" % (self.__address, self.gyro_config())
+    
+    def __load_calibration(self):
+        try :
+            with open(self.__file) as f :
+                return json.load(f)
+        except (OSError, ValueError) :
+            return {}
+    
+    def __save_calibration(self):
+        cache = self.__load_calibration()
+        cache["address"]          = self.__address
+        cache[self.__calib_key()] = self.__g_offset
+        try :
+            with open(self.__file, "w") as f :
+                json.dump(cache, f)
+        except OSError :
+            pass
+    
+    
+    # Mode FIFO
+    #  -  fifo_start : échantillonnage à rate_hz (1 kHz max, filtre passe-bas actif)
+    #                  accel + gyro empilés dans la FIFO du MPU (1024 octets)
+    #  -  fifo_read  : vide la FIFO par lectures groupées dans un tableau préalloué
+    #                  6 valeurs par trame (ax, ay, az en g, gx, gy, gz en deg/s)
+    #                  raw=True : valeurs brutes dans un array('h')
+    #  -  stream     : générateur de trames (accel, gyro) mises à jour sur place,
+    #                  None lorsque la FIFO est vide (laisser la main à l'appelant)
+    #  -  fifo_overflows : nombre de débordements (la FIFO est alors réinitialisée)
+    def fifo_start(self, rate_hz=1000, frames=32):
+        if not self.__a_config or not self.__g_config :
+            return False
+        
+        # Tampon de lecture et vues préallouées (1 à frames trames)
+        self.__fifo_buf = bytearray(frames * MPU.__FIFO_FRAME)
+        view            = memoryview(self.__fifo_buf)
+        self.__fifo     = [view[0:k * MPU.__FIFO_FRAME] for k in range(1, frames + 1)]
+        
+        rate = self.sample_rate(rate_hz)
+        self.__register(MPU.__R_FIFO_EN, write=MPU.__FIFO_EN_AG)
+        self.fifo_reset()
+        return rate
+    
+    # Fréquence d'échantillonnage (1 kHz max, filtre passe-bas 184 Hz actif)
+    def sample_rate(self, rate_hz):
+        div = max(0, min(255, int(1000 / rate_hz) - 1))
+        self.__register(MPU.__R_CONFIG, write=0x01)            # DLPF 184 Hz : gyro à 1 kHz
+        self.__register(MPU.__R_SMPLRT_DIV, write=div)
+        return 1000 / (1 + div)
+    
+    def fifo_stop(self):
+        self.__register(MPU.__R_FIFO_EN, write=0)
+        self.__register(MPU.__R_USER_CTRL, write=0)
+        self.__fifo = None
+    
+    def fifo_reset(self):
+        self.__register(MPU.__R_USER_CTRL, write=MPU.__USER_FIFO_RESET)
+        self.__register(MPU.__R_USER_CTRL, write=MPU.__USER_FIFO_EN)
+    
+    # Nombre de trames complètes disponibles (0 après un débordement)
+    def fifo_count(self):
+        if self.__fifo is None :
+            return 0
+        self.__i2c.readfrom_mem_into(self.__address, MPU.__R_INT_STATUS, self.__int_stat)
+        if self.__int_stat[0] & MPU.__INT_FIFO_OFLOW :
+            # Trames désalignées : on repart d'une FIFO vide
+            self.fifo_overflows += 1
+            self.fifo_reset()
+            return 0
+        data = self.__fifo_cnt
+        self.__i2c.readfrom_mem_into(self.__address, MPU.__R_FIFO_COUNT_2B, data)
+        return ((data[0] << 8) | data[1]) // MPU.__FIFO_FRAME
+    
+    # Lecture groupée de n trames (n <= taille du tampon), renvoie le tampon
+    def __fifo_burst(self, n):
+        self.__i2c.readfrom_mem_into(self.__address, MPU.__R_FIFO_R_W, self.__fifo[n - 1])
+        self.fifo_frames += n
+        return self.__fifo_buf
+    
+    def fifo_read(self, batch, raw=False):
+        if self.__fifo is None :
+            return 0
+        a_so     = self.__a_config[1]
+        g_so     = self.__g_config[1]
+        offset   = self.__g_offset
+        capacity = len(self.__fifo)
+        total    = 0
+        count    = min(self.fifo_count(), len(batch) // 6)
+        while count > 0 :
+            n    = min(count, capacity)
+            data = self.__fifo_burst(n)
+            for k in range(n) :
+                o = k * MPU.__FIFO_FRAME
+                j = (total + k) * 6
+                for i in range(3) :
+                    a = MPU.__int16(data, o + 2*i)
+                    g = MPU.__int16(data, o + 6 + 2*i)
+                    if raw :
+                        batch[j + i]     = a
+                        batch[j + 3 + i] = g
+                    else :
+                        batch[j + i]     = a / a_so
+                        batch[j + 3 + i] = g / g_so - offset[i]
+            total += n
+            count -= n
+        return total
+    
+    # Mode interruption (DATA_RDY)
+    #  -  irq_start : échantillonnage à rate_hz, broche INT du MPU reliée à pin
+    #                 schedule=True : lecture planifiée (micropython.schedule)
+    #                 schedule=False : lecture par poll() (ex. tâche du Scheduler)
+    #                 callback(mpu) : appelée après chaque nouvel échantillon
+    #  -  poll      : lit l'échantillon en attente, renvoie True si nouveau
+    #  -  timestamp : instant de l'interruption (ticks_us) de l'échantillon courant
+    #  -  irq_missed : interruptions arrivées avant la lecture de la précédente
+    def irq_start(self, pin, rate_hz=100, schedule=True, callback=None):
+        from machine import Pin
+        if not self.__a_config or not self.__g_config :
+            return False
+        self.__irq_schedule = schedule
+        self.__irq_callback = callback
+        self.__irq_pending  = False
+        rate = self.sample_rate(rate_hz)
+        self.__register(MPU.__R_INT_PIN_CFG, write=0x00)    # Impulsion, actif haut
+        self.__register(MPU.__R_INT_ENABLE, write=MPU.__INT_DATA_RDY)
+        self.__irq_pin = pin if isinstance(pin, Pin) else Pin(pin, Pin.IN)
+        self.__irq_pin.irq(handler=self.__irq_handler, trigger=Pin.IRQ_RISING)
+        return rate
+    
+    def irq_stop(self):
+        if self.__irq_pin is not None :
+            self.__irq_pin.irq(handler=None)
+            self.__irq_pin = None
+        self.__register(MPU.__R_INT_ENABLE, write=0)
+    
+    # Routine d'interruption : pas d'allocation, lecture I2C différée
+    def __irq_handler(self, pin):
+        if self.__irq_pending :
+            self.irq_missed += 1
+        self.__irq_ticks   = ticks_us()
+        self.__irq_pending = True
+        self.irq_count    += 1
+        if self.__irq_schedule :
+            try :
+                micropython.schedule(self.__irq_read_ref, 0)
+            except RuntimeError :
+                pass        # File pleine : la lecture se fera au prochain poll()
+    
+    def __irq_read(self, _):
+        self.poll()
+    
+    def poll(self):
+        if not self.__irq_pending :
+            return False
+        ticks = self.__irq_ticks
+        self.__irq_pending = False
+        self.read_data()
+        self.timestamp = ticks
+        self.samples  += 1
+        if self.__irq_callback is not None :
+            self.__irq_callback(self)
+        return True
+    
+    def stream(self, batch_frames=32):
+        batch = array('f', [0] * (6 * batch_frames))
+        frame = (self.accel, self.gyro)
+        while self.__fifo is not None :
+            n = self.fifo_read(batch)
+            for k in range(n) :
+                for i in range(6) :
+                    self.sample[i] = batch[6*k + i]
+                yield frame
+            if n == 0 :
+                yield None
     
 
 
@@ -193,7 +521,7 @@ if __name__ == "__main__":
     from machine import Pin, I2C, PWM, ADC
     i2c  = I2C(1, scl=Pin(21), sda=Pin(22), freq=100000)
     print("scan i2c", i2c.scan())
-    mpu = MPU(i2c)
+    mpu = MPU(i2c, debug=True)
     for i in range(10):
         mpu.read_data()
         print("%+.2f %+.2f %+.2f" % (mpu.accel.x, mpu.gyro.x, mpu.temp))
@@ -0,0 +1,225 @@
+# Odométrie du Maqueen Plus V1 (encodeurs de roues)
+#
+# Mise à jour dans le cycle update() du Maqueen (add_listener) : aucune
+# lecture I2C supplémentaire, la pose est publiée à chaque nouvel état.
+#
+#  -  Compteurs 16 bits sans signe : débordement géré (différence modulo 2^16)
+#  -  encodeurs_reset() : signalé par le Snapshot (resets), les compteurs
+#     repartent alors de zéro
+#  -  Les encodeurs ne donnent pas le sens : il est pris dans la commande
+#     moteur (dernier sens non nul si la roue tourne en roue libre)
+#  -  Vitesses : dérivée filtrée (passe-bas du premier ordre, gain alpha)
+#  -  Cap : encodeurs seuls, ou fusionné avec le gyroscope (heading = Fusion)
+#
+# Unités : mm, mm/s, degrés, degrés/s. Repère : x vers l'avant au départ,
+# theta positif dans le sens trigonométrique (rotation vers la gauche).
+#
+# Exemple :
+#   maqueen  = MaqueenPlusV1(mbits.i2c)
+#   odometry = Odometry(maqueen, wheel_base=95, mm_per_tick=0.6)
+#   pose     = odometry.pose           # pose.x, pose.y, pose.theta, pose.v, pose.w
+
+from math  import sin, cos
+from tools import ticks_diff
+
+_DEG = 57.29577951308232
+_RAD = 0.017453292519943295
+
+
+def _wrap(angle):
+    if angle > 180 :
+        angle -= 360
+    elif angle <= -180 :
+        angle += 360
+    return angle
+
+
+# Classe Pose
+#  -  Pose publiée par Odometry (double tampon, comme maqueen.Snapshot)
+#  -  seq      : numéro du cycle Maqueen d'origine (0 = pas de donnée / en cours d'écriture)
+#  -  ticks    : instant de la lecture des encodeurs (ticks_ms)
+#  -  x, y     : position (mm)
+#  -  theta    : cap (degrés, -180 / +180)
+#  -  v, w     : vitesse linéaire (mm/s) et angulaire (degrés/s)
+#  -  speeds   : [L, R] vitesse de chaque roue (mm/s)
+#  -  distance : [L, R] distance parcourue par chaque roue (mm, signée)
+class Pose():
+    def __init__(self):
+        self.seq      = 0
+        self.ticks    = 0
+        self.x        = 0.0
+        self.y        = 0.0
+        self.theta    = 0.0
+        self.v        = 0.0
+        self.w        = 0.0
+        self.speeds   = [0.0, 0.0]
+        self.distance = [0.0, 0.0]
+
+    def copy_to(self, other):
+        other.seq   = self.seq
+        other.ticks = self.ticks
+        other.x     = self.x
+        other.y     = self.y
+        other.theta = self.theta
+        other.v     = self.v
+        other.w     = self.w
+        for i in range(2) :
+            other.speeds[i]   = self.speeds[i]
+            other.distance[i] = self.distance[i]
+        return other
+
+
+# Classe Odometry
+#  -  robot       : MaqueenPlusV1 (ou tout pont exposant add_listener)
+#  -  wheel_base  : entraxe des roues (mm)
+#  -  mm_per_tick : distance parcourue par impulsion d'encodeur (mm), à étalonner
+#  -  alpha       : gain du filtre de vitesse (1 = dérivée brute)
+#  -  heading     : source de cap optionnelle (fusion.Fusion, MPU monté à plat)
+#  -  gyro_weight : part du gyroscope dans la variation de cap (0 - 1)
+#  -  pose / read_pose : dernière pose publiée
+#  -  reset       : repositionne le robot (x, y en mm, theta en degrés)
+#  -  add_listener / remove_listener : fonctions appelées avec chaque Snapshot
+#                   juste après le calcul de la pose (même cycle, quel que soit
+#                   l'ordre d'enregistrement auprès du Maqueen) ; une erreur est
+#                   comptée dans robot.stats (listener_errors) sans bloquer les suivantes
+class Odometry():
+    def __init__(self, robot, wheel_base=95.0, mm_per_tick=0.6, alpha=0.3,
+                 heading=None, gyro_weight=0.9):
+        self.wheel_base  = wheel_base
+        self.mm_per_tick = mm_per_tick
+        self.alpha       = alpha
+        self.heading     = heading
+        self.gyro_weight = gyro_weight
+        self.resets      = 0             # encodeurs_reset détectés
+        self.__robot     = robot
+        self.__front     = Pose()
+        self.__back      = Pose()
+        self.__last      = [0, 0]        # Derniers compteurs lus
+        self.__resets    = 0             # Dernier Snapshot.resets vu
+        self.__sign      = [1, 1]        # Dernier sens de rotation commandé
+        self.__ticks     = None
+        self.__seq       = 0             # Cycle de la dernière pose publiée (0 : aucune)
+        self.__yaw       = None          # Dernier cap gyroscope (degrés)
+        self.__yaw_seq   = 0
+        self.__listeners = []
+        self.__errors    = robot.stats.names.index("listener_errors")
+        robot.add_listener(self.update)
+
+    def stop(self):
+        self.__robot.remove_listener(self.update)
+
+    def add_listener(self, function):
+        if function not in self.__listeners :
+            self.__listeners.append(function)
+
+    def remove_listener(self, function):
+        if function in self.__listeners :
+            self.__listeners.remove(function)
+
+    @property
+    def pose(self):
+        return self.__front
+
+    def read_pose(self, dest=None):
+        if dest is None :
+            dest = Pose()
+        while True :
+            pose = self.__front
+            seq  = pose.seq
+            pose.copy_to(dest)
+            # seq nul : rien de publié (accepté), ou tampon en cours d'écriture (relu)
+            if pose.seq == seq and (seq or not self.__seq) :
+                return dest
+
+    def reset(self, x=0.0, y=0.0, theta=0.0):
+        for pose in (self.__back, self.__front) :
+            pose.x, pose.y, pose.theta = x, y, theta
+            pose.distance[0] = pose.distance[1] = 0.0
+
+    # Variation de cap mesurée par le gyroscope depuis le cycle précédent (None si indisponible)
+    def __gyro_delta(self):
+        o = self.heading.orientation
+        if o.seq == 0 or o.seq == self.__yaw_seq :
+            return None
+        yaw, last     = o.yaw, self.__yaw
+        self.__yaw    = yaw
+        self.__yaw_seq = o.seq
+        if last is None :
+            return None
+        return _wrap(yaw - last)
+
+    # Appelée par le Maqueen avec chaque nouvel état (Snapshot)
+    def update(self, snap):
+        self.__integrate(snap)
+        for function in self.__listeners :
+            try :
+                function(snap)
+            except Exception :
+                self.__robot.stats.values[self.__errors] += 1
+
+    def __integrate(self, snap):
+        last = self.__last
+        sign = self.__sign
+
+        # Première lecture : référence des compteurs
+        if self.__ticks is None :
+            last[0], last[1] = snap.encoders[0], snap.encoders[1]
+            self.__resets = snap.resets
+            self.__ticks  = snap.ticks
+            if self.heading is not None :
+                self.__gyro_delta()
+            return
+
+        dt = ticks_diff(snap.ticks, self.__ticks) / 1000
+        self.__ticks = snap.ticks
+
+        # Compteurs remis à zéro (encodeurs_reset) avant cette lecture
+        if snap.resets != self.__resets :
+            self.__resets = snap.resets
+            last[0] = last[1] = 0
+            self.resets += 1
+
+        # Impulsions depuis le cycle précédent, par roue (mm, signées)
+        dl = dr = 0.0
+        for i in range(2) :
+            count   = snap.encoders[i]
+            delta   = (count - last[i]) & 0xFFFF
+            last[i] = count
+            if snap.motors[i] :
+                sign[i] = 1 if snap.motors[i] > 0 else -1
+            if i == 0 :
+                dl = sign[0] * delta * self.mm_per_tick
+            else :
+                dr = sign[1] * delta * self.mm_per_tick
+
+        ds     = (dl + dr) / 2
+        dtheta = (dr - dl) / self.wheel_base * _DEG
+        if self.heading is not None :
+            gyro = self.__gyro_delta()
+            if gyro is not None :
+                k      = self.gyro_weight
+                dtheta = k * gyro + (1 - k) * dtheta
+
+        # Publication (double tampon)
+        front = self.__front
+        pose  = self.__back
+        pose.seq   = 0
+        pose.ticks = snap.ticks
+        heading    = (front.theta + dtheta / 2) * _RAD
+        pose.x     = front.x + ds * cos(heading)
+        pose.y     = front.y + ds * sin(heading)
+        pose.theta = _wrap(front.theta + dtheta)
+        pose.distance[0] = front.distance[0] + dl
+        pose.distance[1] = front.distance[1] + dr
+        if dt > 0 :
+            a = self.alpha
+            pose.speeds[0] = front.speeds[0] + a * (dl / dt - front.speeds[0])
+            pose.speeds[1] = front.speeds[1] + a * (dr / dt - front.speeds[1])
+            pose.w         = front.w + a * (dtheta / dt - front.w)
+        else :
+            pose.speeds[0], pose.speeds[1], pose.w = front.speeds[0], front.speeds[1], front.w
+        pose.v = (pose.speeds[0] + pose.speeds[1]) / 2
+        pose.seq     = snap.seq
+        self.__seq   = snap.seq
+        self.__back  = front
+        self.__front = pose
@@ -0,0 +1,80 @@
+# Profils de variation de consigne (rampes de vitesse moteur)
+#
+#  -  Trapèze : variation de la consigne limitée à accel unités/s
+#  -  S-curve : variation limitée à accel, et sa dérivée limitée à jerk unités/s²
+#               (départ et arrivée progressifs, sans à-coup)
+#
+# Le calcul ne dépend que de dt (déterministe) : le même profil peut être
+# rejoué hors ligne ou dans le simulateur pour le comparer à des échelons.
+#
+# Exemple :
+#   p = Profile(accel=500, jerk=4000)      # PWM/s, PWM/s²
+#   p.target = 255
+#   while not p.idle :
+#       pwm = p.step(0.02)
+
+from math import sqrt
+
+
+# Classe Profile
+#  -  value  : consigne courante (suit target)
+#  -  rate   : vitesse de variation courante (unités/s)
+#  -  target : consigne finale
+#  -  accel  : vitesse de variation maximale (unités/s)
+#  -  jerk   : variation maximale de rate (unités/s²), None = trapèze
+#  -  step   : avance de dt secondes et renvoie la nouvelle consigne
+#  -  reset  : impose la consigne courante (sans rampe)
+class Profile():
+    def __init__(self, accel, jerk=None, value=0.0):
+        self.accel = accel
+        self.jerk  = jerk
+        self.reset(value)
+
+    def reset(self, value=0.0):
+        self.value  = value
+        self.target = value
+        self.rate   = 0.0
+
+    @property
+    def idle(self):
+        return self.value == self.target and self.rate == 0
+
+    def step(self, dt):
+        error = self.target - self.value
+        if error == 0 and self.rate == 0 :
+            return self.value
+        sign = 1 if error > 0 else -1
+
+        if self.jerk is None :
+            # Trapèze : pente constante jusqu'à la consigne
+            step = self.accel * dt
+            if -step <= error <= step :
+                self.value = self.target
+                self.rate  = 0.0
+            else :
+                self.value += sign * step
+                self.rate   = sign * self.accel
+            return self.value
+
+        # S-curve : pente souhaitée permettant d'arriver avec une pente nulle
+        # (freinage à jerk constant), limitée à accel
+        jerk    = self.jerk
+        desired = sqrt(2 * jerk * abs(error))
+        if desired > self.accel :
+            desired = self.accel
+        desired *= sign
+        change   = jerk * dt
+        if desired > self.rate + change :
+            self.rate += change
+        elif desired < self.rate - change :
+            self.rate -= change
+        else :
+            self.rate = desired
+        self.value += self.rate * dt
+
+        # Arrivée (ou dépassement sur le dernier pas)
+        remaining = self.target - self.value
+        if remaining * sign <= 0 or (-0.5 < remaining < 0.5 and -change <= self.rate <= change) :
+            self.value = self.target
+            self.rate  = 0.0
+        return self.value
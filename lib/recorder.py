@@ -0,0 +1,249 @@
+# Enregistreur binaire de télémétrie du Maqueen Plus (cycle update(), add_listener)
+#
+# Chaque cycle, les voies choisies sont empaquetées (struct) dans un
+# enregistrement de taille fixe, dans un tampon circulaire préalloué en RAM.
+# Le tampon est vidé par blocs dans un fichier (flash) par une tâche de fond
+# (Scheduler) : aucun print ni accès fichier dans le cycle du Maqueen.
+#
+# Voies (CHANNELS) :
+#  -  motors   : puissances [L, R] lues (signées)
+#  -  encoders : compteurs [L, R] (16 bits)
+#  -  line     : capteurs sol logiques (masque 6 bits)
+#  -  analog   : capteurs sol analogiques (x6)
+#  -  imu      : dernier échantillon du MPU (accel g, gyro deg/s), sans lecture I2C
+#  -  temp     : dernière température du Tmp1075 (cache, 1/100 degC), sans lecture I2C
+#  -  queue    : commandes remplacées (cumul) et profondeur maximale de la file
+#
+# Chaque enregistrement commence par seq (numéro de cycle) et ticks (ticks_ms,
+# 32 bits de poids faible).
+# temp vaut -32768 tant que le Tmp1075 n'a pas été lu.
+#
+# Format du fichier :
+#  -  en-tête : MAGIC, version (B), taille d'un enregistrement (H),
+#               longueur (H) puis texte "format;colonne,colonne,..."
+#  -  enregistrements consécutifs (struct little-endian, format de l'en-tête)
+# Décodage sur l'hôte : host/decode.py (tableaux NumPy ou CSV).
+#
+# Exemple :
+#   recorder = Recorder(maqueen, "/run.bin", mpu=mbits.mpu, tmp=mbits.tmp)
+#   recorder.start(scheduler)          # vidage toutes les 200 ms
+#   ...
+#   recorder.stop()                    # dernier vidage, fermeture du fichier
+#   recorder.stats.as_dict()           # records, dropped, record_avg_us, ...
+
+import struct
+import _thread
+from tools       import Stats, ticks_us, ticks_diff
+from micropython import const
+
+# Index des compteurs (Recorder.STATS)
+_RECORDS     = const(0)
+_DROPPED     = const(1)
+_FLUSHES     = const(2)
+_FLUSH_BYTES = const(3)
+_RECORD_US   = const(4)     # min, moyenne, max
+_FLUSH_US    = const(7)     # min, moyenne, max
+
+MAGIC   = b"MQRC"
+VERSION = 1
+
+# Nom : (format struct, colonnes)
+CHANNELS = {
+    "motors"   : ("hh", ("motor_l", "motor_r")),
+    "encoders" : ("HH", ("encoder_l", "encoder_r")),
+    "line"     : ("B", ("line",)),
+    "analog"   : ("6H", ("analog_0", "analog_1", "analog_2", "analog_3", "analog_4", "analog_5")),
+    "imu"      : ("6f", ("ax", "ay", "az", "gx", "gy", "gz")),
+    "temp"     : ("h", ("temp",)),
+    "queue"    : ("HB", ("dropped", "queue_max")),
+}
+DEFAULT = ("motors", "encoders", "line", "analog", "queue")
+
+_HEADER = "<II"     # seq, ticks
+
+
+# Classe Recorder
+#  -  robot    : MaqueenPlusV1 / V2 (add_listener)
+#  -  path     : fichier de sortie (ouvert par start, fermé par stop)
+#  -  channels : voies enregistrées (noms de CHANNELS), dans cet ordre
+#  -  records  : capacité du tampon circulaire (enregistrements)
+#  -  block    : nombre minimal d'enregistrements écrits par vidage
+#  -  mpu, tmp : sources des voies imu et temp (lues en cache, voir MPU.refresh, Tmp1075.start)
+#  -  start / stop / flush : enregistrement, vidage (tâche de fond ou appel direct)
+#  -  stats    : records, dropped (tampon plein), flushes, flush_bytes,
+#                durée d'un enregistrement et d'un vidage (us)
+class Recorder():
+    STATS = ("records", "dropped", "flushes", "flush_bytes",
+             "record_min_us", "record_avg_us", "record_max_us",
+             "flush_min_us", "flush_avg_us", "flush_max_us")
+
+    def __init__(self, robot, path="/record.bin", channels=DEFAULT, records=256, block=32,
+                 mpu=None, tmp=None):
+        fmt     = _HEADER
+        columns = ["seq", "ticks"]
+        for name in channels :
+            if name not in CHANNELS :
+                raise ValueError("unknown channel '%s'" % name)
+            fmt     += CHANNELS[name][0]
+            columns += CHANNELS[name][1]
+        if "imu" in channels and mpu is None :
+            raise ValueError("channel 'imu' needs mpu")
+        if "temp" in channels and tmp is None :
+            raise ValueError("channel 'temp' needs tmp")
+
+        self.path     = path
+        self.channels = tuple(channels)
+        self.format   = fmt
+        self.columns  = tuple(columns)
+        self.size     = struct.calcsize(fmt)
+        self.capacity = records
+        self.block    = min(block, records)
+        self.stats    = Stats(Recorder.STATS)
+        self.job      = None
+        self.__robot  = robot
+        self.__mpu    = mpu
+        self.__tmp    = tmp
+        self.__ring   = bytearray(records * self.size)
+        self.__view   = memoryview(self.__ring)
+        self.__head   = 0           # Enregistrements écrits (producteur : cycle update())
+        self.__tail   = 0           # Enregistrements vidés (consommateur : flush())
+        self.__file   = None
+        self.__lock   = _thread.allocate_lock()     # Vidage : tâche de fond ou stop()
+        self.__active = False
+        self.__scheduler = None
+
+        # Fonctions d'empaquetage de chaque voie (offset dans l'enregistrement)
+        self.__packers = []
+        offset = struct.calcsize(_HEADER)
+        for name in self.channels :
+            self.__packers.append((Recorder.__PACKERS[name], offset))
+            offset += struct.calcsize("<" + CHANNELS[name][0])
+        names = robot.stats.names
+        self.__dropped   = names.index("dropped")
+        self.__queue_max = names.index("queue_max")
+
+    # En-tête du fichier (décrit le format des enregistrements)
+    def header(self):
+        text = ("%s;%s" % (self.format, ",".join(self.columns))).encode()
+        return MAGIC + struct.pack("<BHH", VERSION, self.size, len(text)) + text
+
+    @property
+    def pending(self):
+        return self.__head - self.__tail
+
+    @property
+    def recording(self):
+        return self.__active
+
+    def start(self, scheduler=None, period_ms=200):
+        if self.__active :
+            return
+        self.__head = self.__tail = 0
+        self.stats.reset()
+        self.__file = open(self.path, "wb")
+        self.__file.write(self.header())
+        self.__scheduler = scheduler
+        if scheduler is not None :
+            self.job = scheduler.add(self.flush, period_ms, "recorder")
+        self.__active = True
+        self.__robot.add_listener(self.update)
+
+    def stop(self):
+        if not self.__active :
+            return
+        self.__robot.remove_listener(self.update)
+        self.__active = False
+        if self.job is not None :
+            self.__scheduler.remove(self.job)
+            self.job = None
+        # Vidage éventuellement en cours sur la tâche de fond : attendu
+        with self.__lock :
+            self.__flush(True)
+            self.__file.close()
+            self.__file = None
+
+    # Ecriture des enregistrements en attente, par blocs d'au moins block
+    # enregistrements (force : tout ce qui est en attente)
+    def flush(self, force=False):
+        with self.__lock :
+            return self.__flush(force)
+
+    def __flush(self, force):
+        f = self.__file
+        if f is None :
+            return 0
+        start = ticks_us()
+        count = self.__head - self.__tail
+        if count == 0 or (count < self.block and not force) :
+            return 0
+        written = 0
+        while count > 0 :
+            # Partie contiguë du tampon circulaire
+            first = self.__tail % self.capacity
+            n     = min(count, self.capacity - first)
+            f.write(self.__view[first * self.size:(first + n) * self.size])
+            self.__tail += n
+            count       -= n
+            written     += n * self.size
+        f.flush()
+        v = self.stats.values
+        v[_FLUSHES]     += 1
+        v[_FLUSH_BYTES] += written
+        self.stats.timing(_FLUSH_US, ticks_diff(ticks_us(), start))
+        return written
+
+    # Appelée par le Maqueen avec chaque nouvel état (Snapshot)
+    def update(self, snap):
+        start = ticks_us()
+        v = self.stats.values
+        if self.__head - self.__tail >= self.capacity :
+            v[_DROPPED] += 1        # Tampon plein : le vidage ne suit pas
+            return
+        base = (self.__head % self.capacity) * self.size
+        ring = self.__ring
+        struct.pack_into(_HEADER, ring, base, snap.seq, snap.ticks & 0xFFFFFFFF)
+        for pack, offset in self.__packers :
+            pack(self, ring, base + offset, snap)
+        self.__head += 1
+        v[_RECORDS] += 1
+        self.stats.timing(_RECORD_US, ticks_diff(ticks_us(), start))
+
+    def __pack_motors(self, ring, offset, snap):
+        struct.pack_into("<hh", ring, offset, snap.motors[0], snap.motors[1])
+
+    def __pack_encoders(self, ring, offset, snap):
+        struct.pack_into("<HH", ring, offset, snap.encoders[0], snap.encoders[1])
+
+    def __pack_line(self, ring, offset, snap):
+        line = snap.line
+        mask = 0
+        for i in range(6) :
+            if line[i] :
+                mask |= 1 << i
+        ring[offset] = mask
+
+    def __pack_analog(self, ring, offset, snap):
+        a = snap.analog
+        struct.pack_into("<6H", ring, offset, a[0], a[1], a[2], a[3], a[4], a[5])
+
+    def __pack_imu(self, ring, offset, snap):
+        s = self.__mpu.sample
+        struct.pack_into("<6f", ring, offset, s[0], s[1], s[2], s[3], s[4], s[5])
+
+    def __pack_temp(self, ring, offset, snap):
+        value = self.__tmp.value
+        struct.pack_into("<h", ring, offset, -32768 if value is None else int(value * 100))
+
+    def __pack_queue(self, ring, offset, snap):
+        v = self.__robot.stats.values
+        struct.pack_into("<HB", ring, offset, v[self.__dropped] & 0xFFFF, min(v[self.__queue_max], 255))
+
+    __PACKERS = {
+        "motors"   : __pack_motors,
+        "encoders" : __pack_encoders,
+        "line"     : __pack_line,
+        "analog"   : __pack_analog,
+        "imu"      : __pack_imu,
+        "temp"     : __pack_temp,
+        "queue"    : __pack_queue,
+    }
@@ -0,0 +1,387 @@
+# Serveur de télémétrie / commande du Maqueen Plus (TCP ou UDP, trames binaires)
+#
+# Le serveur envoie l'état du robot (Snapshot, IMU, pose) à fréquence fixe
+# et reçoit des commandes (moteurs, phares, écran) qui passent par la file de
+# commandes du robot (moteurs / phares, comme depuis le programme).
+#
+# Sockets non bloquantes, interrogées par poll() (tâche du Scheduler ou
+# aio.Periodic) : un client lent ne bloque ni poll() ni le cycle update().
+# Une trame qui ne peut pas partir est abandonnée (dropped) ; en TCP, une
+# trame partiellement envoyée est terminée avant d'en envoyer une autre.
+#
+# Trame : struct HEADER (MAGIC, type, longueur des données) puis les données
+#  -  SNAPSHOT (serveur) : struct SNAPSHOT, colonnes SNAPSHOT_FIELDS
+#                          (imu et pose à 0 si la source n'est pas fournie)
+#  -  MOTORS   : <hhH  gauche, droite (-255 / 255), durée (ms, 0 : sans arrêt)
+#  -  LIGHTS   : <BB   phares gauche, droite (0 - 7)
+#  -  PIXEL    : <BBBB index (0xFF : tous), rouge, vert, bleu ; PIXEL_WRITE : affichage
+#  -  STOP     : arrêt immédiat du robot
+#  -  RATE     : <H    fréquence d'envoi demandée (Hz, bornée par max_rate_hz)
+#  -  HELLO    : UDP : abonnement de l'émetteur (toute trame abonne aussi)
+#  -  BYE      : UDP : désabonnement
+#
+# Aucune authentification : le serveur écoute par défaut sur 127.0.0.1 ;
+# l'ouvrir au réseau (Wi-Fi) se fait explicitement avec host="0.0.0.0".
+# Un abonné UDP silencieux pendant expire périodes d'envoi est retiré : le
+# client renvoie HELLO régulièrement (host/client.py : keepalive).
+#
+# Client CPython : host/client.py ; débit : bench/run.py server
+#
+# Exemple :
+#   server = TelemetryServer(maqueen, port=8765, odometry=odometry, mpu=mbits.mpu,
+#                            display=mbits.display, host="0.0.0.0")
+#   server.start(scheduler, period_ms=10)
+#   ...
+#   server.stop()
+
+import struct
+try :
+    import socket
+except ImportError :
+    import usocket as socket
+from tools import Stats, ticks_ms, ticks_us, ticks_diff, ticks_add
+
+MAGIC  = 0xA5
+HEADER = "<BBH"
+
+SNAPSHOT    = 0x01
+MOTORS      = 0x10
+LIGHTS      = 0x11
+PIXEL       = 0x12
+PIXEL_WRITE = 0x13
+STOP        = 0x14
+RATE        = 0x15
+HELLO       = 0x20
+BYE         = 0x21
+
+SNAPSHOT_FORMAT = "<IIhhHHB6H6f3f"
+SNAPSHOT_FIELDS = ("seq", "ticks", "motor_l", "motor_r", "encoder_l", "encoder_r", "line",
+                   "analog_0", "analog_1", "analog_2", "analog_3", "analog_4", "analog_5",
+                   "ax", "ay", "az", "gx", "gy", "gz", "x", "y", "theta")
+
+# Taille des données de chaque commande
+COMMANDS = {MOTORS: 6, LIGHTS: 2, PIXEL: 4, PIXEL_WRITE: 0, STOP: 0, RATE: 2, HELLO: 0, BYE: 0}
+
+# Index des compteurs (TelemetryServer.STATS)
+_CLIENTS     = 0
+_CONNECTIONS = 1
+_FRAMES      = 2
+_BYTES       = 3
+_DROPPED     = 4
+_COMMANDS    = 5
+_ERRORS      = 6
+_EXPIRED     = 7
+_POLL_US     = 8     # min, moyenne, max
+
+_HEADER_SIZE = struct.calcsize(HEADER)
+_FRAME_SIZE  = _HEADER_SIZE + struct.calcsize(SNAPSHOT_FORMAT)
+_AGAIN       = (11, 35, 115, 119)  # EAGAIN / EWOULDBLOCK / EINPROGRESS (selon le port)
+
+
+def _again(error):
+    return error.args and error.args[0] in _AGAIN
+
+
+# Client TCP (ou abonné UDP : addr) et ses tampons préalloués
+class _Client():
+    def __init__(self, sock=None, addr=None):
+        self.sock    = sock
+        self.addr    = addr
+        self.rx      = bytearray(64)
+        self.rx_len  = 0
+        self.tx      = bytearray(_FRAME_SIZE)
+        self.pending = 0            # Octets de tx restant à envoyer (trame partielle)
+        self.sent    = 0
+        self.seen    = ticks_ms()   # Dernière trame reçue (expiration des abonnés UDP)
+
+
+# Classe TelemetryServer
+#  -  robot       : MaqueenPlusV1 / V2 (snapshot, moteurs, phares, stop)
+#  -  port, udp   : port d'écoute, TCP (par défaut) ou UDP
+#  -  rate_hz     : fréquence d'envoi des états (seulement si un nouvel état est publié)
+#  -  max_rate_hz : borne des fréquences demandées par RATE
+#  -  odometry, mpu, display : sources optionnelles (pose, IMU en cache, NeoPixel)
+#  -  max_clients : clients TCP / abonnés UDP simultanés
+#  -  host        : adresse d'écoute (127.0.0.1 : locale ; "0.0.0.0" : tout le réseau)
+#  -  expire      : abonné UDP retiré après expire périodes d'envoi sans trame reçue
+#  -  sndbuf      : tampon d'émission de chaque client TCP (octets, SO_SNDBUF si
+#                   le port le permet) : borne la RAM et le retard d'un client lent
+#  -  open / close, start(scheduler) / stop, poll
+#  -  stats       : clients, connections, frames, bytes, dropped, commands, errors,
+#                   expired (abonnés UDP retirés), durée de poll() (us)
+class TelemetryServer():
+    STATS = ("clients", "connections", "frames", "bytes", "dropped", "commands", "errors",
+             "expired", "poll_min_us", "poll_avg_us", "poll_max_us")
+
+    def __init__(self, robot, port=8765, udp=False, rate_hz=20, max_rate_hz=100,
+                 odometry=None, mpu=None, display=None, max_clients=2, host="127.0.0.1",
+                 sndbuf=None, expire=200):
+        self.port        = port
+        self.udp         = udp
+        self.host        = host
+        self.expire      = expire
+        self.max_rate    = max_rate_hz
+        self.max_clients = max_clients
+        self.sndbuf      = sndbuf
+        self.stats       = Stats(TelemetryServer.STATS)
+        self.clients     = []
+        self.job         = None
+        self.__robot     = robot
+        self.__odometry  = odometry
+        self.__mpu       = mpu
+        self.__display   = display
+        self.__sock      = None
+        self.__scheduler = None
+        self.__snap      = robot.read_snapshot()
+        self.__frame     = bytearray(_FRAME_SIZE)
+        self.__last_seq  = 0
+        self.__next      = None
+        self.rate        = rate_hz
+
+    def __get_rate(self):
+        return self.__rate
+
+    def __set_rate(self, rate_hz):
+        rate_hz       = max(1, min(rate_hz, self.max_rate))
+        self.__rate   = rate_hz
+        self.__period = 1000 // rate_hz
+
+    @property
+    def address(self):
+        return self.__sock.getsockname() if self.__sock is not None and hasattr(self.__sock, "getsockname") else None
+
+    def open(self):
+        if self.__sock is not None :
+            return
+        addr = socket.getaddrinfo(self.host, self.port)[0][-1]
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM if self.udp else socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(addr)
+        if not self.udp :
+            sock.listen(self.max_clients)
+        sock.setblocking(False)
+        self.__sock = sock
+
+    def close(self):
+        for client in self.clients :
+            if client.sock is not None :
+                client.sock.close()
+        self.clients = []
+        self.stats.values[_CLIENTS] = 0
+        if self.__sock is not None :
+            self.__sock.close()
+            self.__sock = None
+
+    def start(self, scheduler, period_ms=10):
+        self.open()
+        if self.job is None :
+            self.__scheduler = scheduler
+            self.job = scheduler.add(self.poll, period_ms, "server")
+        return self.job
+
+    def stop(self):
+        if self.job is not None :
+            self.__scheduler.remove(self.job)
+            self.job = None
+        self.close()
+
+    # Réception des commandes, nouveaux clients, envoi de l'état si l'échéance est atteinte
+    def poll(self):
+        if self.__sock is None :
+            return
+        start = ticks_us()
+        if self.udp :
+            self.__receive_udp()
+            self.__expire()
+        else :
+            self.__accept()
+            for client in self.clients :
+                self.__receive(client)
+        self.__drop_closed()
+
+        now = ticks_ms()
+        if self.clients and (self.__next is None or ticks_diff(now, self.__next) >= 0) :
+            snap = self.__robot.read_snapshot(self.__snap)
+            if snap.seq != self.__last_seq :
+                self.__next     = ticks_add(now, self.__period)
+                self.__last_seq = snap.seq
+                self.__pack(snap)
+                for client in self.clients :
+                    self.__send(client)
+            self.__drop_closed()
+        self.stats.timing(_POLL_US, ticks_diff(ticks_us(), start))
+
+    # Abonnés UDP sans trame reçue depuis expire périodes : retirés
+    def __expire(self):
+        now     = ticks_ms()
+        timeout = self.expire * self.__period
+        for client in self.clients :
+            if client.addr is not None and ticks_diff(now, client.seen) > timeout :
+                client.addr = None
+                self.stats.values[_EXPIRED] += 1
+
+    def __drop_closed(self):
+        for client in [c for c in self.clients if c.sock is None and c.addr is None] :
+            self.clients.remove(client)
+        self.stats.values[_CLIENTS] = len(self.clients)
+
+    def __disconnect(self, client):
+        if client.sock is not None :
+            try :
+                client.sock.close()
+            except OSError :
+                pass
+        client.sock = client.addr = None
+
+    def __accept(self):
+        try :
+            sock, addr = self.__sock.accept()
+        except OSError :
+            return
+        if len(self.clients) >= self.max_clients :
+            sock.close()
+            return
+        sock.setblocking(False)
+        if self.sndbuf :
+            try :
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+            except (OSError, AttributeError) :
+                pass
+        self.clients.append(_Client(sock))
+        self.stats.values[_CONNECTIONS] += 1
+
+    # Etat courant dans la trame préallouée
+    def __pack(self, snap):
+        frame = self.__frame
+        struct.pack_into(HEADER, frame, 0, MAGIC, SNAPSHOT, _FRAME_SIZE - _HEADER_SIZE)
+        line = 0
+        for i in range(6) :
+            if snap.line[i] :
+                line |= 1 << i
+        a = snap.analog
+        s = self.__mpu.sample if self.__mpu is not None else (0, 0, 0, 0, 0, 0)
+        x = y = theta = 0.0
+        if self.__odometry is not None :
+            pose = self.__odometry.pose
+            x, y, theta = pose.x, pose.y, pose.theta
+        struct.pack_into(SNAPSHOT_FORMAT, frame, _HEADER_SIZE, snap.seq, snap.ticks & 0xFFFFFFFF,
+                         snap.motors[0], snap.motors[1], snap.encoders[0], snap.encoders[1], line,
+                         a[0], a[1], a[2], a[3], a[4], a[5],
+                         s[0], s[1], s[2], s[3], s[4], s[5], x, y, theta)
+
+    # Envoi non bloquant : trame abandonnée si le client n'est pas prêt
+    def __send(self, client):
+        v = self.stats.values
+        try :
+            if self.udp :
+                self.__sock.sendto(self.__frame, client.addr)
+            else :
+                if client.pending :
+                    # Fin de la trame précédente d'abord (cadrage du flux)
+                    n = client.sock.send(memoryview(client.tx)[client.sent:client.sent + client.pending])
+                    client.sent    += n
+                    client.pending -= n
+                    v[_BYTES]      += n
+                    if client.pending :
+                        v[_DROPPED] += 1
+                        return
+                n = client.sock.send(self.__frame)
+                if n < _FRAME_SIZE :
+                    # Reste de la trame conservé pour le prochain envoi
+                    client.tx[:] = self.__frame
+                    client.sent, client.pending = n, _FRAME_SIZE - n
+                v[_BYTES] += n
+            if self.udp :
+                v[_BYTES] += _FRAME_SIZE
+            v[_FRAMES] += 1
+        except OSError as error :
+            if _again(error) :
+                v[_DROPPED] += 1
+            else :
+                v[_ERRORS] += 1
+                self.__disconnect(client)
+
+    def __receive(self, client):
+        while client.sock is not None :
+            free = len(client.rx) - client.rx_len
+            try :
+                n = client.sock.readinto(memoryview(client.rx)[client.rx_len:]) \
+                    if hasattr(client.sock, "readinto") else \
+                    client.sock.recv_into(memoryview(client.rx)[client.rx_len:], free)
+            except OSError as error :
+                if not _again(error) :
+                    self.stats.values[_ERRORS] += 1
+                    self.__disconnect(client)
+                return
+            if n is None :
+                return                  # Pas de données (MicroPython, non bloquant)
+            if n == 0 :
+                self.__disconnect(client)     # Connexion fermée par le client
+                return
+            client.rx_len += n
+            used = self.__parse(client.rx, client.rx_len, client)
+            if used :
+                client.rx[:client.rx_len - used] = client.rx[used:client.rx_len]
+                client.rx_len -= used
+
+    def __receive_udp(self):
+        while True :
+            try :
+                data, addr = self.__sock.recvfrom(64)
+            except OSError :
+                return
+            client = None
+            for c in self.clients :
+                if c.addr == addr :
+                    client = c
+            if client is None :
+                if len(self.clients) >= self.max_clients :
+                    continue
+                client = _Client(addr=addr)
+                self.clients.append(client)
+                self.stats.values[_CONNECTIONS] += 1
+            client.seen = ticks_ms()
+            self.__parse(data, len(data), client)
+
+    # Décodage des trames complètes de data[:length], renvoie le nombre d'octets utilisés
+    def __parse(self, data, length, client):
+        pos = 0
+        while length - pos >= _HEADER_SIZE :
+            magic, kind, size = struct.unpack_from(HEADER, data, pos)
+            if magic != MAGIC or COMMANDS.get(kind) != size :
+                # Flux désynchronisé ou commande inconnue : client fermé
+                self.stats.values[_ERRORS] += 1
+                self.__disconnect(client)
+                return length
+            if length - pos < _HEADER_SIZE + size :
+                break
+            self.__command(kind, data, pos + _HEADER_SIZE, client)
+            pos += _HEADER_SIZE + size
+        return pos
+
+    def __command(self, kind, data, pos, client):
+        robot = self.__robot
+        self.stats.values[_COMMANDS] += 1
+        if kind == MOTORS :
+            left, right, duration = struct.unpack_from("<hhH", data, pos)
+            robot.moteurs = (left, right, duration / 1000) if duration else (left, right)
+        elif kind == LIGHTS :
+            robot.phares = (data[pos], data[pos + 1])
+        elif kind == PIXEL :
+            if self.__display is not None :
+                color = (data[pos + 1], data[pos + 2], data[pos + 3])
+                if data[pos] == 0xFF :
+                    self.__display.fill(color)
+                elif data[pos] < len(self.__display) :
+                    self.__display[data[pos]] = color
+        elif kind == PIXEL_WRITE :
+            if self.__display is not None :
+                self.__display.write()
+        elif kind == STOP :
+            robot.stop()
+        elif kind == RATE :
+            self.rate = struct.unpack_from("<H", data, pos)[0]
+        elif kind == BYE :
+            self.__disconnect(client)
+
+    rate = property(__get_rate, __set_rate)
@@ -10,6 +10,17 @@
 # 	tmp1075.get_temperature()
 # See datasheet: http://www.ti.com/lit/ds/symlink/tmp1075.pdf
 
+from micropython import const
+from tools       import ticks_ms, ticks_diff, sleep_ms
+
+# Modes de conversion :
+#  -  "continuous" : le capteur convertit en permanence (toutes les 27.5 à 220 ms)
+#  -  "oneshot"    : capteur arrêté (SD), une conversion (~27 ms) par déclenchement (OS)
+#
+# Cache :
+#  -  max_age_ms : temp renvoie la dernière valeur lue si elle a moins de max_age_ms
+#  -  start(scheduler) : lecture périodique en arrière-plan, temp ne lit plus le bus
+#                        (en one-shot : déclenchement puis lecture au passage suivant)
 class Tmp1075:
     REG_TEMP  = const(0x00)
     REG_CFGR  = const(0x01)
@@ -17,13 +28,27 @@ class Tmp1075:
     REG_HLIM  = const(0x03)
     REG_DIEID = const(0x0F)
     
-    BIT_VALUE = 0.0625
+    BIT_VALUE     = 0.0625
+    CONVERSION_MS = 28
+    
+    # Octet de poids fort de CFGR
+    __OS = const(0x80)      # One-shot : lance une conversion (mode arrêt)
+    __SD = const(0x01)      # Shutdown : pas de conversion continue
         
-    def __init__(self, i2c=None, addr=0x48):
+    def __init__(self, i2c=None, addr=0x48, mode="continuous", max_age_ms=0):
         if not i2c:
             raise ValueError('I2C object needed')
+        if mode not in ("continuous", "oneshot") :
+            raise ValueError("mode must be 'continuous' or 'oneshot'")
         self.__i2c = i2c
         self.__addr = addr
+        self.mode       = mode
+        self.max_age    = max_age_ms
+        self.value      = None      # Dernière température lue (degC)
+        self.ticks      = None      # Instant de la lecture (ticks_ms)
+        self.job        = None
+        self.__data      = bytearray(2)
+        self.__triggered = False
         
         # https://forum.micropython.org/viewtopic.php?t=5675
         # Configuration du capteur
@@ -32,7 +57,12 @@ class Tmp1075:
         self.__config_new = self.__config[0]
         self.__config_new &= ~0x60  # clear bits 5,6
         self.__config_new |= (self.__resolution - 9) << 5  # set bits 5,6
+        if mode == "oneshot" :
+            self.__config_new |= Tmp1075.__SD
+        else :
+            self.__config_new &= ~Tmp1075.__SD
         self.__i2c.writeto_mem(self.__addr, Tmp1075.REG_CFGR, bytes([self.__config_new]))
+        self.__trigger_cmd = bytes([self.__config_new | Tmp1075.__OS])
         # self.__check_device()
 
     def __check_device(self):
@@ -42,18 +72,65 @@ class Tmp1075:
         # Throw exception if DIE ID isn't 0x7500
         # Could also check to ensure self._addr is a valid address.
 
-    def __get_temperature(self):
+    # Lancement d'une conversion (mode one-shot), résultat disponible après CONVERSION_MS
+    def trigger(self):
+        self.__i2c.writeto_mem(self.__addr, Tmp1075.REG_CFGR, self.__trigger_cmd)
+        self.__triggered = True
+    
+    # Lecture du registre de température et mise en cache
+    def __read_register(self):
+        data = self.__data
+        self.__i2c.readfrom_mem_into(self.__addr, Tmp1075.REG_TEMP, data)
+        t = ((data[0] << 4) + (data[1] >> 4))              # ignore the 4 least significant bits of the 2nd byte
+        t = Tmp1075.twos_comp(t, self.__resolution)        # Valeur signée (températures négatives)
+        self.value = t * Tmp1075.BIT_VALUE
+        self.ticks = ticks_ms()
+        return self.value
+    
+    # Lecture immédiate (en one-shot : déclenchement et attente de la conversion,
+    # sauf convert=False : lecture de la conversion lancée par trigger)
+    def read(self, convert=True):
         try :
-            t = self.__i2c.readfrom_mem(self.__addr, Tmp1075.REG_TEMP, 2)
-            t = ((t[0] << 4) + (t[1] >> 4))              # ignore the 4 least significant bits of the 2nd byte
-            t2 = Tmp1075.twos_comp(t, self.__resolution) # Validation de la valeur reçue
-            return t * Tmp1075.BIT_VALUE
-        except :
+            if self.mode == "oneshot" and convert :
+                self.trigger()
+                sleep_ms(Tmp1075.CONVERSION_MS)
+            self.__triggered = False
+            return self.__read_register()
+        except OSError :
             return None
+    
+    # Rafraîchissement non bloquant (tâche du Scheduler, période >= CONVERSION_MS)
+    def refresh(self):
+        if self.mode == "oneshot" :
+            if self.__triggered :
+                self.__read_register()
+            self.trigger()
+        else :
+            self.__read_register()
+    
+    def start(self, scheduler, period_ms=250):
+        if self.job is None :
+            self.job = scheduler.add(self.refresh, max(period_ms, Tmp1075.CONVERSION_MS), "tmp1075")
+        return self.job
+    
+    def stop(self, scheduler):
+        if self.job is not None :
+            scheduler.remove(self.job)
+            self.job = None
+    
+    @property
+    def age_ms(self):
+        if self.ticks is None :
+            return None
+        return ticks_diff(ticks_ms(), self.ticks)
+    
+    def __get_temperature(self):
+        # Valeur rafraîchie en arrière-plan, ou encore assez récente
+        if self.value is not None :
+            if self.job is not None or ticks_diff(ticks_ms(), self.ticks) < self.max_age :
+                return self.value
+        return self.read()
         # return temperature in degrees Celcius, each bit represents 0.0625 degrees Celsius.
-        # TODO
-        # - Allow a conversion function?
-        # - Works for negative numbers?
     
     def twos_comp(val, width):
         if val >= 2 ** width:
@@ -1,74 +1,644 @@
-from math import sqrt
-from time import sleep
+from math  import sqrt
+from time  import sleep
+from array import array
 import _thread
 
+try :
+    from time import ticks_ms, ticks_us, ticks_diff, ticks_add, sleep_ms, sleep_us
+except ImportError :
+    # CPython (simulateur hote) : compteurs sans debordement
+    from time import monotonic_ns
 
-# Classe Thread
-class Thread():
-    def __init__(self, update, dt=0.1):
-        self.dt       = dt
-        self.__state  = False
-        self.__update = update
+    def ticks_ms():
+        return monotonic_ns() // 1000000
+
+    def ticks_us():
+        return monotonic_ns() // 1000
+
+    def ticks_diff(a, b):
+        return a - b
+
+    def ticks_add(a, b):
+        return a + b
+
+    def sleep_ms(ms):
+        sleep(ms / 1000)
+
+    def sleep_us(us):
+        sleep(us / 1000000)
+
+
+# Classe Job
+#  -  Tâche périodique d'un Scheduler
+#  -  runs / overruns / errors : nombre d'exécutions, d'échéances manquées, d'erreurs
+#  -  jitter_max / jitter_sum  : retard au démarrage par rapport à l'échéance (us)
+#  -  duration_max             : durée d'exécution maximale (us)
+#  -  last_error               : dernière erreur rencontrée (None si aucune)
+class Job():
+    def __init__(self, function, period_ms, name=None, backoff_ms=100, backoff_max_ms=5000):
+        self.function       = function
+        self.period         = int(period_ms * 1000)
+        self.name           = name
+        self.enabled        = True
+        self.backoff        = int(backoff_ms * 1000)
+        self.backoff_max    = int(backoff_max_ms * 1000)
+        self.deadline       = ticks_us()
+        self.failures       = 0     # Erreurs consécutives
+        self.last_error     = None
+        self.reset_stats()
     
-    def stop(self):
-        self.__state = False
-        sleep(self.dt)
+    def reset_stats(self):
+        self.runs         = 0
+        self.overruns     = 0
+        self.errors       = 0
+        self.jitter_max   = 0
+        self.jitter_sum   = 0
+        self.duration_max = 0
+    
+    @property
+    def jitter_avg(self):
+        return self.jitter_sum / self.runs if self.runs else 0
+    
+    def stats(self):
+        return {"name": self.name, "period_us": self.period, "runs": self.runs,
+                "overruns": self.overruns, "errors": self.errors,
+                "jitter_max_us": self.jitter_max, "jitter_avg_us": self.jitter_avg,
+                "duration_max_us": self.duration_max, "last_error": self.last_error}
+    
+    # Exécution de la tâche et calcul de l'échéance suivante (absolue)
+    def run(self, now):
+        late = ticks_diff(now, self.deadline)
+        self.jitter_sum += late
+        if late > self.jitter_max :
+            self.jitter_max = late
+        self.runs += 1
         
+        try :
+            self.function()
+            self.failures = 0
+        except Exception as error :
+            # Redémarrage après un délai croissant (backoff exponentiel)
+            self.errors    += 1
+            self.failures  += 1
+            self.last_error = error
+            delay = min(self.backoff << min(self.failures - 1, 16), self.backoff_max)
+            self.deadline = ticks_add(ticks_us(), delay)
+            return
+        
+        end      = ticks_us()
+        duration = ticks_diff(end, now)
+        if duration > self.duration_max :
+            self.duration_max = duration
+        
+        # Échéance suivante sans dérive ; si elle est déjà passée, on recale
+        self.deadline = ticks_add(self.deadline, self.period)
+        if ticks_diff(end, self.deadline) >= 0 :
+            self.overruns += 1
+            self.deadline  = ticks_add(end, self.period)
+
+
+# Classe Scheduler
+#  -  Exécute plusieurs tâches périodiques, à des fréquences différentes, sur un seul thread
+#  -  add      : ajoute une tâche (fonction sans argument, période en ms) et renvoie le Job
+#  -  remove   : retire une tâche
+#  -  run_once : exécute les tâches arrivées à échéance, renvoie l'attente avant la suivante (us)
+#  -  start / stop : lancement / arrêt du thread
+class Scheduler():
+    def __init__(self, idle_ms=20):
+        self.jobs     = []
+        self.idle     = idle_ms * 1000
+        self.__state  = False
+    
+    @property
+    def running(self):
+        return self.__state
+    
+    def add(self, function, period_ms, name=None, **kwargs):
+        job = Job(function, period_ms, name, **kwargs)
+        self.jobs.append(job)
+        return job
+    
+    def remove(self, job):
+        if job in self.jobs :
+            self.jobs.remove(job)
+    
+    def stats(self):
+        return [job.stats() for job in self.jobs]
+    
+    def run_once(self):
+        wait = self.idle
+        for job in self.jobs :
+            if not job.enabled :
+                continue
+            now  = ticks_us()
+            left = ticks_diff(job.deadline, now)
+            if left <= 0 :
+                job.run(now)
+                left = ticks_diff(job.deadline, ticks_us())
+            if left < wait :
+                wait = left
+        return wait
+    
     def start(self):
+        if self.__state :
+            return
         self.__state = True
         _thread.start_new_thread(self.__thread, ())
-
+    
+    def stop(self):
+        self.__state = False
+    
     # Ne pas mettre de prints dans le thread
     # Les prints y sont (très) mal gérés et font planter l'ESP32
     def __thread(self):
         while self.__state :
-            sleep(self.dt)
-            try :
-                self.__update()
-            except :
-                self.__state = False
-                break
+            wait = self.run_once()
+            if wait > 0 :
+                sleep_us(wait)
+
+
+# Classe Thread
+#  -  Compatibilité : une seule tâche de période dt (s) sur son propre Scheduler
+class Thread():
+    def __init__(self, update, dt=0.1):
+        self.dt          = dt
+        self.scheduler   = Scheduler()
+        self.job         = self.scheduler.add(update, dt * 1000)
+    
+    def stop(self):
+        self.scheduler.stop()
+        sleep(self.dt)
+        
+    def start(self):
+        self.scheduler.start()
+
+
+# Classe Stats
+#  -  Compteurs entiers préalloués (array('i')) : dans le chemin critique, une
+#     mise à jour est une simple incrémentation, sans allocation
+#         stats.values[INDEX] += 1
+#  -  names   : nom de chaque compteur (dans l'ordre des index)
+#  -  buckets : bornes supérieures (us) de l'histogramme de durée (+ une case au-delà)
+#  -  timing  : durée -> min / moyenne glissante (1/16) / max (3 index consécutifs)
+#               et histogramme
+#  -  error   : erreur comptée par type dans 4 index consécutifs (ERRORS)
+#  -  as_dict / pack : lecture (dictionnaire / octets int32 little-endian)
+#  -  Stats.unpack    : décodage de pack() (hôte)
+#  -  reset
+class Stats():
+    ERRORS = ("err_timeout", "err_nodev", "err_io", "err_other")
+    
+    def __init__(self, names, buckets=()):
+        self.names   = tuple(names)
+        self.buckets = tuple(buckets)
+        self.values  = array('i', [0] * (len(self.names) + len(self.buckets) + 1))
+    
+    def reset(self):
+        v = self.values
+        for i in range(len(v)) :
+            v[i] = 0
+    
+    def timing(self, index, value):
+        v = self.values
+        if v[index] == 0 or value < v[index] :
+            v[index] = value
+        avg = v[index + 1]
+        v[index + 1] = value if avg == 0 else avg + ((value - avg) >> 4)
+        if value > v[index + 2] :
+            v[index + 2] = value
+        if self.buckets :
+            h = len(self.names)
+            for edge in self.buckets :
+                if value <= edge :
+                    v[h] += 1
+                    return
+                h += 1
+            v[h] += 1
+    
+    def error(self, index, error):
+        code = error.args[0] if isinstance(error, OSError) and error.args else None
+        if code == 110 or code == 116 :
+            kind = 0
+        elif code == 19 :
+            kind = 1
+        elif code == 5 :
+            kind = 2
+        else :
+            kind = 3
+        self.values[index + kind] += 1
+    
+    def as_dict(self):
+        v = self.values
+        n = len(self.names)
+        result = {}
+        for i in range(n) :
+            result[self.names[i]] = v[i]
+        if self.buckets :
+            result["histogram"] = list(zip(self.buckets + (None,), v[n:]))
+        return result
+    
+    def pack(self):
+        import struct
+        return struct.pack("<%di" % len(self.values), *self.values)
+    
+    @staticmethod
+    def unpack(data, names, buckets=()):
+        import struct
+        stats = Stats(names, buckets)
+        for i, value in enumerate(struct.unpack("<%di" % len(stats.values), data)) :
+            stats.values[i] = value
+        return stats
 
 
 # Classe vecteur
+#  -  Composantes stockées en float32 (array('f')), sans liste intermédiaire
+#  -  buffer / offset : vue sur 3 flottants d'un tableau partagé (ex. échantillon MPU)
+#  -  Opérations sur place (renvoient self) : set, copy, add, sub, scale, cross,
+#     lerp, normalize ; dot et norme renvoient un flottant
 class Vecteur():
-    def __init__(self, coords=[0, 0, 0]):
-        self.coords = [0, 0, 0]
+    __slots__ = ("__buf", "__c")
+    
+    def __init__(self, coords=(0, 0, 0), buffer=None, offset=0):
+        if buffer is None :
+            buffer = array('f', coords)
+            offset = 0
+        self.__buf = buffer
+        self.__c   = memoryview(buffer)[offset:offset + 3]
+    
+    # Vue sur les composantes offset, offset+1, offset+2 d'un array('f')
+    @staticmethod
+    def view(buffer, offset=0):
+        return Vecteur(buffer=buffer, offset=offset)
+    
+    # coords : le vecteur lui-même (indexable, itérable, affichable)
+    def __get_coords(self):
+        return self
+    
+    def __set_coords(self, coords):
+        c = self.__c
+        c[0], c[1], c[2] = coords[0], coords[1], coords[2]
+    
+    def __len__(self):
+        return 3
+    
+    def __getitem__(self, i):
+        return self.__c[i]
+    
+    def __setitem__(self, i, v):
+        self.__c[i] = v
+    
+    def __iter__(self):
+        c = self.__c
+        yield c[0]
+        yield c[1]
+        yield c[2]
 
     @property
     def norme(self):
-        return sqrt(self.coords[0]**2 + self.coords[1]**2 + self.coords[2]**2)
+        c = self.__c
+        return sqrt(c[0]*c[0] + c[1]*c[1] + c[2]*c[2])
+    
+    def set(self, x, y, z):
+        c = self.__c
+        c[0], c[1], c[2] = x, y, z
+        return self
+    
+    def copy(self, other):
+        c, o = self.__c, other.__c
+        c[0], c[1], c[2] = o[0], o[1], o[2]
+        return self
+    
+    # self += k * other
+    def add(self, other, k=1):
+        c, o = self.__c, other.__c
+        c[0] += k * o[0]
+        c[1] += k * o[1]
+        c[2] += k * o[2]
+        return self
+    
+    def sub(self, other):
+        return self.add(other, -1)
+    
+    def scale(self, k):
+        c = self.__c
+        c[0] *= k
+        c[1] *= k
+        c[2] *= k
+        return self
+    
+    def dot(self, other):
+        c, o = self.__c, other.__c
+        return c[0]*o[0] + c[1]*o[1] + c[2]*o[2]
+    
+    # self = a x b (a ou b peut être self)
+    def cross(self, a, b):
+        a, b = a.__c, b.__c
+        x = a[1]*b[2] - a[2]*b[1]
+        y = a[2]*b[0] - a[0]*b[2]
+        z = a[0]*b[1] - a[1]*b[0]
+        c = self.__c
+        c[0], c[1], c[2] = x, y, z
+        return self
+    
+    # self = self + (other - self) * t
+    def lerp(self, other, t):
+        c, o = self.__c, other.__c
+        c[0] += (o[0] - c[0]) * t
+        c[1] += (o[1] - c[1]) * t
+        c[2] += (o[2] - c[2]) * t
+        return self
+    
+    def normalize(self):
+        n = self.norme
+        if n > 0 :
+            self.scale(1 / n)
+        return self
     
     def __rx(self):
-        return self.coords[0]
+        return self.__c[0]
 
     def __ry(self):
-        return self.coords[1]
+        return self.__c[1]
     
     def __rz(self):
-        return self.coords[2]
+        return self.__c[2]
         
     def __wx(self, v):
-        self.coords[0] = v
+        self.__c[0] = v
 
     def __wy(self, v):
-        self.coords[1] = v
+        self.__c[1] = v
     
     def __wz(self, v):
-        self.coords[2] = v
+        self.__c[2] = v
     
     def __str__(self):
-        return self.coords
+        c = self.__c
+        return "(%+.3f, %+.3f, %+.3f)" % (c[0], c[1], c[2])
+    
+    __repr__ = __str__
     
+    coords = property(__get_coords, __set_coords)
     x = property(__rx, __wx)
     y = property(__ry, __wy)
     z = property(__rz, __wz)
 
 
 # Classe I2C_manage
-# class I2C_manage():
-#     def __init__(self, i2c):
-#         pass
+#  -  Arbitre d'un bus I2C partagé entre threads (Maqueen, MPU, TMP1075, ...)
+#  -  Même interface que machine.I2C : les pilotes l'utilisent sans modification
+#  -  Priorités : URGENT (écritures, ex. moteurs) passe avant NORMAL (lectures) ;
+#                 priorities[adresse] impose une priorité à un périphérique
+#  -  batch     : contexte réutilisable gardant le bus pour plusieurs transactions
+#                 (with bus.batch() : ...), sans réarbitrage entre elles
+#  -  Erreurs   : ETIMEDOUT / EIO -> libération du bus (9 impulsions SCL + STOP),
+#                 recréation de l'I2C (factory) puis nouvel essai (retries fois)
+#                 ENODEV (périphérique absent) : erreur transmise sans nouvel essai
+#  -  probe     : présence d'un périphérique (scan mémorisé)
+#  -  stats     : compteurs par adresse (tools.Stats, noms dans I2C_manage.STATS) :
+#                 transactions, octets, nouveaux essais, erreurs par type,
+#                 durée min / moyenne / max des transactions et attente max du bus (us)
+#                 stats() : dictionnaire {adresse: {...}}, device_stats(adresse) : Stats
+class I2C_manage():
+    URGENT = 0
+    NORMAL = 1
+    
+    STATS = ("transactions", "bytes", "retries") + Stats.ERRORS + \
+            ("busy_min_us", "busy_avg_us", "busy_max_us", "wait_max_us")
+    __TRANSACTIONS = 0
+    __BYTES        = 1
+    __RETRIES      = 2
+    __ERRORS       = 3
+    __BUSY         = 7
+    __WAIT_MAX     = 10
+    
+    __RECOVER = (5, 110, 116)       # EIO, ETIMEDOUT (errno lwIP / ESP32)
+    
+    # i2c     : machine.I2C, ou None si factory est fourni
+    # factory : fonction sans argument créant l'I2C (utilisée aussi après un blocage)
+    # scl/sda : numéros des broches pour la libération du bus (factory requis :
+    #           les broches repassent en GPIO, l'I2C doit être recréé ensuite)
+    def __init__(self, i2c=None, factory=None, scl=None, sda=None, retries=1):
+        if (scl is not None or sda is not None) and factory is None :
+            raise ValueError("scl / sda need factory")
+        self.__i2c       = i2c if i2c is not None else factory()
+        self.__factory   = factory
+        self.__scl       = scl
+        self.__sda       = sda
+        self.retries     = retries
+        self.recoveries  = 0
+        self.priorities  = {}
+        self.__lock      = _thread.allocate_lock()
+        self.__meta      = _thread.allocate_lock()
+        self.__owner     = None
+        self.__depth     = 0
+        self.__urgent    = 0
+        self.__stats     = {}
+        self.__found     = None
+        self.__batches   = (_I2C_batch(self, I2C_manage.URGENT), _I2C_batch(self, I2C_manage.NORMAL))
+    
+    @property
+    def i2c(self):
+        return self.__i2c
+    
+    # Verrou réentrant (même thread) ; NORMAL cède la place aux demandes URGENT en attente
+    def acquire(self, priority=NORMAL):
+        me = _thread.get_ident()
+        if self.__owner == me :
+            self.__depth += 1
+            return
+        if priority == I2C_manage.URGENT :
+            with self.__meta :
+                self.__urgent += 1
+            self.__lock.acquire()
+            with self.__meta :
+                self.__urgent -= 1
+        else :
+            while True :
+                self.__lock.acquire()
+                if not self.__urgent :
+                    break
+                self.__lock.release()
+                sleep_us(100)
+        self.__owner = me
+    
+    def release(self):
+        if self.__depth :
+            self.__depth -= 1
+            return
+        self.__owner = None
+        self.__lock.release()
+    
+    def batch(self, priority=NORMAL):
+        return self.__batches[priority]
+    
+    # Compteurs d'un périphérique (créés au premier accès)
+    def device_stats(self, addr):
+        stats = self.__stats.get(addr)
+        if stats is None :
+            stats = self.__stats[addr] = Stats(I2C_manage.STATS)
+        return stats
+    
+    def stats(self):
+        result = {}
+        for addr, stats in self.__stats.items() :
+            result[addr] = stats.as_dict()
+        return result
+    
+    def reset_stats(self):
+        for stats in self.__stats.values() :
+            stats.reset()
+    
+    def __begin(self, addr, priority):
+        request = ticks_us()
+        self.acquire(self.priorities.get(addr, priority))
+        start = ticks_us()
+        v     = self.device_stats(addr).values
+        wait  = ticks_diff(start, request)
+        if wait > v[I2C_manage.__WAIT_MAX] :
+            v[I2C_manage.__WAIT_MAX] = wait
+        return start
+    
+    def __end(self, addr, nbytes, start):
+        stats = self.device_stats(addr)
+        v     = stats.values
+        v[I2C_manage.__TRANSACTIONS] += 1
+        v[I2C_manage.__BYTES]        += nbytes
+        stats.timing(I2C_manage.__BUSY, ticks_diff(ticks_us(), start))
+    
+    # Erreur : libération du bus et nouvel essai si possible, sinon l'erreur est relancée
+    def __failed(self, addr, error, attempt):
+        stats = self.device_stats(addr)
+        stats.error(I2C_manage.__ERRORS, error)
+        code = error.args[0] if error.args else None
+        if attempt >= self.retries or code not in I2C_manage.__RECOVER :
+            raise error
+        stats.values[I2C_manage.__RETRIES] += 1
+        self.recover()
+        return attempt + 1
+    
+    # Libération d'un esclave bloqué au milieu d'un octet (SDA maintenu à 0)
+    def recover(self):
+        self.recoveries += 1
+        if self.__scl is not None and self.__sda is not None :
+            from machine import Pin
+            scl = Pin(self.__scl, Pin.OPEN_DRAIN, value=1)
+            sda = Pin(self.__sda, Pin.OPEN_DRAIN, value=1)
+            for _ in range(9) :
+                scl.value(0)
+                sleep_us(5)
+                scl.value(1)
+                sleep_us(5)
+            sda.value(0)                # Condition STOP
+            sleep_us(5)
+            sda.value(1)
+        if self.__factory is not None :
+            self.__i2c = self.__factory()
+    
+    def scan(self):
+        self.acquire(I2C_manage.NORMAL)
+        try :
+            self.__found = self.__i2c.scan()
+        finally :
+            self.release()
+        return list(self.__found)
+    
+    def probe(self, addr):
+        if self.__found is None :
+            self.scan()
+        return addr in self.__found
+    
+    def writeto(self, addr, buf, stop=True):
+        attempt = 0
+        while True :
+            start = self.__begin(addr, I2C_manage.URGENT)
+            try :
+                result = self.__i2c.writeto(addr, buf, stop)
+                self.__end(addr, len(buf), start)
+                return result
+            except OSError as error :
+                attempt = self.__failed(addr, error, attempt)
+            finally :
+                self.release()
+    
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        attempt = 0
+        while True :
+            start = self.__begin(addr, I2C_manage.URGENT)
+            try :
+                self.__i2c.writeto_mem(addr, memaddr, buf, addrsize=addrsize)
+                self.__end(addr, len(buf) + 1, start)
+                return
+            except OSError as error :
+                attempt = self.__failed(addr, error, attempt)
+            finally :
+                self.release()
+    
+    def readfrom(self, addr, nbytes, stop=True):
+        attempt = 0
+        while True :
+            start = self.__begin(addr, I2C_manage.NORMAL)
+            try :
+                data = self.__i2c.readfrom(addr, nbytes, stop)
+                self.__end(addr, nbytes, start)
+                return data
+            except OSError as error :
+                attempt = self.__failed(addr, error, attempt)
+            finally :
+                self.release()
+    
+    def readfrom_into(self, addr, buf, stop=True):
+        attempt = 0
+        while True :
+            start = self.__begin(addr, I2C_manage.NORMAL)
+            try :
+                self.__i2c.readfrom_into(addr, buf, stop)
+                self.__end(addr, len(buf), start)
+                return
+            except OSError as error :
+                attempt = self.__failed(addr, error, attempt)
+            finally :
+                self.release()
+    
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        attempt = 0
+        while True :
+            start = self.__begin(addr, I2C_manage.NORMAL)
+            try :
+                data = self.__i2c.readfrom_mem(addr, memaddr, nbytes, addrsize=addrsize)
+                self.__end(addr, nbytes + 1, start)
+                return data
+            except OSError as error :
+                attempt = self.__failed(addr, error, attempt)
+            finally :
+                self.release()
+    
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        attempt = 0
+        while True :
+            start = self.__begin(addr, I2C_manage.NORMAL)
+            try :
+                self.__i2c.readfrom_mem_into(addr, memaddr, buf, addrsize=addrsize)
+                self.__end(addr, len(buf) + 1, start)
+                return
+            except OSError as error :
+                attempt = self.__failed(addr, error, attempt)
+            finally :
+                self.release()
+
+
+# Contexte de I2C_manage.batch (préalloué, un par priorité)
+class _I2C_batch():
+    def __init__(self, manager, priority):
+        self.__manager  = manager
+        self.__priority = priority
+    
+    def __enter__(self):
+        self.__manager.acquire(self.__priority)
+        return self.__manager
+    
+    def __exit__(self, *args):
+        self.__manager.release()
 
 
 # Exemples
@@ -79,4 +649,9 @@ if __name__ == "__main__":
    print(vecteur.norme)
    vecteur.x = 4
    print(vecteur)
+   
+   # Vues sur un tableau partagé, calcul sur place
+   sample = array('f', [1, 0, 0, 0, 1, 0])
+   a, b   = Vecteur.view(sample, 0), Vecteur.view(sample, 3)
+   print(Vecteur().cross(a, b), a.dot(b), a.lerp(b, 0.5), sample)
    
\ No newline at end of file
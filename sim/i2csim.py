@@ -0,0 +1,429 @@
+# Simulateur de bus I2C (CPython)
+#
+# Emule, sur un PC Linux, les peripheriques I2C de la carte Mbits et du
+# Maqueen Plus afin de pouvoir executer les librairies de lib/ sans robot :
+#  -  MaqueenPlusSim : carte moteurs Maqueen Plus (0x10)
+#                      0x00 moteurs / 0x04 encodeurs / 0x08 compensations
+#                      0x0A pid / 0x0B phares / 0x1D capteurs sol
+#  -  MPU6050Sim     : accelerometre / gyroscope (0x68 ou 0x69)
+#  -  Tmp1075Sim     : capteur de temperature (0x48)
+#
+# Le bus applique un modele de latence : chaque transaction coute
+# (bits transmis / frequence) + un surcout fixe par transaction (pilote).
+#
+# Utilisation :
+#   PYTHONPATH=sim:lib python mon_script.py
+#
+#   import i2csim
+#   bus = i2csim.bus(1)           # bus utilise par machine.I2C(1, ...)
+#   bus.devices[0x10].line_analog = [100, 100, 2000, 100, 100, 100]
+
+from time import monotonic, sleep
+from math import sin, cos, pi
+import struct
+import threading
+
+
+ENODEV    = 19
+ETIMEDOUT = 116
+
+
+# Classe Device
+#  -  Peripherique generique a registres de 8 bits avec auto-incrementation
+#  -  write      : ecriture [registre, donnees...]
+#  -  read       : lecture a partir du pointeur courant
+#  -  on_write   : appele pour chaque octet ecrit (a surcharger)
+#  -  on_read    : appele avant chaque lecture (a surcharger)
+class Device():
+    def __init__(self, addr, size=0x80):
+        self.addr = addr
+        self.regs = bytearray(size)
+        self.ptr  = 0
+
+    def on_write(self, reg, value):
+        self.regs[reg] = value
+
+    def on_read(self, reg, n):
+        pass
+
+    def write(self, data):
+        if len(data) == 0 :
+            return
+        self.ptr = data[0]
+        for value in data[1:] :
+            self.on_write(self.ptr % len(self.regs), value)
+            self.ptr += 1
+
+    def read(self, n):
+        self.on_read(self.ptr, n)
+        size = len(self.regs)
+        data = bytes(self.regs[(self.ptr + i) % size] for i in range(n))
+        self.ptr += n
+        return data
+
+
+# Classe MaqueenPlusSim
+#  -  Les encodeurs avancent proportionnellement a la puissance moteur
+#     (ticks_per_pwm ticks/s par unite de PWM)
+#  -  line_analog : valeurs analogiques des 6 capteurs sol
+#  -  line_threshold : seuil de detection de la ligne (valeur analogique)
+#  -  max_read : taille maximale d'une lecture (firmware), None = illimite
+class MaqueenPlusSim(Device):
+    def __init__(self, addr=0x10, max_read=None, ticks_per_pwm=1.0):
+        Device.__init__(self, addr, 0x40)
+        self.max_read       = max_read
+        self.ticks_per_pwm  = ticks_per_pwm
+        self.line_analog    = [100] * 6
+        self.line_threshold = 1000
+        self.writes         = []          # Historique des commandes recues
+        self.write_times    = []          # Instant de reception (monotonic) de chaque commande
+        self.__t            = monotonic()
+        self.__enc          = [0.0, 0.0]
+
+    @property
+    def motors(self):
+        r = self.regs
+        return (-r[1] if r[0] == 2 else r[1], -r[3] if r[2] == 2 else r[3])
+
+    @property
+    def phares(self):
+        return (self.regs[0x0B], self.regs[0x0C])
+
+    def write(self, data):
+        if len(data) > 1 :
+            self.writes.append(bytes(data))
+            self.write_times.append(monotonic())
+        self.__advance()
+        Device.write(self, data)
+
+    def on_write(self, reg, value):
+        if 0x04 <= reg <= 0x07 :
+            self.__enc[(reg - 0x04) // 2] = 0.0
+        self.regs[reg] = value
+
+    def on_read(self, reg, n):
+        if self.max_read is not None and n > self.max_read :
+            raise OSError(ETIMEDOUT)
+        self.__advance()
+
+        # Capteurs sol
+        state = 0
+        for i in range(6) :
+            value = max(0, min(int(self.line_analog[i]), 0xFFFF))
+            if value >= self.line_threshold :
+                state |= 1 << i
+            struct.pack_into(">H", self.regs, 0x1E + 2*i, value)
+        self.regs[0x1D] = state
+
+    # Integration des encodeurs (compteurs 16 bits sans signe)
+    def __advance(self):
+        now = monotonic()
+        dt, self.__t = now - self.__t, now
+        for i, speed in enumerate((self.regs[1], self.regs[3])) :
+            self.__enc[i] += speed * self.ticks_per_pwm * dt
+            struct.pack_into(">H", self.regs, 0x04 + 2*i, int(self.__enc[i]) & 0xFFFF)
+
+
+# Classe Trajectory
+#  -  Trajectoire synthetique pour le MPU simule (angles d'Euler ZYX, degres)
+#       roulis(t)  = roll_amp  * sin(2 pi roll_freq t)
+#       tangage(t) = pitch_amp * sin(2 pi pitch_freq t)
+#       cap(t)     = yaw_rate * t
+#  -  angles(t) : orientation vraie (roll, pitch, yaw)
+#  -  imu(t)    : mesures ideales (accel en g, gyro en deg/s, repere capteur)
+class Trajectory():
+    def __init__(self, roll_amp=30, roll_freq=0.2, pitch_amp=20, pitch_freq=0.13, yaw_rate=45):
+        self.roll_amp   = roll_amp
+        self.roll_freq  = roll_freq
+        self.pitch_amp  = pitch_amp
+        self.pitch_freq = pitch_freq
+        self.yaw_rate   = yaw_rate
+        self.t0         = monotonic()
+
+    def elapsed(self):
+        return monotonic() - self.t0
+
+    def angles(self, t):
+        roll  = self.roll_amp  * sin(2 * pi * self.roll_freq  * t)
+        pitch = self.pitch_amp * sin(2 * pi * self.pitch_freq * t)
+        yaw   = (self.yaw_rate * t + 180) % 360 - 180
+        return roll, pitch, yaw
+
+    def imu(self, t):
+        rad   = pi / 180
+        roll, pitch, _ = self.angles(t)
+        wr    = 2 * pi * self.roll_freq
+        wp    = 2 * pi * self.pitch_freq
+        droll  = self.roll_amp  * wr * cos(wr * t)
+        dpitch = self.pitch_amp * wp * cos(wp * t)
+        dyaw   = self.yaw_rate
+        phi, theta = roll * rad, pitch * rad
+
+        # Vitesses angulaires dans le repere capteur (derivees des angles d'Euler)
+        p = droll - dyaw * sin(theta)
+        q = dpitch * cos(phi) + dyaw * cos(theta) * sin(phi)
+        r = -dpitch * sin(phi) + dyaw * cos(theta) * cos(phi)
+
+        # Gravite vue par le capteur
+        accel = [-sin(theta), sin(phi) * cos(theta), cos(phi) * cos(theta)]
+        return accel, [p, q, r]
+
+
+# Classe MPU6050Sim
+#  -  accel : acceleration (g), gyro : vitesse angulaire (deg/s), temp : degC
+#  -  gyro_bias : biais ajoute a la mesure du gyroscope (deg/s)
+#  -  FIFO (1024 octets) alimentee a la frequence d'echantillonnage
+#     (8 kHz ou 1 kHz selon le filtre / (1 + SMPLRT_DIV)), debordement
+#     signale par INT_STATUS (FIFO_OFLOW), les plus anciens octets sont perdus
+#  -  int_pin : identifiant de la broche reliee a INT ; si DATA_RDY est active
+#     (INT_ENABLE), une impulsion y est generee a chaque echantillon
+#  -  trajectory : Trajectory optionnelle, remplace accel / gyro a chaque mesure
+class MPU6050Sim(Device):
+    __ACCEL_LSB = (16384, 8192, 4096, 2048)
+    __GYRO_LSB  = (131.0, 65.5, 32.8, 16.4)
+    FIFO_SIZE   = 1024
+
+    def __init__(self, addr=0x68):
+        Device.__init__(self, addr, 0x80)
+        self.regs[0x6B] = 0x40      # PWR_MGMT_1 : SLEEP au demarrage
+        self.regs[0x75] = 0x68      # WHO_AM_I
+        self.accel      = [0.0, 0.0, 1.0]
+        self.gyro       = [0.0, 0.0, 0.0]
+        self.gyro_bias  = [0.0, 0.0, 0.0]
+        self.temp       = 25.0
+        self.fifo       = bytearray()
+        self.__fifo_t   = monotonic()
+        self.__fifo_acc = 0.0
+        self.int_pin    = None
+        self.trajectory = None
+        self.interrupts = 0
+        self.__irq      = None
+
+    @property
+    def sample_rate(self):
+        base = 8000 if (self.regs[0x1A] & 0x07) in (0, 7) else 1000
+        return base / (1 + self.regs[0x19])
+
+    def on_write(self, reg, value):
+        if reg == 0x6A and value & 0x04 :
+            # FIFO_RESET
+            self.fifo = bytearray()
+            value &= ~0x04
+        if reg == 0x6A and value & 0x40 and not self.regs[0x6A] & 0x40 :
+            self.__fifo_t, self.__fifo_acc = monotonic(), 0.0
+        self.regs[reg] = value
+        if reg == 0x38 and value & 0x01 and self.__irq is None :
+            self.__irq = threading.Thread(target=self.__data_ready, daemon=True)
+            self.__irq.start()
+
+    # Impulsions DATA_RDY sur int_pin a la frequence d'echantillonnage
+    def __data_ready(self):
+        import machine
+        deadline = monotonic()
+        while self.regs[0x38] & 0x01 :
+            deadline += 1 / self.sample_rate
+            delay = deadline - monotonic()
+            if delay > 0 :
+                sleep(delay)
+            self.regs[0x3A] |= 0x01
+            pin = machine.Pin.get(self.int_pin)
+            if pin is not None :
+                self.interrupts += 1
+                pin.value(1)
+                pin.value(0)
+        self.__irq = None
+
+    def on_read(self, reg, n):
+        if reg <= 0x48 and reg + n > 0x3B :
+            self.sample()
+        if reg in (0x3A, 0x72, 0x73, 0x74) :
+            self.fill_fifo()
+        if reg == 0x72 or reg == 0x73 :
+            self.regs[0x72] = len(self.fifo) >> 8
+            self.regs[0x73] = len(self.fifo) & 0xFF
+
+    def read(self, n):
+        if self.ptr == 0x74 :
+            # FIFO_R_W : pas d'auto-incrementation, lecture des octets empiles
+            self.on_read(self.ptr, n)
+            data = bytes(self.fifo[:n]) + bytes(max(0, n - len(self.fifo)))
+            del self.fifo[:n]
+            return data
+        data = Device.read(self, n)
+        if 0x3A in range(self.ptr - n, self.ptr) :
+            self.regs[0x3A] &= ~0x10    # Lecture de INT_STATUS : acquittement
+        return data
+
+    # Mise a jour des registres de mesure (0x3B - 0x48)
+    def sample(self):
+        if self.trajectory is not None :
+            self.accel, self.gyro = self.trajectory.imu(self.trajectory.elapsed())
+        a_lsb = MPU6050Sim.__ACCEL_LSB[(self.regs[0x1C] >> 3) & 0x03]
+        g_lsb = MPU6050Sim.__GYRO_LSB[(self.regs[0x1B] >> 3) & 0x03]
+        values = [self.accel[i] * a_lsb for i in range(3)]
+        values.append((self.temp - 36.53) * 340)
+        values += [(self.gyro[i] + self.gyro_bias[i]) * g_lsb for i in range(3)]
+        for i, v in enumerate(values) :
+            struct.pack_into(">h", self.regs, 0x3B + 2*i, max(-32768, min(int(round(v)), 32767)))
+
+    # Trame FIFO selon FIFO_EN : accel (6), temp (2), gyro x, y, z (2 chacun)
+    def frame(self):
+        self.sample()
+        mask, r, data = self.regs[0x23], self.regs, bytearray()
+        if mask & 0x08 :
+            data += r[0x3B:0x41]
+        if mask & 0x80 :
+            data += r[0x41:0x43]
+        for i, bit in enumerate((0x40, 0x20, 0x10)) :
+            if mask & bit :
+                data += r[0x43 + 2*i:0x45 + 2*i]
+        return data
+
+    # Empile les echantillons produits depuis le dernier appel
+    def fill_fifo(self):
+        now = monotonic()
+        dt, self.__fifo_t = now - self.__fifo_t, now
+        if not self.regs[0x6A] & 0x40 or not self.regs[0x23] :
+            return
+        self.__fifo_acc += dt * self.sample_rate
+        count = int(self.__fifo_acc)
+        self.__fifo_acc -= count
+        frame = self.frame()
+        count = min(count, MPU6050Sim.FIFO_SIZE // max(1, len(frame)) + 1)
+        for _ in range(count) :
+            self.fifo += frame
+        if len(self.fifo) > MPU6050Sim.FIFO_SIZE :
+            del self.fifo[:len(self.fifo) - MPU6050Sim.FIFO_SIZE]
+            self.regs[0x3A] |= 0x10
+
+
+# Classe Tmp1075Sim
+#  -  Registres de 16 bits (TEMP, CFGR, LLIM, HLIM, DIEID)
+#  -  temp : temperature simulee (degC)
+#  -  conversions : nombre de conversions (continu : a chaque lecture, arret : OS)
+class Tmp1075Sim(Device):
+    def __init__(self, addr=0x48):
+        Device.__init__(self, addr, 0x10)
+        self.temp        = 25.0
+        self.words       = {0x00: 0, 0x01: 0x00FF, 0x02: 0x4B00, 0x03: 0x5000, 0x0F: 0x7500}
+        self.conversions = 0
+        self.__byte = 0
+
+    def __convert(self):
+        self.words[0x00] = (int(round(self.temp / 0.0625)) << 4) & 0xFFFF
+        self.conversions += 1
+
+    def write(self, data):
+        if len(data) == 0 :
+            return
+        self.ptr, self.__byte = data[0], 0
+        if len(data) >= 2 and self.ptr in self.words :
+            word = self.words[self.ptr]
+            word = (data[1] << 8) | (data[2] if len(data) >= 3 else word & 0xFF)
+            # Configuration : OS (bit 15) en mode arret (SD, bit 8) -> une conversion
+            if self.ptr == 0x01 and word & 0x8000 :
+                if word & 0x0100 :
+                    self.__convert()
+                word &= ~0x8000
+            self.words[self.ptr] = word
+
+    def read(self, n):
+        # Mode continu : registre de temperature a jour ; mode arret : derniere conversion
+        if self.ptr == 0x00 and not self.words[0x01] & 0x0100 :
+            self.__convert()
+        word = self.words.get(self.ptr, 0)
+        data = bytes(((word >> 8) & 0xFF, word & 0xFF))
+        return bytes(data[i % 2] for i in range(n))
+
+
+# Classe Bus
+#  -  Modele de latence : cout d'une transaction =
+#        (1 start + 9 bits par octet (adresse comprise) + 1 stop) / freq
+#        + overhead_us (surcout logiciel du pilote par transaction)
+#  -  realtime : attend reellement la duree de la transaction
+#  -  Compteurs : transactions, octets, temps de bus cumule, collisions
+class Bus():
+    def __init__(self, freq=100000, overhead_us=50, realtime=True):
+        self.freq        = freq
+        self.overhead_us = overhead_us
+        self.realtime    = realtime
+        self.devices     = {}
+        self.__lock      = threading.Lock()
+        self.__busy      = False
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.transactions = 0
+        self.bytes        = 0
+        self.busy_us      = 0.0
+        self.collisions   = 0
+        self.errors       = 0
+
+    def attach(self, device):
+        self.devices[device.addr] = device
+        return device
+
+    def detach(self, addr):
+        self.devices.pop(addr, None)
+
+    def cost_us(self, nbytes, restart=False):
+        bits = 2 + 9 * (nbytes + 1) + (10 if restart else 0)
+        return bits * 1e6 / self.freq + self.overhead_us
+
+    # Execute une transaction en appliquant le modele de latence
+    def transaction(self, addr, nbytes, action, restart=False):
+        with self.__lock :
+            if self.__busy :
+                # Deux threads sur le bus en meme temps : trame corrompue
+                self.collisions += 1
+                self.errors     += 1
+                raise OSError(ETIMEDOUT)
+            self.__busy = True
+        try :
+            cost = self.cost_us(nbytes, restart)
+            self.transactions += 1
+            self.bytes        += nbytes + 1 + restart
+            self.busy_us      += cost
+            if self.realtime :
+                sleep(cost * 1e-6)
+            device = self.devices.get(addr)
+            if device is None :
+                self.errors += 1
+                raise OSError(ENODEV)
+            return action(device)
+        finally :
+            self.__busy = False
+
+
+__buses = {}
+
+
+# Renvoie (et cree si besoin) le bus simule d'identifiant id
+#  -  Le bus par defaut contient un Maqueen Plus, un MPU6050 (0x69) et un TMP1075
+def bus(id=1, freq=None):
+    if id not in __buses :
+        b = Bus(freq or 100000)
+        b.attach(MaqueenPlusSim())
+        b.attach(MPU6050Sim(0x69))
+        b.attach(Tmp1075Sim())
+        __buses[id] = b
+    elif freq :
+        __buses[id].freq = freq
+    return __buses[id]
+
+
+# Remplace le bus d'identifiant id (None : bus par defaut a la prochaine creation)
+def reset(id=1, new_bus=None):
+    if new_bus is None :
+        __buses.pop(id, None)
+    else :
+        __buses[id] = new_bus
+    return new_bus
+
+
+# Exemples
+if __name__ == "__main__":
+    for f in (100000, 400000) :
+        b = Bus(f, realtime=False)
+        print("%d kHz : lecture 22 octets %.0f us, ecriture 5 octets %.0f us"
+              % (f // 1000, b.cost_us(22), b.cost_us(5)))
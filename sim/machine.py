@@ -0,0 +1,181 @@
+# Simulateur hote (CPython) du module machine de MicroPython
+#  -  Pin, ADC, PWM : etats conserves en memoire
+#  -  I2C           : transactions transmises au bus simule (i2csim)
+
+import i2csim
+
+
+# Classe Pin
+#  -  value(v) permet aussi de forcer l'etat d'une entree depuis un script hote
+#  -  Pin.get(id) : derniere broche creee pour cet identifiant (peripheriques simules)
+class Pin():
+    IN           = 1
+    OUT          = 3
+    OPEN_DRAIN   = 7
+    PULL_UP      = 2
+    PULL_DOWN    = 1
+    IRQ_FALLING  = 2
+    IRQ_RISING   = 1
+    
+    __pins = {}
+
+    @staticmethod
+    def get(id):
+        return Pin.__pins.get(id)
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        Pin.__pins[id] = self
+        self.id       = id
+        self.mode     = mode
+        self.pull     = pull
+        self.__value  = 1 if pull == Pin.PULL_UP else 0
+        self.__irq    = None
+        self.__trig   = 0
+        if value is not None :
+            self.__value = value
+
+    def init(self, mode=-1, pull=-1, value=None):
+        self.mode = mode
+        self.pull = pull
+        if value is not None :
+            self.__value = value
+
+    def value(self, v=None):
+        if v is None :
+            return self.__value
+        old, self.__value = self.__value, 1 if v else 0
+        if self.__irq is not None :
+            rising  = not old and self.__value and (self.__trig & Pin.IRQ_RISING)
+            falling = old and not self.__value and (self.__trig & Pin.IRQ_FALLING)
+            if rising or falling :
+                self.__irq(self)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+        self.__irq  = handler
+        self.__trig = trigger
+
+    def __call__(self, v=None):
+        return self.value(v)
+
+
+# Classe ADC
+#  -  raw : valeur renvoyee par read() (0 - 4095)
+class ADC():
+    ATTN_0DB    = 0
+    ATTN_2_5DB  = 1
+    ATTN_6DB    = 2
+    ATTN_11DB   = 3
+    WIDTH_9BIT  = 0
+    WIDTH_10BIT = 1
+    WIDTH_11BIT = 2
+    WIDTH_12BIT = 3
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.raw = 0
+
+    def atten(self, value):
+        self.__atten = value
+
+    def width(self, value):
+        self.__width = value
+
+    def read(self):
+        return self.raw
+
+    def read_u16(self):
+        return self.raw << 4
+
+
+# Classe PWM
+class PWM():
+    def __init__(self, pin, freq=5000, duty=512):
+        self.pin     = pin
+        self.__freq  = freq
+        self.__duty  = duty
+        self.enabled = True
+
+    def init(self, freq=None, duty=None):
+        self.enabled = True
+        if freq is not None :
+            self.__freq = freq
+        if duty is not None :
+            self.__duty = duty
+
+    def deinit(self):
+        self.enabled = False
+
+    def freq(self, value=None):
+        if value is None :
+            return self.__freq
+        self.__freq = value
+
+    def duty(self, value=None):
+        if value is None :
+            return self.__duty
+        self.__duty = value
+
+
+# Classe I2C
+#  -  Meme interface que machine.I2C (ESP32)
+#  -  Erreurs : OSError(ENODEV) si peripherique absent
+class I2C():
+    def __init__(self, id=1, scl=None, sda=None, freq=400000, bus=None):
+        self.__bus = bus if bus is not None else i2csim.bus(id, freq)
+        self.__bus.freq = freq
+
+    @property
+    def bus(self):
+        return self.__bus
+
+    def scan(self):
+        found = []
+        for addr in sorted(self.__bus.devices) :
+            try :
+                self.__bus.transaction(addr, 0, lambda d : None)
+                found.append(addr)
+            except OSError :
+                pass
+        return found
+
+    def writeto(self, addr, buf, stop=True):
+        data = bytes(buf)
+        self.__bus.transaction(addr, len(data), lambda d : d.write(data))
+        return len(data)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        return self.__bus.transaction(addr, nbytes, lambda d : d.read(nbytes))
+
+    def readfrom_into(self, addr, buf, stop=True):
+        n = len(buf)
+        buf[:] = self.__bus.transaction(addr, n, lambda d : d.read(n))
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        data = bytes([memaddr]) + bytes(buf)
+        self.__bus.transaction(addr, len(data), lambda d : d.write(data))
+
+    def __read_mem(self, device, memaddr, n):
+        device.write(bytes([memaddr]))
+        return device.read(n)
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        return self.__bus.transaction(addr, nbytes + 1, lambda d : self.__read_mem(d, memaddr, nbytes), restart=True)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        n = len(buf)
+        buf[:] = self.__bus.transaction(addr, n + 1, lambda d : self.__read_mem(d, memaddr, n), restart=True)
+
+
+# Divers
+def freq(value=None):
+    return 240000000
+
+
+def reset():
+    raise SystemExit("machine.reset()")
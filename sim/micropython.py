@@ -0,0 +1,22 @@
+# Simulateur hote (CPython) du module micropython
+
+def const(value):
+    return value
+
+
+# Les fonctions planifiees sont executees immediatement
+def schedule(function, arg):
+    function(arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+# Emitters natifs : sans effet sur CPython
+def native(function):
+    return function
+
+
+def viper(function):
+    return function
@@ -0,0 +1,197 @@
+# Rejeu deterministe d'une trace I2C (lib/i2ctrace.py) sur l'hote
+#
+# ReplayI2C remplace l'objet I2C des pilotes (MaqueenPlusBridge, MPU, Tmp1075) :
+# chaque transaction est comparee a l'entree suivante de la trace, les lectures
+# renvoient les octets enregistres et les erreurs enregistrees sont relancees
+# (OSError avec le meme code). Aucun delai : le rejeu va aussi vite que le code.
+#
+#  -  strict=True  : toute difference (operation, adresse, registre, taille,
+#                    donnees ecrites) leve ReplayError
+#  -  strict=False : les donnees ecrites differentes sont comptees (mismatches),
+#                    les entrees sans correspondance sont sautees (skipped,
+#                    au plus window entrees)
+#  -  clock_us / clock_ms : horloge de la trace (instant de la prochaine
+#                    transaction), install_clock(module, ...) la substitue a
+#                    ticks_us / ticks_ms dans ces modules (dt reproductibles)
+#                    et y supprime les attentes (sleep_us / sleep_ms)
+#
+#   python sim/replay.py session.i2c         (resume de la trace)
+#
+# Exemple :
+#   import maqueen
+#   bus     = ReplayI2C("session.i2c")
+#   restore = bus.install_clock(maqueen)
+#   robot   = maqueen.MaqueenPlusV1(bus, scheduler=False)
+#   while bus.remaining :
+#       robot.update()
+#   restore()
+
+import os
+import sys
+import struct
+
+try :
+    from i2ctrace import MAGIC, VERSION, RECORD, WRITE, WRITE_MEM, READ, READ_MEM
+except ImportError :
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib"))
+    from i2ctrace import MAGIC, VERSION, RECORD, WRITE, WRITE_MEM, READ, READ_MEM
+
+OPS = {WRITE: "write", WRITE_MEM: "write_mem", READ: "read", READ_MEM: "read_mem"}
+
+
+class ReplayError(Exception):
+    pass
+
+
+def _no_wait(delay):
+    pass
+
+
+# Entrees de la trace : (t_us, op, addr, memaddr, nbytes, duration_us, status, data)
+# t_us : instant de la transaction (horloge ticks_us de la capture)
+def load(source):
+    if isinstance(source, (bytes, bytearray)) :
+        data = bytes(source)
+    elif hasattr(source, "read") :
+        data = source.read()
+    else :
+        with open(source, "rb") as f :
+            data = f.read()
+    if data[:len(MAGIC)] != MAGIC :
+        raise ValueError("not an I2C trace")
+    if data[len(MAGIC)] != VERSION :
+        raise ValueError("unsupported trace version %d" % data[len(MAGIC)])
+    t       = struct.unpack_from("<I", data, len(MAGIC) + 1)[0]
+    size    = struct.calcsize(RECORD)
+    pos     = len(MAGIC) + 5
+    records = []
+    while pos + size <= len(data) :
+        dt, op, addr, memaddr, n, duration, status = struct.unpack_from(RECORD, data, pos)
+        pos += size
+        payload = b""
+        if not status :
+            if pos + n > len(data) :
+                break                       # Trace tronquee
+            payload = data[pos:pos + n]
+            pos += n
+        t += dt
+        records.append((t, op, addr, memaddr, n, duration, status, payload))
+    return records
+
+
+# Classe ReplayI2C
+#  -  source    : chemin, octets ou flux d'une trace (ou liste d'entrees de load())
+#  -  position / remaining : entrees rejouees / restantes
+#  -  mismatches, skipped  : ecarts toleres en mode non strict
+class ReplayI2C():
+    def __init__(self, source, strict=True, window=16):
+        self.records    = source if isinstance(source, list) else load(source)
+        self.strict     = strict
+        self.window     = window
+        self.position   = 0
+        self.mismatches = 0
+        self.skipped    = 0
+
+    @property
+    def remaining(self):
+        return len(self.records) - self.position
+
+    def clock_us(self):
+        if self.position < len(self.records) :
+            return self.records[self.position][0]
+        return self.records[-1][0] + 1 if self.records else 0
+
+    def clock_ms(self):
+        return self.clock_us() // 1000
+
+    def install_clock(self, *modules):
+        saved = []
+        for module in modules :
+            for name, clock in (("ticks_us", self.clock_us), ("ticks_ms", self.clock_ms),
+                                ("sleep_us", _no_wait), ("sleep_ms", _no_wait)) :
+                if hasattr(module, name) :
+                    saved.append((module, name, getattr(module, name)))
+                    setattr(module, name, clock)
+
+        def restore():
+            for module, name, function in saved :
+                setattr(module, name, function)
+        return restore
+
+    def rewind(self):
+        self.position = self.mismatches = self.skipped = 0
+
+    # Entree suivante correspondant a la transaction (saute les autres si non strict)
+    def __next(self, op, addr, memaddr, nbytes):
+        last = len(self.records) if self.strict else min(len(self.records), self.position + self.window + 1)
+        for i in range(self.position, last) :
+            record = self.records[i]
+            if record[1] == op and record[2] == addr and record[3] == memaddr and record[4] == nbytes :
+                self.skipped += i - self.position
+                self.position = i + 1
+                if record[6] :
+                    raise OSError(record[6])
+                return record
+            if self.strict :
+                raise ReplayError("transaction %d : expected %s 0x%02X reg 0x%02X (%d bytes), got %s 0x%02X reg 0x%02X (%d bytes)"
+                                  % (i, OPS[record[1]], record[2], record[3], record[4],
+                                     OPS[op], addr, memaddr, nbytes))
+        if self.position >= len(self.records) :
+            raise ReplayError("end of trace")
+        raise ReplayError("transaction %d : no %s 0x%02X reg 0x%02X in the next %d entries"
+                          % (self.position, OPS[op], addr, memaddr, self.window))
+
+    def __write(self, op, addr, memaddr, buf):
+        record = self.__next(op, addr, memaddr, len(buf))
+        if record[7] != bytes(buf) :
+            if self.strict :
+                raise ReplayError("transaction %d : written data differs (%s instead of %s)"
+                                  % (self.position - 1, bytes(buf).hex(), record[7].hex()))
+            self.mismatches += 1
+
+    def writeto(self, addr, buf, stop=True):
+        self.__write(WRITE, addr, 0, buf)
+        return len(buf)
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        self.__write(WRITE_MEM, addr, memaddr, buf)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        return self.__next(READ, addr, 0, nbytes)[7]
+
+    def readfrom_into(self, addr, buf, stop=True):
+        buf[:] = self.__next(READ, addr, 0, len(buf))[7]
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        return self.__next(READ_MEM, addr, memaddr, nbytes)[7]
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        buf[:] = self.__next(READ_MEM, addr, memaddr, len(buf))[7]
+
+    # Peripheriques presents dans la trace
+    def scan(self):
+        return sorted(set(record[2] for record in self.records if not record[6]))
+
+
+def summary(records):
+    devices = {}
+    for t, op, addr, memaddr, n, duration, status, data in records :
+        d = devices.setdefault(addr, {"transactions": 0, "bytes": 0, "errors": 0, "busy_us": 0})
+        d["transactions"] += 1
+        d["bytes"]        += n
+        d["busy_us"]      += duration
+        if status :
+            d["errors"] += 1
+    return devices
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 :
+        print("usage : python sim/replay.py session.i2c")
+        sys.exit(1)
+    records = load(sys.argv[1])
+    span    = records[-1][0] + records[-1][5] - records[0][0] if records else 0
+    print("%d transactions, %.3f s" % (len(records), span / 1e6))
+    for addr, d in sorted(summary(records).items()) :
+        print("0x%02X : %6d transactions  %7d octets  %4d erreurs  bus %.1f %%"
+              % (addr, d["transactions"], d["bytes"], d["errors"], d["busy_us"] * 100 / span if span else 0))
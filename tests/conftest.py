@@ -0,0 +1,9 @@
+# Tests sur l'hote : simulateur (sim/) puis librairies (lib/), comme bench/host.py
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ("lib", "sim") :
+    path = os.path.join(ROOT, folder)
+    if path not in sys.path :
+        sys.path.insert(0, path)
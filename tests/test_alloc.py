@@ -0,0 +1,237 @@
+# Aucune allocation par cycle en regime etabli (MaqueenPlusBridge.update,
+# MPU.read_data, calcul Vecteur sur place)
+#
+#   python -m pytest tests                  (hote : CPython)
+#   python tests/test_alloc.py
+#   import test_alloc ; test_alloc.main()   (carte : MicroPython)
+#
+# Carte (MicroPython) : ecart de gc.mem_alloc() sur CYCLES cycles, GC
+#   desactive : il doit etre nul. Seule exception, MPU.read_data() sur les
+#   ports ou les flottants sont alloues (ESP32) : exactement MPU_FLOATS
+#   flottants par lecture, toute autre allocation fait echouer le test.
+#
+# Hote (CPython) : les entiers, les flottants et les iterateurs de boucle sont
+#   des objets, le test de la carte ne peut pas y etre reproduit. On verifie :
+#    -  sys.getallocatedblocks() : aucun bloc conserve apres CYCLES cycles
+#    -  tracemalloc (pic) : memoire transitoire d'un cycle bornee par
+#       HOST_TRANSIENT (iterateurs de boucles imbriquees)
+#
+# Bus factice sans allocation et horloge fixe : sur la carte, ticks_ms /
+# ticks_us renvoient de petits entiers (sans allocation), pas sur CPython.
+
+try :
+    import conftest         # Hote : chemins lib/ et sim/ (python tests/test_alloc.py)
+except ImportError :
+    pass
+
+import gc
+import sys
+from array import array
+
+try :
+    import pytest
+    skip    = pytest.skip
+    Skipped = pytest.skip.Exception
+except ImportError :
+    class Skipped(Exception):
+        pass
+
+    def skip(reason):
+        raise Skipped(reason)
+
+import maqueen
+import mpu6050
+import tools
+from maqueen import MaqueenPlusV1
+from mpu6050 import MPU
+from tools   import Vecteur, I2C_manage
+
+CYCLES = 200
+DEVICE = hasattr(gc, "mem_alloc")
+
+# Flottants crees par MPU.read_data() : 3 par axe (accel, gyro, offset) + 3 (temp)
+MPU_FLOATS = 12
+
+# Pic transitoire admis sur CPython (octets) : 4 boucles imbriquees (range + iterateur)
+HOST_TRANSIENT = 4 * (sys.getsizeof(range(1)) + sys.getsizeof(iter(range(1)))) if not DEVICE else 0
+
+
+# Bus I2C factice : transactions sans effet, lectures a zero (WHO_AM_I = 0 accepte)
+class FakeI2C():
+    def writeto(self, addr, buf, stop=True):
+        return len(buf)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        pass
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        pass
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        return bytes(nbytes)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        pass
+
+
+def _clock():
+    return 0
+
+
+def install_clock():
+    saved = []
+    for module in (maqueen, mpu6050, tools) :
+        for name in ("ticks_ms", "ticks_us") :
+            if hasattr(module, name) :
+                saved.append((module, name, getattr(module, name)))
+                setattr(module, name, _clock)
+    return saved
+
+
+def restore_clock(saved):
+    for module, name, function in saved :
+        setattr(module, name, function)
+
+
+def make_update(burst=False, managed=False):
+    i2c = FakeI2C()
+    if managed :
+        i2c = I2C_manage(i2c)
+    robot = MaqueenPlusV1(i2c, burst=burst, scheduler=False, gap_us=0)
+    robot.moteurs = (10, 20)
+    robot.phares  = (1, 1)
+    return robot.update
+
+
+def make_mpu():
+    return MPU(FakeI2C(), calibration=None).read_data
+
+
+def make_vector_math():
+    sample = array('f', [0.1, 0.2, 0.9, 1.0, 2.0, 3.0])
+    accel  = Vecteur.view(sample, 0)
+    gyro   = Vecteur.view(sample, 3)
+    acc    = Vecteur()
+    tmp    = Vecteur()
+    def step():
+        acc.add(gyro, 0.01)
+        tmp.cross(accel, gyro).scale(0.5)
+        acc.lerp(tmp, 0.1)
+        acc.dot(accel)
+    return step
+
+
+# (nom, fabrique de la fonction d'un cycle, flottants crees par cycle)
+CASES = (("update (burst=False)", lambda : make_update(False), 0),
+         ("update (burst=True)",  lambda : make_update(True), 0),
+         ("update (I2C_manage)",  lambda : make_update(False, True), 0),
+         ("MPU read_data",        make_mpu, MPU_FLOATS),
+         ("Vecteur (sur place)",  make_vector_math, 0))
+
+
+def warm_up(function):
+    for _ in range(3) :
+        function()      # Regime etabli
+
+
+# Octets alloues pendant CYCLES appels (carte)
+def allocated(function, cycles=CYCLES):
+    warm_up(function)
+    gc.collect()
+    gc.disable()
+    try :
+        before = gc.mem_alloc()
+        for _ in range(cycles) :
+            function()
+        return gc.mem_alloc() - before
+    finally :
+        gc.enable()
+
+
+# Cout d'un flottant (octets), nul sur les ports ou les flottants ne sont pas alloues
+def float_cost():
+    box = [1.0]
+    def step():
+        box[0] = box[0] / 3
+    return allocated(step) // CYCLES
+
+
+# Blocs conserves apres CYCLES appels (hote), mesure a vide deduite
+def retained_blocks(function, cycles=CYCLES):
+    def blocks(f):
+        warm_up(f)
+        loop = [None] * cycles
+        gc.disable()
+        try :
+            before = sys.getallocatedblocks()
+            for _ in loop :
+                f()
+            return sys.getallocatedblocks() - before
+        finally :
+            gc.enable()
+    return blocks(function) - blocks(lambda : None)
+
+
+# Pic de memoire transitoire d'un cycle (hote, octets), mesure a vide deduite
+def transient_peak(function, cycles=CYCLES):
+    import tracemalloc
+    def peak(f):
+        warm_up(f)
+        loop = [None] * cycles
+        tracemalloc.start()
+        try :
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            for _ in loop :
+                f()
+            return tracemalloc.get_traced_memory()[1] - before
+        finally :
+            tracemalloc.stop()
+    return peak(function) - peak(lambda : None)
+
+
+def test_device_no_allocation():
+    if not DEVICE :
+        skip("gc.mem_alloc() : carte MicroPython uniquement")
+    saved = install_clock()
+    try :
+        cost = float_cost()
+        for name, factory, floats in CASES :
+            assert allocated(factory()) == floats * cost * CYCLES, name
+    finally :
+        restore_clock(saved)
+
+
+def test_host_no_retained_blocks():
+    if DEVICE :
+        skip("CPython uniquement")
+    saved = install_clock()
+    try :
+        for name, factory, floats in CASES :
+            assert retained_blocks(factory()) == 0, name
+    finally :
+        restore_clock(saved)
+
+
+def test_host_transient_peak():
+    if DEVICE :
+        skip("CPython uniquement")
+    saved = install_clock()
+    try :
+        for name, factory, floats in CASES :
+            assert transient_peak(factory()) <= HOST_TRANSIENT, name
+    finally :
+        restore_clock(saved)
+
+
+def main():
+    for test in (test_device_no_allocation, test_host_no_retained_blocks, test_host_transient_peak) :
+        try :
+            test()
+            print("ok  ", test.__name__)
+        except Skipped as reason :
+            print("skip", test.__name__, ":", reason)
+
+
+if __name__ == "__main__":
+    main()